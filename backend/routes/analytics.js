@@ -1,9 +1,27 @@
 const express = require('express');
 const { query } = require('../config/database');
 const { authenticate, authorize } = require('../middleware/auth');
+const axios = require('axios');
 
 const router = express.Router();
 
+// Python service URL
+const PYTHON_SERVICE = process.env.PYTHON_SERVICE_URL || 'http://localhost:5000';
+
+// Invalidate the Python analytics cache after a write (fire and forget)
+const invalidatePythonCache = (source) => {
+  axios.post(
+    `${PYTHON_SERVICE}/api/cache/invalidate`,
+    { source },
+    {
+      headers: { 'X-Service-Token': process.env.PYTHON_SERVICE_TOKEN || '' },
+      timeout: 2000
+    }
+  ).catch((error) => {
+    console.error('Python cache invalidation error:', error.message);
+  });
+};
+
 // Get user activities
 router.get('/activities', authenticate, async (req, res) => {
   try {
@@ -39,6 +57,7 @@ router.post('/metrics', authenticate, authorize('admin', 'moderator'), async (re
       [metric_name, metric_value, JSON.stringify(metric_data || {})]
     );
 
+    invalidatePythonCache('metrics');
     res.status(201).json({ metric: result.rows[0] });
   } catch (error) {
     console.error('Record metric error:', error);
@@ -0,0 +1,459 @@
+"""
+Usuarios activos aproximados (DAU/WAU/MAU) con sketches HyperLogLog diarios
+Un sketch por día en activity_sketches (2^precision registros de 1 byte, BYTEA), construido
+incrementalmente desde user_activities; una ventana de N días es el máximo elemento a elemento
+de sus sketches, sin volver a leer los eventos. ?exact=true cuenta COUNT(DISTINCT user_id) para auditar
+Uso: python active_users.py [--full] [--date 2024-05-01] [--check]   |   python active_users.py --synthetic 200000
+"""
+import argparse
+import math
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from config import ACTIVE_USERS_CONFIG, ANALYTICS_CONFIG
+from db_manager import DatabaseManager
+from db_pool import get_pool
+
+# Ventanas móviles que terminan en el día pedido (lista cerrada: los nombres se interpolan en SQL)
+WINDOWS = {'dau': 1, 'wau': 7, 'mau': 30}
+MAX_WINDOW_DAYS = 366
+CONFIDENCE_Z = 1.96  # error_bound al 95%
+WATERMARK = 'activity_sketches'  # Fila en rollup_watermarks
+
+SKETCHES_SQL = """
+    SELECT day, registers
+    FROM activity_sketches
+    WHERE precision = %s AND day >= %s AND day <= %s
+"""
+
+
+# ============================================
+# HYPERLOGLOG
+# ============================================
+
+def hash_ids(ids):
+    """user_id -> hash de 64 bits (finalizador splitmix64, vectorizado)"""
+    import numpy as np
+
+    z = np.asarray(ids).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def register_updates(ids, precision):
+    """(registro, rango) de cada id: primeros `precision` bits y ceros iniciales + 1 del resto"""
+    import numpy as np
+
+    hashes = hash_ids(ids)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+    # Ceros iniciales por búsqueda binaria (log2 en float64 redondea mal cerca de 2^k)
+    zeros = np.zeros(len(rest), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = rest < np.uint64(1 << (64 - shift))
+        zeros += empty * shift
+        rest = np.where(empty, rest << np.uint64(shift), rest)
+    rank = np.minimum(zeros, 64 - precision) + 1
+    return index, rank.astype(np.uint8)
+
+
+def add_users(registers, offsets, ids, precision):
+    """Sumar ids a los registros planos (offsets = día * 2^precision)"""
+    import numpy as np
+
+    index, rank = register_updates(ids, precision)
+    np.maximum.at(registers, offsets + index, rank)
+
+
+def registers_array(value):
+    """BYTEA (memoryview de psycopg2, bytes de asyncpg) -> array uint8"""
+    import numpy as np
+
+    return np.frombuffer(value, dtype=np.uint8)
+
+
+def _sigma(x):
+    """Serie σ del estimador de Ertl (registros en cero)"""
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous, z = z, z + x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    """Serie τ del estimador de Ertl (registros saturados)"""
+    if x in (0.0, 1.0):
+        return 0.0
+    y, z = 1.0, 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        y *= 0.5
+        previous, z = z, z - (1.0 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def estimate(registers):
+    """Cardinalidad de un sketch (estimador mejorado de Ertl: sin tablas de sesgo ni saltos de rango)"""
+    import numpy as np
+
+    m = len(registers)
+    q = 64 - int(math.log2(m))
+    counts = np.bincount(registers, minlength=q + 2).tolist()
+    z = m * _tau(1.0 - counts[q + 1] / m)
+    for k in range(q, 0, -1):
+        z = 0.5 * (z + counts[k])
+    z += m * _sigma(counts[0] / m)
+    return m * m / (2 * math.log(2) * z)
+
+
+def relative_error(precision):
+    """Error relativo al 95% (1.04/√m de error estándar)"""
+    return CONFIDENCE_Z * 1.04 / math.sqrt(1 << precision)
+
+
+# ============================================
+# VENTANAS
+# ============================================
+
+def parse_window_args(args):
+    """?date=&days= -> (último día, {ventana: días}); ValueError con el mensaje para el 400"""
+    end = date.today()
+    if args.get('date'):
+        try:
+            end = date.fromisoformat(args['date'])
+        except ValueError:
+            raise ValueError("'date' debe ser una fecha YYYY-MM-DD")
+    windows = dict(WINDOWS)
+    if args.get('days'):
+        try:
+            days = int(args['days'])
+        except ValueError:
+            days = 0
+        if not 1 <= days <= MAX_WINDOW_DAYS:
+            raise ValueError(f"'days' debe ser un entero entre 1 y {MAX_WINDOW_DAYS}")
+        windows['custom'] = days
+    return end, windows
+
+
+def window_start(end, days):
+    """Primer día de una ventana de `days` días que termina en `end` (inclusive)"""
+    return end - timedelta(days=days - 1)
+
+
+def sketch_bounds(end, windows, precision):
+    """Parámetros de SKETCHES_SQL para la ventana más larga"""
+    return precision, window_start(end, max(windows.values())), end
+
+
+def exact_query(end, windows):
+    """COUNT(DISTINCT user_id) de todas las ventanas en un solo scan de la más larga"""
+    columns, params = [], []
+    for name, days in windows.items():
+        columns.append(f"COUNT(DISTINCT user_id) FILTER (WHERE created_at >= %s) AS {name}")
+        params.append(window_start(end, days))
+    params += [window_start(end, max(windows.values())), end + timedelta(days=1)]
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM user_activities
+        WHERE created_at >= %s AND created_at < %s
+    """
+    return sql, params
+
+
+def window_entry(end, days, users, error_bound=0, relative=0.0, method='exact'):
+    """Resultado de una ventana"""
+    return {
+        'users': int(users),
+        'error_bound': int(error_bound),
+        'relative_error': round(relative, 4),
+        'from': window_start(end, days).isoformat(),
+        'to': end.isoformat(),
+        'days': days,
+        'method': method
+    }
+
+
+def hll_windows(rows, end, windows, precision):
+    """Filas de SKETCHES_SQL -> {ventana: resultado} fusionando los sketches de cada rango"""
+    import numpy as np
+
+    m = 1 << precision
+    days = [row['day'] for row in rows]
+    sketches = np.stack([registers_array(row['registers']) for row in rows]) if rows else np.zeros((0, m), np.uint8)
+    relative = relative_error(precision)
+    result = {}
+    for name, length in windows.items():
+        first = window_start(end, length)
+        selected = [i for i, day in enumerate(days) if first <= day <= end]
+        merged = sketches[selected].max(axis=0) if selected else np.zeros(m, dtype=np.uint8)
+        users = estimate(merged)
+        result[name] = window_entry(end, length, round(users), math.ceil(relative * users), relative, 'hll')
+    return result
+
+
+def exact_windows(row, end, windows):
+    """Fila de exact_query -> {ventana: resultado}"""
+    return {name: window_entry(end, days, row[name] or 0) for name, days in windows.items()}
+
+
+def active_users_result(end, precision, exact, data):
+    """Cuerpo de la respuesta"""
+    return {
+        'success': True,
+        'date': end.isoformat(),
+        'precision': precision,
+        'exact': exact,
+        'windows': data
+    }
+
+
+# ============================================
+# SKETCHES DIARIOS
+# ============================================
+
+class ActiveUsers:
+    """Mantiene activity_sketches y estima los usuarios activos por ventana"""
+
+    def __init__(self, db_manager=None, precision=None, refresh_interval=None, overlap=None):
+        self.db = db_manager or DatabaseManager()
+        self.precision = ACTIVE_USERS_CONFIG['precision'] if precision is None else precision
+        if not 4 <= self.precision <= 18:
+            raise ValueError(f"precision HLL fuera de rango (4-18): {self.precision}")
+        self.refresh_interval = (ACTIVE_USERS_CONFIG['refresh_interval']
+                                 if refresh_interval is None else refresh_interval)
+        self.overlap = ACTIVE_USERS_CONFIG['overlap'] if overlap is None else overlap
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+
+    def refresh(self, full=False):
+        """Sumar a los sketches los eventos desde el último watermark (full = reconstruir todo)"""
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    days = self._refresh(conn, cursor, full)
+                    conn.commit()
+                finally:
+                    cursor.close()
+            return {'success': True, 'days': days}
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    def refresh_if_stale(self):
+        """Refrescar como máximo una vez cada refresh_interval segundos"""
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None  # Otro hilo ya está refrescando
+        try:
+            # También si falla, para no reintentar en cada request
+            self._last_refresh = time.monotonic()
+            return self.refresh()
+        finally:
+            self._lock.release()
+
+    def windows(self, end, windows, exact=False):
+        """{ventana: resultado} desde los sketches, o exacto (?exact=true o sin tabla de sketches)"""
+        if not exact:
+            result = self.db.execute_query(SKETCHES_SQL, sketch_bounds(end, windows, self.precision))
+            if result['success']:
+                return hll_windows(result['data'], end, windows, self.precision)
+
+        result = self.db.execute_query(*exact_query(end, windows))
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        return exact_windows(result['data'][0], end, windows)
+
+    def _refresh(self, conn, cursor, full):
+        """Actualizar los días tocados; retorna días escritos"""
+        import numpy as np
+        from psycopg2 import Binary
+        from psycopg2.extras import execute_values
+
+        # Bloquear el watermark para serializar refrescos entre procesos
+        cursor.execute(
+            "INSERT INTO rollup_watermarks (entity, last_refreshed) VALUES (%s, NULL) "
+            "ON CONFLICT (entity) DO NOTHING",
+            (WATERMARK,)
+        )
+        cursor.execute(
+            "SELECT last_refreshed, LOCALTIMESTAMP FROM rollup_watermarks WHERE entity = %s FOR UPDATE",
+            (WATERMARK,)
+        )
+        last_refreshed, now = cursor.fetchone()
+
+        # Sketches de otra precisión no se pueden fusionar con los nuevos
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM activity_sketches WHERE precision <> %s)", (self.precision,))
+        if full or last_refreshed is None or cursor.fetchone()[0]:
+            cursor.execute("DELETE FROM activity_sketches")
+            cursor.execute("SELECT MIN(created_at) FROM user_activities")
+            since = cursor.fetchone()[0]
+            existing = {}
+        else:
+            # El máximo por registro es idempotente: releer el solape no cuenta dos veces
+            since = last_refreshed - timedelta(seconds=self.overlap)
+            cursor.execute("SELECT day, registers FROM activity_sketches WHERE day >= %s", (since.date(),))
+            existing = dict(cursor.fetchall())
+
+        rows = []
+        end = now.date()
+        if since is not None and since.date() <= end:
+            first = since.date()
+            sketches = self._build(conn, since, first, end)
+            for offset in np.flatnonzero(sketches.any(axis=1)):
+                day = first + timedelta(days=int(offset))
+                registers = sketches[offset]
+                if day in existing:
+                    stored = registers_array(existing[day])
+                    registers = np.maximum(stored, registers)
+                    if np.array_equal(registers, stored):
+                        continue
+                rows.append((day, self.precision, Binary(registers.tobytes())))
+        if rows:
+            execute_values(cursor, """
+                INSERT INTO activity_sketches (day, precision, registers) VALUES %s
+                ON CONFLICT (day) DO UPDATE SET
+                    precision = EXCLUDED.precision,
+                    registers = EXCLUDED.registers,
+                    updated_at = CURRENT_TIMESTAMP
+            """, rows)
+
+        cursor.execute(
+            "UPDATE rollup_watermarks SET last_refreshed = %s WHERE entity = %s",
+            (now, WATERMARK)
+        )
+        return len(rows)
+
+    def _build(self, conn, since, first, end):
+        """Sketches (días × 2^precision) de los pares día/usuario desde `since`, leídos por bloques"""
+        import numpy as np
+
+        m = 1 << self.precision
+        days = (end - first).days + 1
+        sketches = np.zeros(days * m, dtype=np.uint8)
+        itersize = ANALYTICS_CONFIG['itersize']
+        cursor = conn.cursor(name=f"sketches_{uuid.uuid4().hex}")
+        cursor.itersize = itersize
+        try:
+            # Rango sobre created_at para leer solo las particiones recientes
+            cursor.execute("""
+                SELECT DATE(created_at) - %s AS day, user_id
+                FROM user_activities
+                WHERE created_at >= %s AND created_at < %s AND user_id IS NOT NULL
+                GROUP BY 1, 2
+            """, (first, since, end + timedelta(days=1)))
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                offsets, user_ids = np.array(rows, dtype=np.int64).T
+                add_users(sketches, offsets * m, user_ids, self.precision)
+        finally:
+            cursor.close()
+        return sketches.reshape(days, m)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def synthetic_check(population, precision, days=30, seed=7):
+    """Error HLL vs. conteo exacto con visitas sintéticas (sin base de datos)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    m = 1 << precision
+    end = date.today()
+    daily = [rng.choice(population, size=int(population * rng.uniform(0.05, 0.15)), replace=False)
+             for _ in range(days)]
+    start_time = time.perf_counter()
+    sketches = np.zeros(days * m, dtype=np.uint8)
+    for offset, ids in enumerate(daily):
+        add_users(sketches, offset * m, ids, precision)
+    rows = [{'day': end - timedelta(days=days - 1 - offset), 'registers': sketch.tobytes()}
+            for offset, sketch in enumerate(sketches.reshape(days, m))]
+    build_ms = (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    estimated = hll_windows(rows, end, WINDOWS, precision)
+    merge_ms = (time.perf_counter() - start_time) * 1000
+    exact = {name: len(np.unique(np.concatenate(daily[days - length:]))) for name, length in WINDOWS.items()}
+    return estimated, exact, build_ms, merge_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DAU/WAU/MAU con sketches HyperLogLog')
+    parser.add_argument('--full', action='store_true', help='Reconstruir todos los sketches')
+    parser.add_argument('--date', help='Último día de las ventanas (default hoy)')
+    parser.add_argument('--check', action='store_true', help='Comparar con COUNT(DISTINCT) exacto')
+    parser.add_argument('--synthetic', type=int, help='Población de N usuarios sintéticos (sin base de datos)')
+    parser.add_argument('--precision', type=int, help='Bits de precisión (default ACTIVE_USERS_HLL_PRECISION)')
+    args = parser.parse_args()
+    precision = ACTIVE_USERS_CONFIG['precision'] if args.precision is None else args.precision
+
+    if args.synthetic:
+        estimated, exact, build_ms, merge_ms = synthetic_check(args.synthetic, precision)
+        print(f"🧪 {args.synthetic:,} usuarios sintéticos, 30 días, precisión {precision} "
+              f"({1 << precision:,} registros, ±{relative_error(precision):.2%} al 95%)")
+        print(f"   {'ventana':<8}{'HLL':>12}{'exacto':>12}{'error':>9}")
+        for name, count in exact.items():
+            users = estimated[name]['users']
+            print(f"   {name:<8}{users:>12,}{count:>12,}{(users - count) / count:>9.2%}")
+        print(f"\n⚡ Sketches: {build_ms:.1f} ms para 30 días; fusión de las 3 ventanas: {merge_ms:.2f} ms")
+        return
+
+    try:
+        end, windows = parse_window_args({'date': args.date})
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    tracker = ActiveUsers(precision=precision)
+    print("🔄 Refrescando sketches de usuarios activos" + (" (completo)" if args.full else "") + "...")
+    start_time = time.perf_counter()
+    result = tracker.refresh(full=args.full)
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error')}")
+        sys.exit(1)
+    print(f"   ✅ {result['days']} días actualizados en {time.perf_counter() - start_time:.2f}s")
+
+    try:
+        start_time = time.perf_counter()
+        estimated = tracker.windows(end, windows)
+        hll_ms = (time.perf_counter() - start_time) * 1000
+        exact, exact_ms = None, None
+        if args.check:
+            start_time = time.perf_counter()
+            exact = tracker.windows(end, windows, exact=True)
+            exact_ms = (time.perf_counter() - start_time) * 1000
+    except Exception as e:
+        print(f"❌ Error: {type(e).__name__}: {e}")
+        sys.exit(1)
+
+    print(f"👥 Usuarios activos al {end} (precisión {precision})")
+    for name, entry in estimated.items():
+        line = f"   {name:<8}{entry['users']:>12,} ±{entry['error_bound']:<8,}"
+        if exact:
+            count = exact[name]['users']
+            line += f" exacto {count:>12,}"
+            if count:
+                line += f" ({(entry['users'] - count) / count:+.2%})"
+        print(line)
+    print(f"\n⚡ Sketches: {hll_ms:.1f} ms" + (f" vs COUNT(DISTINCT): {exact_ms:.1f} ms" if exact_ms else ""))
+
+
+if __name__ == '__main__':
+    main()
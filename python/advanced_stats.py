@@ -0,0 +1,154 @@
+"""
+Motor de estadísticas avanzadas - Agregados calculados en PostgreSQL
+Usa pandas solo como fallback (mismo resultado para los mismos datos)
+"""
+import math
+
+from chunked_loader import ChunkedLoader, Count, Mean, Sum, ValueCounts
+from db_manager import DatabaseManager
+
+# Agregados de games (sumas y conteos exactos; los promedios se calculan en Python)
+GAMES_SUMMARY_SQL = """
+    SELECT
+        COUNT(*) AS total,
+        COUNT(*) FILTER (WHERE is_free = true) AS free_games,
+        COUNT(*) FILTER (WHERE is_free = false) AS paid_games,
+        SUM(price) FILTER (WHERE is_free = false) AS paid_price_sum,
+        COUNT(price) FILTER (WHERE is_free = false) AS paid_price_count,
+        SUM(rating) AS rating_sum,
+        COUNT(rating) AS rating_count,
+        COALESCE(SUM(downloads), 0) AS total_downloads
+    FROM games
+"""
+
+GAMES_BY_CATEGORY_SQL = """
+    SELECT category, COUNT(*) AS count
+    FROM games
+    WHERE category IS NOT NULL
+    GROUP BY category
+"""
+
+USERS_SUMMARY_SQL = """
+    SELECT
+        COUNT(*) AS total,
+        COUNT(*) FILTER (WHERE is_active = true) AS active_users
+    FROM users
+"""
+
+USERS_BY_ROLE_SQL = """
+    SELECT role, COUNT(*) AS count
+    FROM users
+    WHERE role IS NOT NULL
+    GROUP BY role
+"""
+
+ADVANCED_STATS_SQL = f"""
+    SELECT
+        (SELECT row_to_json(g) FROM ({GAMES_SUMMARY_SQL}) g) AS games,
+        (SELECT COALESCE(json_object_agg(c.category, c.count), '{{}}')
+         FROM ({GAMES_BY_CATEGORY_SQL}) c) AS by_category,
+        (SELECT row_to_json(u) FROM ({USERS_SUMMARY_SQL}) u) AS users,
+        (SELECT COALESCE(json_object_agg(r.role, r.count), '{{}}')
+         FROM ({USERS_BY_ROLE_SQL}) r) AS by_role
+"""
+
+
+def _mean(total, count):
+    """Promedio con la semántica de pandas (NaN si todos los valores son NULL)"""
+    if not count:
+        return math.nan
+    return float(total) / count
+
+
+def build_stats(games, by_category, users, by_role):
+    """Armar el dict 'stats' de /api/analytics/advanced a partir de los agregados"""
+    has_games = games['total'] > 0
+    return {
+        'games': {
+            'total': games['total'],
+            'by_category': by_category if has_games else {},
+            'avg_price': _mean(games['paid_price_sum'], games['paid_price_count']) if games['paid_games'] > 0 else 0,
+            'avg_rating': _mean(games['rating_sum'], games['rating_count']) if has_games else 0,
+            'total_downloads': int(games['total_downloads']) if has_games else 0,
+            'free_games': games['free_games'] if has_games else 0,
+            'paid_games': games['paid_games'] if has_games else 0
+        },
+        'users': {
+            'total': users['total'],
+            'by_role': by_role if users['total'] > 0 else {},
+            'active_users': users['active_users'] if users['total'] > 0 else 0
+        }
+    }
+
+
+class AdvancedStatsEngine:
+    """Calcula las estadísticas de /api/analytics/advanced"""
+
+    def __init__(self, db_manager=None):
+        self.db = db_manager or DatabaseManager()
+
+    def compute(self, engine='sql'):
+        """Calcular stats con SQL; pandas solo si se pide o si SQL falla"""
+        if engine == 'pandas':
+            return self.compute_pandas()
+
+        stats = self.compute_sql()
+        if stats is None:
+            return self.compute_pandas()
+        return stats
+
+    def compute_sql(self):
+        """Todos los agregados en una sola query (None si falla)"""
+        result = self.db.execute_query(ADVANCED_STATS_SQL)
+        if not result['success'] or not result['data']:
+            return None
+        row = result['data'][0]
+        return build_stats(row['games'], row['by_category'], row['users'], row['by_role'])
+
+    def compute_pandas(self, itersize=None):
+        """Fallback con pandas: lee games y users por bloques (requiere pandas)"""
+        import pandas  # Falla con ImportError si no está instalado
+
+        loader = ChunkedLoader(itersize=itersize)
+        paid = lambda df: df['is_free'] == False
+        free = lambda df: df['is_free'] == True
+
+        games = loader.aggregate("""
+            SELECT category, price, is_free, rating, downloads
+            FROM games
+        """, {
+            'total': Count(),
+            'by_category': ValueCounts('category'),
+            'paid_games': Count(where=paid),
+            'free_games': Count(where=free),
+            'avg_price': Mean('price', where=paid),
+            'avg_rating': Mean('rating'),
+            'total_downloads': Sum('downloads')
+        })
+
+        users = loader.aggregate("""
+            SELECT role, is_active
+            FROM users
+        """, {
+            'total': Count(),
+            'by_role': ValueCounts('role'),
+            'active_users': Count(where=lambda df: df['is_active'] == True)
+        })
+
+        has_games = games['total'] > 0
+        return {
+            'games': {
+                'total': games['total'],
+                'by_category': games['by_category'] if has_games else {},
+                'avg_price': float(games['avg_price']) if games['paid_games'] > 0 else 0,
+                'avg_rating': float(games['avg_rating']) if has_games else 0,
+                'total_downloads': int(games['total_downloads']) if has_games else 0,
+                'free_games': games['free_games'] if has_games else 0,
+                'paid_games': games['paid_games'] if has_games else 0
+            },
+            'users': {
+                'total': users['total'],
+                'by_role': users['by_role'] if users['total'] > 0 else {},
+                'active_users': users['active_users'] if users['total'] > 0 else 0
+            }
+        }
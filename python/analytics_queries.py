@@ -0,0 +1,110 @@
+"""
+Capa de queries de analytics - Agrupa varios contadores en un solo round trip
+Útil para uso básico y avanzado
+"""
+from config import ANALYTICS_CONFIG
+from db_manager import DatabaseManager
+
+# Cada parte devuelve (ord, kind, key, count) para poder unirlas con UNION ALL
+# Las particiones mensuales (partitions.py) no cuentan como tablas
+TABLES_COUNT_SQL = """
+    SELECT 0 AS ord, 'stat' AS kind, 'tables' AS key, COUNT(*) AS count
+    FROM information_schema.tables
+    WHERE table_schema = 'public'
+    AND table_type = 'BASE TABLE'
+    AND table_name NOT IN (
+        SELECT relname FROM pg_class WHERE relispartition AND relnamespace = 'public'::regnamespace
+    )
+"""
+
+CATEGORIES_SQL = """
+    SELECT category, COUNT(*) as count
+    FROM games
+    GROUP BY category
+    ORDER BY count DESC
+"""
+
+ROLES_SQL = """
+    SELECT role, COUNT(*) as count
+    FROM users
+    GROUP BY role
+    ORDER BY count DESC
+"""
+
+BASIC_SNAPSHOT_PARTS = [
+    "SELECT 0 AS ord, 'stat' AS kind, 'users' AS key, COUNT(*) AS count FROM users",
+    "SELECT 0 AS ord, 'stat' AS kind, 'games' AS key, COUNT(*) AS count FROM games",
+    "SELECT 1 AS ord, 'category' AS kind, category AS key, COUNT(*) AS count FROM games GROUP BY category",
+    "SELECT 2 AS ord, 'role' AS kind, role AS key, COUNT(*) AS count FROM users GROUP BY role",
+]
+
+
+def union_all(parts):
+    """Unir partes (ord, kind, key, count) con UNION ALL"""
+    return "\nUNION ALL\n".join(f"({part.strip()})" for part in parts)
+
+
+def build_stats_query(include_tables=True):
+    """Solo los contadores (tables, users, games) en un UNION ALL"""
+    return union_all(([TABLES_COUNT_SQL] if include_tables else []) + BASIC_SNAPSHOT_PARTS[:2])
+
+
+def build_basic_snapshot_query(include_tables=True):
+    """Construir el UNION ALL de /api/analytics/basic"""
+    union = union_all(([TABLES_COUNT_SQL] if include_tables else []) + BASIC_SNAPSHOT_PARTS)
+    return f"{union}\nORDER BY ord, count DESC"
+
+
+def snapshot_from_rows(rows, include_tables=True):
+    """Convertir filas (ord, kind, key, count) en stats, categorías y roles"""
+    stats = {'tables': 0} if include_tables else {}
+    stats.update({'users': 0, 'games': 0})
+    categories = []
+    roles = []
+    for row in rows:
+        if row['kind'] == 'stat':
+            if row['key'] in stats:
+                stats[row['key']] = row['count']
+        elif row['kind'] == 'category':
+            categories.append({'category': row['key'], 'count': row['count']})
+        else:
+            roles.append({'role': row['key'], 'count': row['count']})
+    return {'stats': stats, 'categories': categories, 'roles': roles}
+
+
+class AnalyticsQueries:
+    """Queries consolidadas para los endpoints de analytics"""
+
+    def __init__(self, db_manager=None):
+        self.db = db_manager or DatabaseManager()
+
+    @staticmethod
+    def include_tables(include_tables=None):
+        """Resolver el flag 'tables' (None = ANALYTICS_COUNT_TABLES)"""
+        return ANALYTICS_CONFIG['count_tables'] if include_tables is None else include_tables
+
+    def basic_snapshot(self, include_tables=None):
+        """Stats, categorías y roles de /api/analytics/basic en una sola query"""
+        include_tables = self.include_tables(include_tables)
+
+        result = self.db.execute_query(build_basic_snapshot_query(include_tables))
+        if not result['success']:
+            # Si la query combinada falla (p. ej. falta una tabla) se usa
+            # el camino anterior, que degrada cada parte por separado
+            return self._basic_snapshot_legacy(include_tables)
+
+        return snapshot_from_rows(result['data'], include_tables)
+
+    def _basic_snapshot_legacy(self, include_tables):
+        """Una query por contador (comportamiento original)"""
+        stats = self.db.get_stats()
+        if not include_tables:
+            stats.pop('tables', None)
+
+        result = self.db.execute_query(CATEGORIES_SQL)
+        categories = result['data'] if result['success'] else []
+
+        result = self.db.execute_query(ROLES_SQL)
+        roles = result['data'] if result['success'] else []
+
+        return {'stats': stats, 'categories': categories, 'roles': roles}
@@ -3,30 +3,69 @@ Battle.net Platform - Python Analytics Service
 Servicio Flask para analytics avanzados y procesamiento de datos
 Útil para uso básico y avanzado
 """
-import sys
-import os
-
-# Fix encoding for Windows
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass
-
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from datetime import datetime, timedelta
-from config import SERVER_CONFIG, API_CONFIG, get_db_connection, print_config
+from functools import wraps
+from config import SERVER_CONFIG, API_CONFIG, MATVIEW_CONFIG, FORECAST_CONFIG, INGEST_CONFIG, print_config
 from db_manager import DatabaseManager
+from analytics_queries import AnalyticsQueries
+from advanced_stats import AdvancedStatsEngine
+from daily_rollup import DailyRollup
+from forecasting import FORECAST_METHODS, history_window, load_series, predict
+from jsonb_queries import INPUT_ERRORS, build_query, parse_filters, query_result
+from active_users import ActiveUsers, active_users_result, parse_window_args
+from catalog_snapshot import CatalogSnapshot, snapshot_freshness
+from partitions import PartitionManager
+from ingestion import ActivityIngestor, MAX_ERRORS, prepare_events
+from materialized_views import MaterializedViews
+from response_cache import ResponseCache, cached_endpoint
+from instrumentation import metrics, instrument_flask, PROMETHEUS_CONTENT_TYPE
+from json_provider import install_json_flask
+from slow_query_log import slow_queries, SLOW_QUERY_ORDERS
 
 app = Flask(__name__)
 CORS(app, origins=API_CONFIG['cors_origins'])
+install_json_flask(app)
+instrument_flask(app)
 
 db_manager = DatabaseManager()
+analytics_queries = AnalyticsQueries(db_manager)
+advanced_engine = AdvancedStatsEngine(db_manager)
+daily_rollup = DailyRollup(db_manager)
+active_users = ActiveUsers(db_manager)
+partition_manager = PartitionManager()
+materialized_views = MaterializedViews(db_manager)
+catalog_snapshot = CatalogSnapshot()
+activity_ingestor = ActivityIngestor()
+response_cache = ResponseCache()
+
+def arg_flag(name, default=False):
+    """Leer un flag booleano de la query string (?live=true, ?tables=false)"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no')
+
+def live_freshness():
+    """Frescura de un resultado calculado en vivo"""
+    return {'source': 'live', 'refreshed_at': datetime.now().isoformat(), 'staleness_seconds': 0.0}
+
+@app.before_request
+def start_background_jobs():
+    """Schedulers de vistas materializadas y particiones (en cada worker, después del fork)"""
+    materialized_views.start_scheduler()
+    partition_manager.start_scheduler()
+
+def require_service_token(view):
+    """Proteger endpoints internos con PYTHON_SERVICE_TOKEN (si está configurado)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = API_CONFIG['service_token']
+        if token and request.headers.get('X-Service-Token') != token:
+            return jsonify({'success': False, 'error': 'Token de servicio inválido'}), 401
+        return view(*args, **kwargs)
+    return wrapper
 
 # ============================================
 # ENDPOINTS BÁSICOS
@@ -42,6 +81,16 @@ def health():
         'version': '1.0.0'
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas en formato Prometheus (METRICS_ENABLED=true)"""
+    if not metrics.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Métricas desactivadas. Define METRICS_ENABLED=true'
+        }), 404
+    return Response(metrics.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/db/status', methods=['GET'])
 def db_status():
     """Verificar estado de la base de datos"""
@@ -53,35 +102,39 @@ def db_status():
 # ============================================
 
 @app.route('/api/analytics/basic', methods=['GET'])
+@cached_endpoint(response_cache, 'basic')
 def basic_analytics():
     """Analytics básicos - Sin dependencias externas"""
     try:
-        stats = db_manager.get_stats()
-        
-        # Obtener juegos por categoría
-        result = db_manager.execute_query("""
-            SELECT category, COUNT(*) as count 
-            FROM games 
-            GROUP BY category 
-            ORDER BY count DESC
-        """)
-        categories = result['data'] if result['success'] else []
+        # ?tables=false omite el conteo de information_schema
+        include_tables = arg_flag('tables', default=None)
         
-        # Obtener usuarios por rol
-        result = db_manager.execute_query("""
-            SELECT role, COUNT(*) as count 
-            FROM users 
-            GROUP BY role 
-            ORDER BY count DESC
-        """)
-        roles = result['data'] if result['success'] else []
+        # Snapshot en memoria, si no vista materializada, salvo ?live=true (o si no existen)
+        snapshot = None
+        if catalog_snapshot.enabled and not arg_flag('live'):
+            catalog_snapshot.refresh_if_stale()
+            snapshot = catalog_snapshot.basic_snapshot(analytics_queries.include_tables(include_tables))
+        if snapshot is not None:
+            freshness = snapshot_freshness(snapshot)
+        elif MATVIEW_CONFIG['enabled'] and not arg_flag('live'):
+            snapshot = materialized_views.basic_snapshot(
+                analytics_queries.include_tables(include_tables)
+            )
+            if snapshot is not None:
+                freshness = {'source': 'materialized', 'refreshed_at': snapshot['refreshed_at'],
+                             'staleness_seconds': snapshot['staleness_seconds']}
+        if snapshot is None:
+            # Stats, categorías y roles en un solo round trip
+            snapshot = analytics_queries.basic_snapshot(include_tables=include_tables)
+            freshness = live_freshness()
         
         return jsonify({
             'success': True,
-            'stats': stats,
-            'categories': categories,
-            'roles': roles,
-            'timestamp': datetime.now().isoformat()
+            'stats': snapshot['stats'],
+            'categories': snapshot['categories'],
+            'roles': snapshot['roles'],
+            'timestamp': datetime.now().isoformat(),
+            **freshness
         })
     except Exception as e:
         return jsonify({
@@ -94,58 +147,43 @@ def basic_analytics():
 # ============================================
 
 @app.route('/api/analytics/advanced', methods=['GET'])
+@cached_endpoint(response_cache, 'advanced')
 def advanced_analytics():
-    """Analytics avanzados con pandas (requiere pandas instalado)"""
+    """Analytics avanzados - Agregados en SQL, pandas como fallback"""
     try:
-        # Intentar importar pandas
-        try:
-            import pandas as pd
-        except ImportError:
-            return jsonify({
-                'success': False,
-                'error': 'pandas no está instalado. Ejecuta: pip install pandas',
-                'fallback': 'Usa /api/analytics/basic para analytics sin pandas'
-            }), 503
-        
-        # Conectar y obtener datos
-        conn = get_db_connection()
-        
-        # Games data
-        games_df = pd.read_sql_query("""
-            SELECT category, price, is_free, rating, downloads, created_at
-            FROM games
-        """, conn)
+        # ?engine=pandas fuerza el cálculo original con DataFrames
+        engine = request.args.get('engine', 'sql')
         
-        # Users data
-        users_df = pd.read_sql_query("""
-            SELECT role, created_at, is_active
-            FROM users
-        """, conn)
-        
-        conn.close()
-        
-        # Calcular estadísticas avanzadas
-        stats = {
-            'games': {
-                'total': len(games_df),
-                'by_category': games_df['category'].value_counts().to_dict() if len(games_df) > 0 else {},
-                'avg_price': float(games_df[games_df['is_free'] == False]['price'].mean()) if len(games_df[games_df['is_free'] == False]) > 0 else 0,
-                'avg_rating': float(games_df['rating'].mean()) if len(games_df) > 0 else 0,
-                'total_downloads': int(games_df['downloads'].sum()) if len(games_df) > 0 else 0,
-                'free_games': int((games_df['is_free'] == True).sum()) if len(games_df) > 0 else 0,
-                'paid_games': int((games_df['is_free'] == False).sum()) if len(games_df) > 0 else 0
-            },
-            'users': {
-                'total': len(users_df),
-                'by_role': users_df['role'].value_counts().to_dict() if len(users_df) > 0 else {},
-                'active_users': int(users_df[users_df['is_active'] == True].shape[0]) if len(users_df) > 0 else 0
-            }
-        }
+        # Snapshot en memoria, si no vista materializada, salvo ?live=true o ?engine=pandas
+        materialized = None
+        if catalog_snapshot.enabled and engine == 'sql' and not arg_flag('live'):
+            catalog_snapshot.refresh_if_stale()
+            materialized = catalog_snapshot.advanced_stats()
+        if materialized is not None:
+            stats = materialized['stats']
+            freshness = snapshot_freshness(materialized)
+        elif MATVIEW_CONFIG['enabled'] and engine == 'sql' and not arg_flag('live'):
+            materialized = materialized_views.advanced_stats()
+            if materialized is not None:
+                stats = materialized['stats']
+                freshness = {'source': 'materialized', 'refreshed_at': materialized['refreshed_at'],
+                             'staleness_seconds': materialized['staleness_seconds']}
+        if materialized is None:
+            try:
+                stats = advanced_engine.compute(engine=engine)
+            except ImportError:
+                return jsonify({
+                    'success': False,
+                    'error': 'pandas no está instalado. Ejecuta: pip install pandas',
+                    'fallback': 'Usa /api/analytics/basic para analytics sin pandas'
+                }), 503
+            freshness = live_freshness()
         
         return jsonify({
             'success': True,
             'stats': stats,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            **freshness
         })
         
     except Exception as e:
@@ -155,6 +193,7 @@ def advanced_analytics():
         }), 500
 
 @app.route('/api/analytics/trends', methods=['GET'])
+@cached_endpoint(response_cache, 'trends')
 def trends():
     """Tendencias temporales"""
     try:
@@ -169,32 +208,19 @@ def trends():
         else:
             days = 7
         
-        date_from = datetime.now() - timedelta(days=days)
+        date_from = (datetime.now() - timedelta(days=days)).date()
         
-        # Games trends
-        result = db_manager.execute_query("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM games
-            WHERE created_at >= %s
-            GROUP BY DATE(created_at)
-            ORDER BY date
-        """, (date_from,))
-        games_trends = result['data'] if result['success'] else []
-        
-        # Users trends
-        result = db_manager.execute_query("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM users
-            WHERE created_at >= %s
-            GROUP BY DATE(created_at)
-            ORDER BY date
-        """, (date_from,))
-        users_trends = result['data'] if result['success'] else []
+        # Conteos diarios desde el rollup (un registro por día)
+        daily_rollup.refresh_if_stale()
+        games_trends = daily_rollup.series('games', date_from)
+        users_trends = daily_rollup.series('users', date_from)
+        activities_trends = daily_rollup.series('activities', date_from)
         
         return jsonify({
             'success': True,
             'games': games_trends,
             'users': users_trends,
+            'activities': activities_trends,
             'period': period,
             'days': days
         })
@@ -206,56 +232,23 @@ def trends():
         }), 500
 
 @app.route('/api/analytics/predictions', methods=['GET'])
+@cached_endpoint(response_cache, 'predictions')
 def predictions():
-    """Predicciones simples basadas en tendencias"""
+    """Pronósticos de games, users, categorías y tipos de actividad (?method=auto|linear|...)"""
+    method = request.args.get('method', FORECAST_CONFIG['method'])
+    if method not in FORECAST_METHODS:
+        return jsonify({
+            'success': False,
+            'error': f"'method' debe ser uno de: {', '.join(FORECAST_METHODS)}"
+        }), 400
     try:
-        # Intentar usar pandas si está disponible
-        try:
-            import pandas as pd
-            use_pandas = True
-        except ImportError:
-            use_pandas = False
-        
-        date_from = datetime.now() - timedelta(days=30)
-        
-        if use_pandas:
-            conn = get_db_connection()
-            df = pd.read_sql_query("""
-                SELECT DATE(created_at) as date, COUNT(*) as count
-                FROM games
-                WHERE created_at >= %s
-                GROUP BY DATE(created_at)
-                ORDER BY date
-            """, conn, params=(date_from,))
-            conn.close()
-            
-            if len(df) > 0:
-                avg_daily = df['count'].mean()
-                predicted_7d = avg_daily * 7
-                predicted_30d = avg_daily * 30
-            else:
-                predicted_7d = 0
-                predicted_30d = 0
-        else:
-            # Sin pandas - cálculo básico
-            result = db_manager.execute_query("""
-                SELECT COUNT(*) as total
-                FROM games
-                WHERE created_at >= %s
-            """, (date_from,))
-            total = result['data'][0]['total'] if result['success'] else 0
-            avg_daily = total / 30 if total > 0 else 0
-            predicted_7d = avg_daily * 7
-            predicted_30d = avg_daily * 30
+        start, days = history_window()
+        daily_rollup.refresh_if_stale()
+        series = load_series(db_manager, daily_rollup, start, days)
         
         return jsonify({
             'success': True,
-            'predictions': {
-                'next_7_days': round(predicted_7d, 2),
-                'next_30_days': round(predicted_30d, 2),
-                'based_on_days': 30,
-                'method': 'pandas' if use_pandas else 'basic'
-            }
+            'predictions': predict(series, start, days, method)
         })
         
     except Exception as e:
@@ -264,6 +257,152 @@ def predictions():
             'error': str(e)
         }), 500
 
+@app.route('/api/analytics/jsonb', methods=['GET'])
+@cached_endpoint(response_cache, 'jsonb')
+def jsonb_query():
+    """Filtrar/agrupar actividades o métricas por sus JSONB (?contains=, ?path=, ?has=, ?key=&value=)"""
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    result = db_manager.execute_query(*build_query(filters))
+    if not result['success']:
+        return jsonify({
+            'success': False,
+            'error': result['error']
+        }), 400 if result.get('error_type') in INPUT_ERRORS else 500
+    return jsonify(query_result(filters, result['data']))
+
+@app.route('/api/analytics/active-users', methods=['GET'])
+@cached_endpoint(response_cache, 'active_users')
+def active_users_windows():
+    """DAU/WAU/MAU (y ?days=N) con sketches HyperLogLog, con su error_bound; ?exact=true para auditar"""
+    try:
+        end, windows = parse_window_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        exact = arg_flag('exact')
+        if not exact:
+            active_users.refresh_if_stale()
+        data = active_users.windows(end, windows, exact)
+        return jsonify(active_users_result(end, active_users.precision, exact, data))
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============================================
+# INGESTA DE EVENTOS
+# ============================================
+
+@app.route('/api/ingest/activities', methods=['POST'])
+@require_service_token
+def ingest_activities():
+    """Encolar eventos de user_activities (objeto, lista o NDJSON); se escriben en lotes con COPY"""
+    # Sin token configurado require_service_token deja pasar: la ingesta no se abre sin él
+    if not INGEST_CONFIG['enabled'] or not API_CONFIG['service_token']:
+        return jsonify({
+            'success': False,
+            'error': 'Ingesta de eventos desactivada. Define INGEST_ENABLED=true y PYTHON_SERVICE_TOKEN'
+        }), 404
+    try:
+        rows, errors = prepare_events(request.get_data(), request.mimetype)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not rows:
+        return jsonify({
+            'success': False,
+            'error': 'Ningún evento válido',
+            'rejected': len(errors),
+            'errors': errors[:MAX_ERRORS]
+        }), 400
+    if not activity_ingestor.offer(rows):
+        # Backpressure: el cliente reintenta después de un flush
+        return jsonify({
+            'success': False,
+            'error': 'Buffer de eventos lleno, reintentar más tarde'
+        }), 429, {'Retry-After': str(max(1, round(activity_ingestor.flush_interval)))}
+    return jsonify({
+        'success': True,
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': errors[:MAX_ERRORS]
+    }), 202
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Contadores y ocupación del buffer de ingesta"""
+    return jsonify({'success': True, 'stats': activity_ingestor.stats()})
+
+# ============================================
+# CACHE DE RESPUESTAS
+# ============================================
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+@require_service_token
+def invalidate_cache():
+    """Invalidar el cache (todo o {"endpoints": [...]}) - usado por el backend Node"""
+    payload = request.get_json(silent=True) or {}
+    endpoints = payload.get('endpoints')
+    if endpoints is not None and not isinstance(endpoints, list):
+        return jsonify({
+            'success': False,
+            'error': "'endpoints' debe ser una lista"
+        }), 400
+    
+    removed = response_cache.invalidate(endpoints)
+    # Escritura en el backend: el snapshot columnar se refresca en la próxima lectura y las
+    # vistas materializadas no se sirven hasta su próximo refresco (que se adelanta)
+    catalog_snapshot.mark_stale()
+    materialized_views.mark_stale()
+    return jsonify({
+        'success': True,
+        'invalidated': removed,
+        'endpoints': endpoints or 'all',
+        'source': payload.get('source')
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+@require_service_token
+def cache_stats():
+    """Estadísticas del cache de respuestas"""
+    return jsonify({'success': True, 'cache': response_cache.stats()})
+
+# ============================================
+# ADMIN
+# ============================================
+
+@app.route('/api/admin/slow-queries', methods=['GET', 'DELETE'])
+@require_service_token
+def slow_query_report():
+    """Top-N fingerprints de queries lentas por tiempo total (DELETE = reiniciar)"""
+    if not slow_queries.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Registro de queries lentas desactivado. Define SLOW_QUERY_ENABLED=true'
+        }), 404
+    if request.method == 'DELETE':
+        slow_queries.reset()
+        return jsonify({'success': True})
+    
+    order_by = request.args.get('order', 'total_ms')
+    if order_by not in SLOW_QUERY_ORDERS:
+        return jsonify({
+            'success': False,
+            'error': f"'order' debe ser uno de: {', '.join(SLOW_QUERY_ORDERS)}"
+        }), 400
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'success': True,
+        'threshold_ms': slow_queries.threshold * 1000,
+        'order': order_by,
+        'top': slow_queries.top(limit, order_by),
+        'recent': slow_queries.recent_entries(request.args.get('recent', 0, type=int))
+    })
+
 # ============================================
 # INICIO DEL SERVIDOR
 # ============================================
@@ -280,10 +419,18 @@ if __name__ == '__main__':
     print("📡 Endpoints disponibles:")
     print("   GET  /health                    - Health check")
     print("   GET  /api/db/status             - Estado de BD")
-    print("   GET  /api/analytics/basic       - Analytics básicos")
-    print("   GET  /api/analytics/advanced    - Analytics avanzados (pandas)")
+    print("   GET  /metrics                   - Métricas Prometheus (METRICS_ENABLED)")
+    print("   GET  /api/analytics/basic       - Analytics básicos (?live=true)")
+    print("   GET  /api/analytics/advanced    - Analytics avanzados (SQL/pandas, ?live=true)")
     print("   GET  /api/analytics/trends      - Tendencias temporales")
-    print("   GET  /api/analytics/predictions - Predicciones")
+    print("   GET  /api/analytics/predictions - Predicciones (?method=auto|linear|holt_winters|...)")
+    print("   GET  /api/analytics/jsonb       - Consultas JSONB de actividades/métricas")
+    print("   GET  /api/analytics/active-users - DAU/WAU/MAU (HyperLogLog, ?exact=true)")
+    print("   POST /api/ingest/activities     - Ingesta de eventos (JSON o NDJSON, 202/429)")
+    print("   GET  /api/ingest/stats          - Estado del buffer de ingesta")
+    print("   POST /api/cache/invalidate      - Invalidar cache de analytics")
+    print("   GET  /api/cache/stats           - Estadísticas del cache")
+    print("   GET  /api/admin/slow-queries    - Top de queries lentas (SLOW_QUERY_ENABLED)")
     print()
     print("=" * 70)
     print()
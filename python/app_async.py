@@ -0,0 +1,604 @@
+"""
+Battle.net Platform - Python Analytics Service (modo async / ASGI)
+Mismos endpoints y JSON que app.py, con asyncpg y queries concurrentes
+Ejecutar: hypercorn app_async:app --bind 0.0.0.0:5000  (o python app_async.py)
+"""
+import asyncio
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+from config import (
+    DB_CONFIG, DB_NAME, POOL_CONFIG, SERVER_CONFIG, API_CONFIG, ANALYTICS_CONFIG, MATVIEW_CONFIG, FORECAST_CONFIG,
+    INGEST_CONFIG, print_config
+)
+from db_pool import PoolExhaustedError
+from analytics_queries import CATEGORIES_SQL, ROLES_SQL, build_stats_query
+from advanced_stats import (
+    GAMES_SUMMARY_SQL, GAMES_BY_CATEGORY_SQL, USERS_SUMMARY_SQL, USERS_BY_ROLE_SQL, build_stats
+)
+from daily_rollup import DailyRollup, ROLLUP_ENTITIES
+from forecasting import FORECAST_METHODS, GROUPED_SERIES_SQL, add_grouped, bounds, history_window, predict
+from jsonb_queries import INPUT_ERRORS, build_query, decode_json, parse_filters, query_result
+from active_users import (
+    ActiveUsers, SKETCHES_SQL, active_users_result, exact_query, exact_windows, hll_windows, parse_window_args,
+    sketch_bounds
+)
+from partitions import PartitionManager
+from ingestion import ActivityIngestor, MAX_ERRORS, prepare_events
+from catalog_snapshot import CatalogSnapshot, snapshot_freshness
+from materialized_views import MaterializedViews, READ_BASIC_SQL, READ_ADVANCED_SQL, parse_basic, parse_advanced
+from response_cache import ResponseCache, cached_endpoint_async
+from instrumentation import metrics, instrument_quart, PROMETHEUS_CONTENT_TYPE
+from json_provider import install_json_quart
+from slow_query_log import slow_queries, SLOW_QUERY_ORDERS
+
+app = cors(Quart(__name__), allow_origin=API_CONFIG['cors_origins'])
+install_json_quart(app)
+instrument_quart(app)
+
+response_cache = ResponseCache()
+daily_rollup = DailyRollup()
+active_users = ActiveUsers()
+partition_manager = PartitionManager()
+materialized_views = MaterializedViews()
+catalog_snapshot = CatalogSnapshot()
+activity_ingestor = ActivityIngestor()
+_pools = {}
+_pools_lock = asyncio.Lock()
+
+
+# ============================================
+# POOL ASYNC (asyncpg)
+# ============================================
+
+def to_asyncpg(query):
+    """Convertir placeholders %s (psycopg2) a $1, $2... (asyncpg)"""
+    counter = iter(range(1, 10000))
+    return re.sub(r'%s', lambda _: f"${next(counter)}", query)
+
+
+async def get_async_pool(database=None):
+    """Pool asyncpg compartido (None = DB_NAME, False = sin database)"""
+    import asyncpg
+
+    key = DB_NAME if database is None else database
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    async with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+        config = {
+            'host': DB_CONFIG['host'],
+            'port': DB_CONFIG['port'],
+            'user': DB_CONFIG['user'],
+            'password': DB_CONFIG['password'],
+            'timeout': DB_CONFIG['connect_timeout']
+        }
+        if database is not False:
+            config['database'] = key
+        pool = await asyncpg.create_pool(
+            min_size=POOL_CONFIG['min_size'],
+            max_size=POOL_CONFIG['max_size'],
+            max_inactive_connection_lifetime=POOL_CONFIG['idle_timeout'],
+            **config
+        )
+        _pools[key] = pool
+    return pool
+
+
+async def fetch(query, *params, database=None):
+    """Ejecutar una query en una conexión del pool y retornar dicts"""
+    pool = await get_async_pool(database)
+    timed = metrics.enabled or slow_queries.enabled
+    if timed:
+        started = time.perf_counter()
+    try:
+        async with pool.acquire(timeout=POOL_CONFIG['wait_timeout']) as conn:
+            if timed:
+                acquired = time.perf_counter()
+                if metrics.enabled:
+                    metrics.observe_phase('pool_acquire', acquired - started)
+            rows = await conn.fetch(to_asyncpg(query), *params)
+    except asyncio.TimeoutError:
+        raise PoolExhaustedError(
+            f"Pool agotado: {POOL_CONFIG['max_size']} conexiones en uso y ninguna "
+            f"se liberó en {POOL_CONFIG['wait_timeout']:.1f}s"
+        )
+    except Exception:
+        if metrics.enabled:
+            metrics.record_query(query, time.perf_counter() - started, success=False)
+        raise
+    if timed:
+        duration = time.perf_counter() - acquired
+        if metrics.enabled:
+            metrics.record_query(query, duration, len(rows))
+        if slow_queries.enabled:
+            # Sin plan: EXPLAIN solo se obtiene por la conexión psycopg2 de execute_query
+            slow_queries.record(query, duration, rows=len(rows))
+    return [dict(row) for row in rows]
+
+
+async def fetch_or_default(query, *params, default=None):
+    """Como fetch pero retorna default si la query falla (semántica de execute_query)"""
+    try:
+        return await fetch(query, *params)
+    except Exception:
+        return [] if default is None else default
+
+
+@app.before_serving
+async def open_pools():
+    try:
+        await get_async_pool()
+    except Exception as e:
+        # El servicio arranca igual; los endpoints reportarán el error
+        print(f"⚠️  No se pudo abrir el pool asyncpg: {e}")
+    # El refresco de vistas y el mantenimiento de particiones usan psycopg2 en sus propios hilos
+    materialized_views.start_scheduler()
+    partition_manager.start_scheduler()
+
+
+@app.after_serving
+async def close_pools():
+    materialized_views.stop_scheduler()
+    partition_manager.stop_scheduler()
+    # Vaciar el buffer de ingesta antes de cerrar (el escritor usa el pool psycopg2)
+    await asyncio.to_thread(activity_ingestor.stop)
+    for pool in _pools.values():
+        await pool.close()
+    _pools.clear()
+
+
+def arg_flag(name, default=False):
+    """Leer un flag booleano de la query string (?live=true, ?tables=false)"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no')
+
+
+def live_freshness():
+    """Frescura de un resultado calculado en vivo"""
+    return {'source': 'live', 'refreshed_at': datetime.now().isoformat(), 'staleness_seconds': 0.0}
+
+
+def view_freshness(snapshot):
+    return {'source': 'materialized', 'refreshed_at': snapshot['refreshed_at'],
+            'staleness_seconds': snapshot['staleness_seconds']}
+
+
+def require_service_token(view):
+    """Proteger endpoints internos con PYTHON_SERVICE_TOKEN (si está configurado)"""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        token = API_CONFIG['service_token']
+        if token and request.headers.get('X-Service-Token') != token:
+            return jsonify({'success': False, 'error': 'Token de servicio inválido'}), 401
+        return await view(*args, **kwargs)
+    return wrapper
+
+# ============================================
+# ENDPOINTS BÁSICOS
+# ============================================
+
+@app.route('/health', methods=['GET'])
+async def health():
+    """Health check - Verificar que el servicio funciona"""
+    return jsonify({
+        'status': 'OK',
+        'service': 'Python Analytics Service',
+        'timestamp': datetime.now().isoformat(),
+        'version': '1.0.0'
+    })
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Métricas en formato Prometheus (METRICS_ENABLED=true)"""
+    if not metrics.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Métricas desactivadas. Define METRICS_ENABLED=true'
+        }), 404
+    return Response(metrics.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/api/db/status', methods=['GET'])
+async def db_status():
+    """Verificar estado de la base de datos"""
+    try:
+        rows = await fetch("SELECT current_setting('server_version_num')::int AS version", database=False)
+        version = rows[0]['version']
+        return jsonify({
+            'success': True,
+            'version': version,
+            'version_str': f"{version // 10000}.{(version % 10000) // 100}"
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e) if str(e) else repr(e),
+            'error_type': type(e).__name__
+        })
+
+# ============================================
+# ENDPOINTS DE ANALYTICS
+# ============================================
+
+@app.route('/api/analytics/basic', methods=['GET'])
+@cached_endpoint_async(response_cache, 'basic')
+async def basic_analytics():
+    """Analytics básicos - stats, categorías y roles en paralelo"""
+    try:
+        include_tables = arg_flag('tables', default=ANALYTICS_CONFIG['count_tables'])
+
+        # Snapshot en memoria, si no vista materializada, salvo ?live=true (o si no existen)
+        snapshot = None
+        rows = []
+        if catalog_snapshot.enabled and not arg_flag('live'):
+            # El refresco usa psycopg2: fuera del event loop; la lectura es NumPy en memoria
+            await asyncio.to_thread(catalog_snapshot.refresh_if_stale)
+            snapshot = catalog_snapshot.basic_snapshot(include_tables)
+        if snapshot is None and MATVIEW_CONFIG['enabled'] and not arg_flag('live'):
+            rows = await fetch_or_default(READ_BASIC_SQL)
+            if not materialized_views.current(rows):
+                rows = []
+        if snapshot is not None:
+            stats, categories, roles = snapshot['stats'], snapshot['categories'], snapshot['roles']
+            freshness = snapshot_freshness(snapshot)
+        elif rows:
+            snapshot = parse_basic(rows, include_tables)
+            stats, categories, roles = snapshot['stats'], snapshot['categories'], snapshot['roles']
+            freshness = view_freshness(snapshot)
+        else:
+            stat_rows, categories, roles = await asyncio.gather(
+                fetch_or_default(build_stats_query(include_tables)),
+                fetch_or_default(CATEGORIES_SQL),
+                fetch_or_default(ROLES_SQL)
+            )
+
+            stats = {'tables': 0} if include_tables else {}
+            stats.update({'users': 0, 'games': 0})
+            for row in stat_rows:
+                stats[row['key']] = row['count']
+            freshness = live_freshness()
+
+        return jsonify({
+            'success': True,
+            'stats': stats,
+            'categories': categories,
+            'roles': roles,
+            'timestamp': datetime.now().isoformat(),
+            **freshness
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/analytics/advanced', methods=['GET'])
+@cached_endpoint_async(response_cache, 'advanced')
+async def advanced_analytics():
+    """Analytics avanzados - agregados SQL en paralelo"""
+    try:
+        snapshot = None
+        rows = []
+        if catalog_snapshot.enabled and not arg_flag('live'):
+            await asyncio.to_thread(catalog_snapshot.refresh_if_stale)
+            snapshot = catalog_snapshot.advanced_stats()
+        if snapshot is None and MATVIEW_CONFIG['enabled'] and not arg_flag('live'):
+            rows = await fetch_or_default(READ_ADVANCED_SQL)
+            if not materialized_views.current(rows):
+                rows = []
+        if snapshot is not None:
+            stats = snapshot['stats']
+            freshness = snapshot_freshness(snapshot)
+        elif rows:
+            materialized = parse_advanced(rows)
+            stats = materialized['stats']
+            freshness = view_freshness(materialized)
+        else:
+            games, by_category, users, by_role = await asyncio.gather(
+                fetch(GAMES_SUMMARY_SQL),
+                fetch(GAMES_BY_CATEGORY_SQL),
+                fetch(USERS_SUMMARY_SQL),
+                fetch(USERS_BY_ROLE_SQL)
+            )
+            stats = build_stats(
+                games[0],
+                {row['category']: row['count'] for row in by_category},
+                users[0],
+                {row['role']: row['count'] for row in by_role}
+            )
+            freshness = live_freshness()
+
+        return jsonify({
+            'success': True,
+            'stats': stats,
+            'timestamp': datetime.now().isoformat(),
+            **freshness
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+async def rollup_series(entity, date_from):
+    """Conteos diarios desde daily_rollups (o en vivo si no existe la tabla)"""
+    try:
+        return await fetch("""
+            SELECT day AS date, count
+            FROM daily_rollups
+            WHERE entity = %s AND day >= %s
+            ORDER BY day
+        """, entity, date_from)
+    except Exception:
+        return await fetch_or_default(f"""
+            SELECT DATE(created_at) as date, COUNT(*) as count
+            FROM {ROLLUP_ENTITIES[entity]}
+            WHERE created_at >= %s
+            GROUP BY DATE(created_at)
+            ORDER BY date
+        """, datetime.combine(date_from, datetime.min.time()))
+
+@app.route('/api/analytics/trends', methods=['GET'])
+@cached_endpoint_async(response_cache, 'trends')
+async def trends():
+    """Tendencias temporales - games, users y activities en paralelo"""
+    try:
+        period = request.args.get('period', '7d')
+        days = {'7d': 7, '30d': 30, '1y': 365}.get(period, 7)
+        date_from = (datetime.now() - timedelta(days=days)).date()
+
+        # El refresco del rollup usa psycopg2: fuera del event loop
+        await asyncio.to_thread(daily_rollup.refresh_if_stale)
+        games_trends, users_trends, activities_trends = await asyncio.gather(
+            rollup_series('games', date_from),
+            rollup_series('users', date_from),
+            rollup_series('activities', date_from)
+        )
+
+        return jsonify({
+            'success': True,
+            'games': games_trends,
+            'users': users_trends,
+            'activities': activities_trends,
+            'period': period,
+            'days': days
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+async def forecast_series(start, days):
+    """Series de pronóstico: games/users del rollup y categorías/actividades en paralelo"""
+    games, users, *grouped = await asyncio.gather(
+        rollup_series('games', start),
+        rollup_series('users', start),
+        *(fetch_or_default(query, *bounds(start, days)) for query in GROUPED_SERIES_SQL.values())
+    )
+    groups = {('games', None): games, ('users', None): users}
+    for kind, rows in zip(GROUPED_SERIES_SQL, grouped):
+        add_grouped(groups, kind, rows)
+    return groups
+
+@app.route('/api/analytics/predictions', methods=['GET'])
+@cached_endpoint_async(response_cache, 'predictions')
+async def predictions():
+    """Pronósticos de games, users, categorías y tipos de actividad (?method=auto|linear|...)"""
+    method = request.args.get('method', FORECAST_CONFIG['method'])
+    if method not in FORECAST_METHODS:
+        return jsonify({
+            'success': False,
+            'error': f"'method' debe ser uno de: {', '.join(FORECAST_METHODS)}"
+        }), 400
+    try:
+        start, days = history_window()
+        await asyncio.to_thread(daily_rollup.refresh_if_stale)
+        series = await forecast_series(start, days)
+
+        return jsonify({
+            'success': True,
+            # Ajuste NumPy (ms): fuera del event loop
+            'predictions': await asyncio.to_thread(predict, series, start, days, method)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/analytics/jsonb', methods=['GET'])
+@cached_endpoint_async(response_cache, 'jsonb')
+async def jsonb_query():
+    """Filtrar/agrupar actividades o métricas por sus JSONB (?contains=, ?path=, ?has=, ?key=&value=)"""
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    sql, params = build_query(filters)
+    try:
+        rows = await fetch(sql, *params)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400 if type(e).__name__ in INPUT_ERRORS else 500
+    return jsonify(query_result(filters, decode_json(rows, filters['source'])))
+
+@app.route('/api/analytics/active-users', methods=['GET'])
+@cached_endpoint_async(response_cache, 'active_users')
+async def active_users_windows():
+    """DAU/WAU/MAU (y ?days=N) con sketches HyperLogLog, con su error_bound; ?exact=true para auditar"""
+    try:
+        end, windows = parse_window_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        exact = arg_flag('exact')
+        data = None
+        if not exact:
+            # El refresco de los sketches usa psycopg2: fuera del event loop
+            await asyncio.to_thread(active_users.refresh_if_stale)
+            try:
+                rows = await fetch(SKETCHES_SQL, *sketch_bounds(end, windows, active_users.precision))
+                data = hll_windows(rows, end, windows, active_users.precision)
+            except Exception:
+                pass  # Sin tabla de sketches (setup antiguo): conteo exacto
+        if data is None:
+            sql, params = exact_query(end, windows)
+            data = exact_windows((await fetch(sql, *params))[0], end, windows)
+
+        return jsonify(active_users_result(end, active_users.precision, exact, data))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============================================
+# INGESTA DE EVENTOS
+# ============================================
+
+@app.route('/api/ingest/activities', methods=['POST'])
+@require_service_token
+async def ingest_activities():
+    """Encolar eventos de user_activities (objeto, lista o NDJSON); el COPY corre en el hilo escritor"""
+    # Sin token configurado require_service_token deja pasar: la ingesta no se abre sin él
+    if not INGEST_CONFIG['enabled'] or not API_CONFIG['service_token']:
+        return jsonify({
+            'success': False,
+            'error': 'Ingesta de eventos desactivada. Define INGEST_ENABLED=true y PYTHON_SERVICE_TOKEN'
+        }), 404
+    try:
+        rows, errors = prepare_events(await request.get_data(), request.mimetype)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not rows:
+        return jsonify({
+            'success': False,
+            'error': 'Ningún evento válido',
+            'rejected': len(errors),
+            'errors': errors[:MAX_ERRORS]
+        }), 400
+    if not activity_ingestor.offer(rows):
+        # Backpressure: el cliente reintenta después de un flush
+        return jsonify({
+            'success': False,
+            'error': 'Buffer de eventos lleno, reintentar más tarde'
+        }), 429, {'Retry-After': str(max(1, round(activity_ingestor.flush_interval)))}
+    return jsonify({
+        'success': True,
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': errors[:MAX_ERRORS]
+    }), 202
+
+
+@app.route('/api/ingest/stats', methods=['GET'])
+async def ingest_stats():
+    """Contadores y ocupación del buffer de ingesta"""
+    return jsonify({'success': True, 'stats': activity_ingestor.stats()})
+
+
+# ============================================
+# CACHE DE RESPUESTAS
+# ============================================
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+@require_service_token
+async def invalidate_cache():
+    """Invalidar el cache (todo o {"endpoints": [...]}) - usado por el backend Node"""
+    payload = await request.get_json(silent=True) or {}
+    endpoints = payload.get('endpoints')
+    if endpoints is not None and not isinstance(endpoints, list):
+        return jsonify({
+            'success': False,
+            'error': "'endpoints' debe ser una lista"
+        }), 400
+
+    removed = response_cache.invalidate(endpoints)
+    # Escritura en el backend: el snapshot columnar se refresca en la próxima lectura y las
+    # vistas materializadas no se sirven hasta su próximo refresco (que se adelanta)
+    catalog_snapshot.mark_stale()
+    materialized_views.mark_stale()
+    return jsonify({
+        'success': True,
+        'invalidated': removed,
+        'endpoints': endpoints or 'all',
+        'source': payload.get('source')
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+@require_service_token
+async def cache_stats():
+    """Estadísticas del cache de respuestas"""
+    return jsonify({'success': True, 'cache': response_cache.stats()})
+
+# ============================================
+# ADMIN
+# ============================================
+
+@app.route('/api/admin/slow-queries', methods=['GET', 'DELETE'])
+@require_service_token
+async def slow_query_report():
+    """Top-N fingerprints de queries lentas por tiempo total (DELETE = reiniciar)"""
+    if not slow_queries.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Registro de queries lentas desactivado. Define SLOW_QUERY_ENABLED=true'
+        }), 404
+    if request.method == 'DELETE':
+        slow_queries.reset()
+        return jsonify({'success': True})
+    
+    order_by = request.args.get('order', 'total_ms')
+    if order_by not in SLOW_QUERY_ORDERS:
+        return jsonify({
+            'success': False,
+            'error': f"'order' debe ser uno de: {', '.join(SLOW_QUERY_ORDERS)}"
+        }), 400
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'success': True,
+        'threshold_ms': slow_queries.threshold * 1000,
+        'order': order_by,
+        'top': slow_queries.top(limit, order_by),
+        'recent': slow_queries.recent_entries(request.args.get('recent', 0, type=int))
+    })
+
+# ============================================
+# INICIO DEL SERVIDOR
+# ============================================
+
+if __name__ == '__main__':
+    print("=" * 70)
+    print("🚀 Battle.net - Python Analytics Service (async)")
+    print("=" * 70)
+    print()
+    print_config()
+    print()
+    print(f"🌐 Servidor ASGI iniciando en: http://{SERVER_CONFIG['host']}:{SERVER_CONFIG['port']}")
+    print()
+
+    try:
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+    except ImportError:
+        print("⚠️  hypercorn no está instalado, usando el servidor de desarrollo de Quart")
+        app.run(host=SERVER_CONFIG['host'], port=SERVER_CONFIG['port'], debug=SERVER_CONFIG['debug'])
+        sys.exit(0)
+
+    hypercorn_config = Config()
+    hypercorn_config.bind = [f"{SERVER_CONFIG['host']}:{SERVER_CONFIG['port']}"]
+    asyncio.run(serve(app, hypercorn_config))
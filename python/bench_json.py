@@ -0,0 +1,151 @@
+"""
+Benchmark del proveedor JSON: jsonify original (json de Python) vs json_provider (orjson)
+Verifica que los bytes de cada respuesta sean idénticos y mide serialización y compresión
+No necesita base de datos: los payloads imitan las filas de psycopg2 (RealDictRow, Decimal, date)
+
+Uso:
+    python bench_json.py [--rows 5000] [--iterations 50] [--indent]
+"""
+import argparse
+import gzip
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import RealDictRow
+
+from json_provider import FastJSONProvider, compress, brotli, orjson
+
+NAMES = ['José', 'Zoë', 'Ana', 'Łukasz', 'Nguyễn', 'Søren', 'María', 'Kenji', 'Amélie', 'Björn']
+
+
+def row(**values):
+    record = RealDictRow()
+    record.update(values)
+    return record
+
+
+def build_payloads(rows, seed=42):
+    """Respuestas con la forma de los endpoints del servicio"""
+    rng = random.Random(seed)
+    now = datetime(2024, 6, 1, 12, 30, 15)
+    today = date(2024, 6, 1)
+
+    users = [row(id=i, username=f"{rng.choice(NAMES).lower()}_{i}", email=f"user{i}@example.com",
+                 display_name=f"{rng.choice(NAMES)} {rng.choice(NAMES)} 🎮" if i % 7 == 0 else rng.choice(NAMES),
+                 role=rng.choice(['user', 'admin', 'moderator']), is_active=i % 11 != 0,
+                 created_at=now - timedelta(seconds=rng.randint(0, 86400 * 365)),
+                 last_login=None if i % 5 == 0 else now - timedelta(minutes=rng.randint(0, 10000)))
+             for i in range(1, rows + 1)]
+    trends = [row(date=today - timedelta(days=d), entity=entity, count=rng.randint(0, 5000),
+                  revenue=Decimal(rng.randint(0, 10 ** 7)) / 100)
+              for d in range(365) for entity in ('users', 'games', 'activities')]
+    activities = [row(id=i, user_id=rng.randint(1, rows), activity_type='play',
+                      metadata={'game': f"Título {i % 97}", 'minutes': rng.randint(1, 300),
+                                'score': round(rng.uniform(0, 100), 2), 'ratio': rng.random()},
+                      created_at=now - timedelta(seconds=i))
+                  for i in range(rows)]
+
+    return {
+        'basic': {'success': True, 'data': {
+            'stats': {'tables': 5, 'users': rows, 'games': rows // 5},
+            'categories': [row(category=c, count=rng.randint(1, 900))
+                           for c in ('Acción', 'Estrategia', 'RPG', 'Deportes', 'Simulación')],
+            'roles': [row(role=r, count=rng.randint(1, 900)) for r in ('user', 'admin', 'moderator')]
+        }, 'source': 'view', 'refreshed_at': now.isoformat(), 'staleness_seconds': 2.417},
+        'advanced': {'success': True, 'stats': {
+            'games': {'total': 2000, 'avg_price': Decimal('29.9900'), 'max_price': Decimal('69.99'),
+                      'by_category': {c: {'count': rng.randint(1, 400), 'avg_price': Decimal('19.49')}
+                                      for c in ('Acción', 'Estrategia', 'RPG')}},
+            'users': {'total': rows, 'active_ratio': 0.8734, 'last_signup': now,
+                      'last_login': now.replace(tzinfo=timezone(timedelta(hours=-3)))}
+        }},
+        'trends': {'success': True, 'data': trends, 'period': '365d'},
+        'predictions': {'success': True, 'predictions': [
+            {'date': (today + timedelta(days=d)).isoformat(), 'value': rng.uniform(0, 1e6),
+             'lower': rng.uniform(0, 1e5), 'upper': rng.uniform(1e5, 1e7)} for d in range(90)]},
+        'users': {'success': True, 'data': users, 'count': len(users)},
+        'activities': {'success': True, 'data': activities},
+        # Casos que orjson no cubre: se delegan a json y deben dar los mismos bytes
+        'fallbacks': {'big_int': 2 ** 70, 'int_keys': {10: 'a', 9: 'b'}, 'tiny': 1e-07,
+                      'huge': 1.5e+300, 'surrogate': '\ud800', 'text': 'e-mail 2e5 0.00001'},
+    }
+
+
+def timed(fn, obj, iterations, repeat=3):
+    """Mejor tiempo por operación (ms) de `repeat` rondas"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(obj)
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización JSON de las respuestas')
+    parser.add_argument('--rows', type=int, default=5000, help='Filas de los listados (users, activities)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--indent', action='store_true', help='Formato de debug (indent=2)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    baseline = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app, encoder='auto', ensure_ascii=True)
+    for provider in (baseline, fast):
+        provider.compact = not args.indent
+
+    payloads = build_payloads(args.rows)
+    encoder = 'orjson' if fast.use_orjson else 'json (orjson no instalado)'
+    print(f"📦 {len(payloads)} payloads, {args.rows} filas, {args.iterations} iteraciones - encoder: {encoder}")
+    print()
+    print(f"{'Payload':<12} {'bytes':>10} {'iguales':>8} {'jsonify ms':>11} {'nuevo ms':>9} {'x':>6}"
+          f" {'gzip':>14} {'br':>14}")
+
+    mismatches = []
+    with app.app_context():
+        for name, payload in payloads.items():
+            expected = baseline.response(payload).get_data()
+            actual = fast.response(payload).get_data()
+            same = expected == actual
+            if not same:
+                mismatches.append(name)
+
+            old_ms = timed(baseline.response, payload, args.iterations)
+            new_ms = timed(fast.response, payload, args.iterations)
+
+            gz = compress(expected, 'gzip')
+            gz_ms = timed(lambda data: compress(data, 'gzip'), expected, 5)
+            ratio = f"{len(gz) / len(expected):.0%} {gz_ms:.1f}ms"
+            if brotli is not None:
+                br = compress(expected, 'br')
+                br_ms = timed(lambda data: compress(data, 'br'), expected, 5)
+                br_text = f"{len(br) / len(expected):.0%} {br_ms:.1f}ms"
+            else:
+                br_text = '-'
+            assert gzip.decompress(gz) == expected
+
+            print(f"{name:<12} {len(expected):>10} {'sí' if same else 'NO':>8} {old_ms:>11.3f} {new_ms:>9.3f}"
+                  f" {old_ms / new_ms:>5.1f}x {ratio:>14} {br_text:>14}")
+
+    # Única diferencia conocida: NaN/Infinity (json emite NaN, que no es JSON válido; orjson emite null)
+    if orjson is not None and fast.use_orjson:
+        with app.app_context():
+            nan = fast.response({'avg_price': float('nan')}).get_data()
+        print()
+        print(f"ℹ️  NaN/Infinity: jsonify -> NaN, orjson -> {nan.decode().strip()} (JSON_ENCODER=stdlib conserva NaN)")
+
+    print()
+    if mismatches:
+        print(f"❌ Salida distinta en: {', '.join(mismatches)}")
+        sys.exit(1)
+    print("✅ Bytes idénticos a jsonify en todos los payloads")
+
+
+if __name__ == '__main__':
+    main()
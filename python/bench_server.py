@@ -0,0 +1,124 @@
+"""
+Benchmark de throughput: servidor de desarrollo de Flask vs serve.py (gunicorn)
+Por defecto /health (sin base) y /api/analytics/basic?live=true (una query a PostgreSQL por request)
+Uso: python bench_server.py [--path /health,/api/analytics/advanced?live=true] [--concurrency 16] [--duration 10]
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    'flask-dev': [sys.executable, '-c',
+                  "from app import app; from config import SERVER_CONFIG as c; "
+                  "app.run(host=c['host'], port=c['port'], debug=False, threaded=True)"],
+    'gunicorn': [sys.executable, 'serve.py']
+}
+
+
+def wait_until_up(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def drive(port, path, concurrency, duration):
+    """Clientes keep-alive en paralelo durante `duration` segundos"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local = []
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    # Sin base de datos los endpoints de analytics responden 500 en microsegundos
+                    with lock:
+                        errors[0] += 1
+                    continue
+                local.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': pick(0.50),
+        'p99_ms': pick(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--path', default='/health,/api/analytics/basic?live=true',
+                        help='Rutas separadas por coma')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--servers', default=','.join(SERVERS))
+    args = parser.parse_args()
+
+    # Sin cache de respuestas: cada request de analytics llega a PostgreSQL
+    env = dict(os.environ, PYTHON_SERVICE_PORT=str(args.port), PYTHON_SERVICE_HOST='127.0.0.1',
+               CACHE_ENABLED='false', MATVIEWS_SCHEDULER='false')
+    paths = args.path.split(',')
+    print(f"📈 {', '.join(paths)} - {args.concurrency} clientes, {args.duration:.0f}s por servidor y ruta")
+    print()
+    print(f"{'Servidor':<12} {'Ruta':<34} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for name in args.servers.split(','):
+        proc = subprocess.Popen(SERVERS[name], cwd=HERE, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_up(args.port):
+                print(f"{name:<12} no arrancó")
+                continue
+            for path in paths:
+                drive(args.port, path, args.concurrency, 1)  # Calentamiento
+                result = drive(args.port, path, args.concurrency, args.duration)
+                print(f"{name:<12} {path:<34} {result['rps']:>10.0f} {result['p50_ms']:>9.2f} "
+                      f"{result['p99_ms']:>9.2f} {result['errors']:>8}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+if __name__ == '__main__':
+    main()
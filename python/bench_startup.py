@@ -0,0 +1,123 @@
+"""
+Benchmark de arranque: tiempo de importación de los módulos y de los comandos CLI
+Cada medición es un proceso nuevo (como un worker o un script); reporta mediana y mínimo
+
+Uso:
+    python bench_startup.py run [--runs 15] [--output antes.json]
+    python bench_startup.py detail app            # módulos más lentos (python -X importtime)
+    python bench_startup.py compare antes.json despues.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Nombre -> argumentos de python
+TARGETS = {
+    'import config': ['-c', 'import config'],
+    'import db_manager': ['-c', 'import db_manager'],
+    'import db_setup_improved': ['-c', 'import db_setup_improved'],
+    'import setup': ['-c', 'import setup'],
+    'import verificar_registro': ['-c', 'import verificar_registro'],
+    'import app (worker)': ['-c', 'import app'],
+    'import app_async (worker)': ['-c', 'import app_async'],
+    'utils.py (ayuda)': ['utils.py'],
+    'utils.py check': ['utils.py', 'check'],
+}
+
+
+def run_once(args):
+    """Segundos de pared de un proceso python nuevo"""
+    env = dict(os.environ, MATVIEWS_SCHEDULER='false', DB_POOL_WAIT_TIMEOUT='1')
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=HERE, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def run(args):
+    names = args.targets.split(',') if args.targets else list(TARGETS)
+    baseline = statistics.median(run_once(['-c', 'pass']) for _ in range(args.runs))
+    results = {'python_ms': round(baseline * 1000, 1), 'targets': {}}
+
+    print(f"⏱️  {len(names)} objetivos x {args.runs} procesos (intérprete vacío: {baseline * 1000:.1f} ms)")
+    print()
+    print(f"{'Objetivo':<32} {'mediana ms':>11} {'mín ms':>9} {'sin intérprete':>15}")
+    for name in names:
+        run_once(TARGETS[name])  # Calentar el cache de disco / bytecode
+        samples = [run_once(TARGETS[name]) for _ in range(args.runs)]
+        median = statistics.median(samples)
+        results['targets'][name] = {
+            'median_ms': round(median * 1000, 1),
+            'min_ms': round(min(samples) * 1000, 1),
+            'net_ms': round((median - baseline) * 1000, 1)
+        }
+        stats = results['targets'][name]
+        print(f"{name:<32} {stats['median_ms']:>11.1f} {stats['min_ms']:>9.1f} {stats['net_ms']:>15.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print()
+        print(f"💾 Resultados guardados en {args.output}")
+
+
+def detail(args):
+    """Módulos con mayor tiempo acumulado de importación"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {args.module}'],
+                          cwd=HERE, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), int(parts[0].split(':')[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    print(f"{'acumulado ms':>12} {'propio ms':>10}  módulo")
+    for cumulative, own, module in rows[:args.top]:
+        print(f"{cumulative / 1000:>12.1f} {own / 1000:>10.1f}  {module}")
+
+
+def compare(args):
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"{'Objetivo':<32} {'antes ms':>9} {'después ms':>11} {'cambio':>8}")
+    for name, new in after['targets'].items():
+        old = before['targets'].get(name)
+        if not old:
+            continue
+        change = (new['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+        print(f"{name:<32} {old['median_ms']:>9.1f} {new['median_ms']:>11.1f} {change:>+7.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de tiempo de arranque')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='Medir todos los objetivos')
+    run_parser.add_argument('--runs', type=int, default=15, help='Procesos por objetivo')
+    run_parser.add_argument('--targets', help=f"Lista separada por comas (default: todos): {', '.join(TARGETS)}")
+    run_parser.add_argument('--output', help='Archivo JSON de resultados')
+
+    detail_parser = sub.add_parser('detail', help='Desglose de python -X importtime')
+    detail_parser.add_argument('module')
+    detail_parser.add_argument('--top', type=int, default=20)
+
+    compare_parser = sub.add_parser('compare', help='Comparar dos resultados')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+    {'run': run, 'detail': detail, 'compare': compare}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
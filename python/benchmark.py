@@ -0,0 +1,332 @@
+"""
+Benchmark de latencia y throughput de todos los endpoints del servicio
+Usa una base PostgreSQL local dedicada (por defecto battlenet_bench)
+
+Uso:
+    python benchmark.py run --seed --users 10000 --games 2000 --activities 50000
+    python benchmark.py run --concurrency 8 --requests 200 --output results.json
+    python benchmark.py run --url http://localhost:5000      # servidor ya corriendo
+    python benchmark.py compare antes.json despues.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+ENDPOINTS = [
+    '/health',
+    '/api/db/status',
+    '/api/analytics/basic',
+    '/api/analytics/advanced',
+    '/api/analytics/trends?period=30d',
+    '/api/analytics/predictions'
+]
+
+
+# ============================================
+# CONTEO DE ROUND TRIPS
+# ============================================
+
+class RoundTripCounter:
+    """Contador global de round trips a PostgreSQL"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        with self._lock:
+            self.count += n
+
+    def reset(self):
+        with self._lock:
+            value, self.count = self.count, 0
+            return value
+
+
+round_trips = RoundTripCounter()
+
+
+def install_round_trip_counter():
+    """Hacer que get_db_connection() cree conexiones que cuentan round trips"""
+    import psycopg2.extensions
+    import config
+
+    class CountingCursorMixin:
+        def execute(self, *args, **kwargs):
+            round_trips.add()
+            return super().execute(*args, **kwargs)
+
+        def executemany(self, query, vars_list):
+            vars_list = list(vars_list)
+            round_trips.add(len(vars_list))
+            return super().executemany(query, vars_list)
+
+        def fetchmany(self, *args, **kwargs):
+            if self.name:  # Cursor del servidor: cada bloque es un round trip
+                round_trips.add()
+            return super().fetchmany(*args, **kwargs)
+
+    cursor_classes = {}
+
+    def counting_class(base):
+        if base not in cursor_classes:
+            cursor_classes[base] = type(f"Counting{base.__name__}", (CountingCursorMixin, base), {})
+        return cursor_classes[base]
+
+    class CountingConnection(psycopg2.extensions.connection):
+        def cursor(self, *args, **kwargs):
+            base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+            kwargs['cursor_factory'] = counting_class(base)
+            return super().cursor(*args, **kwargs)
+
+        def commit(self):
+            round_trips.add()
+            return super().commit()
+
+        def rollback(self):
+            round_trips.add()
+            return super().rollback()
+
+    config.DB_CONFIG['connection_factory'] = CountingConnection
+
+
+# ============================================
+# DATOS DE PRUEBA
+# ============================================
+
+def seed(users, games, activities, batch_size=5000):
+    """Crear la base de benchmark y poblarla con volúmenes configurables"""
+    from data_generator import seed_database
+
+    print(f"🌱 Poblando: {users} usuarios, {games} juegos, {activities} actividades...")
+    result = seed_database(users=users, games=games, activities=activities, batch_size=batch_size)
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error')}")
+        sys.exit(1)
+    print(f"   ✅ Listo en {result['seconds']:.1f}s")
+
+
+# ============================================
+# EJECUCIÓN
+# ============================================
+
+def make_requester(url):
+    """Retorna una función path -> status (en proceso o por HTTP)"""
+    if url:
+        import http.client
+        from urllib.parse import urlparse
+
+        parsed = urlparse(url)
+        local = threading.local()
+
+        def request_http(path):
+            if not hasattr(local, 'conn'):
+                local.conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+            try:
+                local.conn.request('GET', path)
+                response = local.conn.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                local.conn.close()
+                del local.conn
+                return 0
+        return request_http
+
+    from app import app
+    local = threading.local()
+
+    def request_in_process(path):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.get(path).status_code
+    return request_in_process
+
+
+def peak_rss_mb():
+    """RSS máximo del proceso en toda su vida (MB): no se puede atribuir a un endpoint"""
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bench_endpoint(request_fn, path, concurrency, total_requests, warmup):
+    """Lanzar total_requests a concurrencia fija y medir"""
+    for _ in range(warmup):
+        request_fn(path)
+    round_trips.reset()
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker():
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            status = request_fn(path)
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    trips = round_trips.reset()
+    return {
+        'requests': len(latencies),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0,
+        'db_round_trips_per_request': round(trips / len(latencies), 2) if latencies else 0
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    in_process = not args.url
+    if in_process:
+        install_round_trip_counter()
+    if args.seed:
+        seed(args.users, args.games, args.activities)
+
+    request_fn = make_requester(args.url)
+    endpoints = args.endpoints.split(',') if args.endpoints else ENDPOINTS
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(),
+            'mode': 'http' if args.url else 'in-process',
+            'database': os.environ.get('DB_NAME'),
+            'concurrency': args.concurrency,
+            'requests_per_endpoint': args.requests,
+            'seed': {'users': args.users, 'games': args.games, 'activities': args.activities} if args.seed else None,
+            # Pico de toda la corrida en proceso; con --url sería el del cliente, no el del servidor
+            'peak_rss_mb': None
+        },
+        'endpoints': {}
+    }
+
+    print(f"📈 {len(endpoints)} endpoints x {args.requests} requests, concurrencia {args.concurrency}"
+          f" ({results['meta']['mode']})")
+    print()
+    print(f"{'Endpoint':<36} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'RT/req':>7}")
+    for path in endpoints:
+        stats = bench_endpoint(request_fn, path, args.concurrency, args.requests, args.warmup)
+        if not in_process:
+            stats['db_round_trips_per_request'] = None  # No medible desde fuera del proceso
+        results['endpoints'][path] = stats
+        trips = stats['db_round_trips_per_request']
+        print(f"{path:<36} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {'-' if trips is None else f'{trips:.1f}':>7}")
+
+    if in_process:
+        results['meta']['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        print()
+        print(f"🧠 RSS máximo del proceso (toda la corrida): {results['meta']['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print()
+        print(f"💾 Resultados guardados en {args.output}")
+
+
+def compare(args):
+    """Comparar dos archivos de resultados"""
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"📊 {before['meta'].get('revision')} -> {after['meta'].get('revision')}")
+    print()
+    change = lambda a, b: f"{(b - a) / a * 100:+.0f}%" if a else 'n/a'
+    print(f"{'Endpoint':<36} {'req/s antes/después':>24} {'p95 ms antes/después':>26} {'RT/req':>10}")
+    for path, new in after['endpoints'].items():
+        old = before['endpoints'].get(path)
+        if not old:
+            continue
+        rps = f"{old['throughput_rps']:.0f}/{new['throughput_rps']:.0f} ({change(old['throughput_rps'], new['throughput_rps'])})"
+        p95 = f"{old['p95_ms']:.1f}/{new['p95_ms']:.1f} ({change(old['p95_ms'], new['p95_ms'])})"
+        trips = f"{old['db_round_trips_per_request']}/{new['db_round_trips_per_request']}"
+        print(f"{path:<36} {rps:>24} {p95:>26} {trips:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de endpoints del servicio de analytics')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='Ejecutar el benchmark')
+    run_parser.add_argument('--database', default='battlenet_bench', help='Base de datos de benchmark')
+    run_parser.add_argument('--url', help='URL de un servidor ya corriendo (por defecto: en proceso)')
+    run_parser.add_argument('--endpoints', help='Lista separada por comas (default: todos)')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--requests', type=int, default=200, help='Requests por endpoint')
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--no-cache', action='store_true', help='Desactivar el cache de respuestas')
+    run_parser.add_argument('--seed', action='store_true', help='Crear y poblar la base antes de medir')
+    run_parser.add_argument('--users', type=int, default=10000)
+    run_parser.add_argument('--games', type=int, default=2000)
+    run_parser.add_argument('--activities', type=int, default=50000)
+    run_parser.add_argument('--output', help='Archivo JSON de resultados')
+
+    compare_parser = sub.add_parser('compare', help='Comparar dos resultados')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        compare(args)
+        return
+
+    # Debe definirse antes de importar config (lee el entorno al importarse)
+    os.environ['DB_NAME'] = args.database
+    if args.no_cache:
+        os.environ['CACHE_ENABLED'] = 'false'
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
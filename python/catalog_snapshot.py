@@ -0,0 +1,475 @@
+"""
+Snapshot columnar en memoria de games y users (arrays NumPy)
+Categoría y rol codificados por diccionario, precios/ratings float, descargas int y flags int8
+Se refresca de forma incremental por updated_at y responde los agregados de
+/api/analytics/basic y /api/analytics/advanced con kernels vectorizados
+Uso: python catalog_snapshot.py [--synthetic 1000000] [--iterations 1000]
+"""
+import argparse
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from config import ANALYTICS_CONFIG, CATALOG_SNAPSHOT_CONFIG
+from db_pool import get_pool
+from analytics_queries import TABLES_COUNT_SQL
+from advanced_stats import build_stats
+
+# Tabla -> columnas leídas (id primero); la lista es cerrada: se interpola en SQL
+SNAPSHOT_TABLES = {
+    'games': ('id', 'category', 'price', 'is_free', 'rating', 'downloads'),
+    'users': ('id', 'role', 'is_active')
+}
+
+# numpy se importa en el primer refresco: importar las apps no lo requiere si el snapshot está desactivado
+np = None
+
+
+def load_numpy():
+    global np
+    if np is None:
+        import numpy  # Falla con ImportError si no está instalado
+        np = numpy
+    return np
+
+
+# Hasta este tamaño de diccionario se cuenta código por código en lugar de bincount
+SMALL_DICTIONARY = 32
+
+# Borrados: el contador de pg_stat no necesita recorrer la tabla
+DELETES_SQL = "SELECT n_tup_del FROM pg_stat_user_tables WHERE relid = to_regclass(%s)"
+
+
+class Dictionary:
+    """Codificación por diccionario: valor -> código int32 (-1 = NULL)"""
+
+    def __init__(self, values=()):
+        self.index = {value: code for code, value in enumerate(values)}
+
+    @property
+    def values(self):
+        return list(self.index)
+
+    def encode(self, column):
+        index = self.index
+        return np.fromiter(
+            (-1 if value is None else index.setdefault(value, len(index)) for value in column),
+            dtype=np.int32, count=len(column)
+        )
+
+
+def _floats(column):
+    return np.fromiter((math.nan if value is None else float(value) for value in column),
+                       dtype=np.float64, count=len(column))
+
+
+def _ints(column):
+    # SUM() ignora NULL: contarlos como 0 da el mismo total
+    return np.fromiter((value or 0 for value in column), dtype=np.int64, count=len(column))
+
+
+def _flags(column):
+    # Tres estados como en SQL: 1 = true, 0 = false, -1 = NULL (no cuenta en ninguno)
+    return np.fromiter((-1 if value is None else int(bool(value)) for value in column),
+                       dtype=np.int8, count=len(column))
+
+
+class ColumnarTable:
+    """Columnas de una tabla ordenadas por id; inmutable (cada cambio crea otra)"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @property
+    def ids(self):
+        return self.columns['id']
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    @classmethod
+    def empty(cls, encoders):
+        return cls.from_rows([], encoders)
+
+    @classmethod
+    def from_rows(cls, rows, encoders):
+        """Filas (tuplas en el orden de encoders) -> columnas"""
+        names = list(encoders)
+        data = list(zip(*rows)) if rows else [()] * len(names)
+        return cls({name: encoders[name](list(column)) for name, column in zip(names, data)})
+
+    def upsert(self, changed):
+        """Reemplazar filas existentes por id y agregar las nuevas (self si nada cambió)"""
+        if not len(changed):
+            return self
+        # Si un id viene repetido en el lote, gana la última versión
+        _, last = np.unique(changed.ids[::-1], return_index=True)
+        changed = changed.take(len(changed) - 1 - last)
+
+        positions = np.searchsorted(self.ids, changed.ids)
+        clipped = np.minimum(positions, max(len(self) - 1, 0))
+        found = (positions < len(self)) & (self.ids[clipped] == changed.ids) if len(self) else \
+            np.zeros(len(changed), dtype=bool)
+        if found.all() and all(np.array_equal(column[positions], changed.columns[name], equal_nan=True)
+                               for name, column in self.columns.items()):
+            return self  # Solo filas releídas por el solapamiento, sin cambios
+
+        columns = {}
+        for name, column in self.columns.items():
+            updated = column.copy()
+            updated[positions[found]] = changed.columns[name][found]
+            columns[name] = np.concatenate([updated, changed.columns[name][~found]])
+        order = np.argsort(columns['id'], kind='stable')
+        return ColumnarTable({name: column[order] for name, column in columns.items()})
+
+    def take(self, positions):
+        return ColumnarTable({name: column[positions] for name, column in self.columns.items()})
+
+    def retain(self, ids):
+        """Quitar las filas cuyo id ya no existe"""
+        keep = np.isin(self.ids, ids, assume_unique=True)
+        return self if keep.all() else self.take(np.flatnonzero(keep))
+
+
+# ============================================
+# KERNELS
+# ============================================
+
+def game_aggregates(games):
+    """Los mismos agregados que GAMES_SUMMARY_SQL"""
+    is_free = games.columns['is_free']
+    paid_games = np.count_nonzero(is_free == 0)
+    free_games = np.count_nonzero(is_free == 1)
+    price = games.columns['price']
+    paid_priced = (is_free == 0) & ~np.isnan(price)
+    rating = games.columns['rating']
+    rated = ~np.isnan(rating)
+    return {
+        'total': len(games),
+        'free_games': int(free_games),
+        'paid_games': int(paid_games),
+        'paid_price_sum': float(price.sum(where=paid_priced)),
+        'paid_price_count': int(np.count_nonzero(paid_priced)),
+        'rating_sum': float(rating.sum(where=rated)),
+        'rating_count': int(np.count_nonzero(rated)),
+        'total_downloads': int(games.columns['downloads'].sum())
+    }
+
+
+def code_counts(codes, dictionary):
+    """(cantidad de NULL, {valor: cantidad}); posición 0 = código -1 (NULL)"""
+    size = len(dictionary.index)
+    if size <= SMALL_DICTIONARY:
+        # Pocas categorías/roles: una comparación por código es más rápida que bincount (castea a intp)
+        counts = [np.count_nonzero(codes == code) for code in range(-1, size)]
+    else:
+        counts = np.bincount(codes + 1, minlength=size + 1)
+    return int(counts[0]), {value: int(count) for value, count in zip(dictionary.values, counts[1:]) if count}
+
+
+def grouped_counts(nulls, counts):
+    """[(valor, cantidad)] incluyendo NULL, de mayor a menor (como GROUP BY ... ORDER BY count DESC)"""
+    groups = list(counts.items())
+    if nulls:
+        groups.append((None, nulls))
+    return sorted(groups, key=lambda group: -group[1])
+
+
+class SnapshotState:
+    """Versión inmutable del snapshot (los lectores nunca ven una mezcla de dos refrescos)"""
+
+    def __init__(self, games, users, categories, roles, tables, version, refreshed_at):
+        self.games = games
+        self.users = users
+        self.categories = categories
+        self.roles = roles
+        self.tables = tables
+        self.version = version
+        self.refreshed_at = refreshed_at  # datetime local del último refresco
+        self.refreshed_monotonic = time.monotonic()
+        self._aggregates = None
+
+    def aggregates(self):
+        """Kernels sobre las columnas, una vez por versión (las lecturas siguientes son un dict)"""
+        if self._aggregates is None:
+            category_nulls, by_category = code_counts(self.games.columns['category'], self.categories)
+            role_nulls, by_role = code_counts(self.users.columns['role'], self.roles)
+            self._aggregates = {
+                'games': game_aggregates(self.games),
+                'by_category': by_category,
+                'category_nulls': category_nulls,
+                'users': {'total': len(self.users),
+                          'active_users': int(np.count_nonzero(self.users.columns['is_active'] == 1))},
+                'by_role': by_role,
+                'role_nulls': role_nulls
+            }
+        return self._aggregates
+
+
+def snapshot_freshness(result):
+    """Campos de frescura de la respuesta (source = snapshot)"""
+    return {'source': 'snapshot', 'snapshot_version': result['snapshot_version'],
+            'refreshed_at': result['refreshed_at'], 'staleness_seconds': result['staleness_seconds']}
+
+
+class CatalogSnapshot:
+    """Snapshot columnar de games/users con refresco incremental"""
+
+    def __init__(self, refresh_interval=None, overlap=None):
+        self.refresh_interval = CATALOG_SNAPSHOT_CONFIG['refresh_interval'] if refresh_interval is None \
+            else refresh_interval
+        self.overlap = CATALOG_SNAPSHOT_CONFIG['overlap'] if overlap is None else overlap
+        self.enabled = CATALOG_SNAPSHOT_CONFIG['enabled']
+        self._state = None
+        self._watermarks = {}  # tabla -> LOCALTIMESTAMP del servidor al empezar el último refresco
+        self._deletes = {}  # tabla -> n_tup_del visto
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self._stale = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def mark_stale(self):
+        """Forzar un refresco en la próxima lectura (p. ej. tras /api/cache/invalidate)"""
+        self._stale = True
+
+    # ============================================
+    # CARGA
+    # ============================================
+
+    def _encoders(self, table, state):
+        """Copia del diccionario del estado actual (los lectores siguen usando el suyo) y decoders"""
+        if table == 'games':
+            categories = Dictionary(state.categories.values if state else ())
+            return categories, {'id': _ints, 'category': categories.encode, 'price': _floats,
+                                'is_free': _flags, 'rating': _floats, 'downloads': _ints}
+        roles = Dictionary(state.roles.values if state else ())
+        return roles, {'id': _ints, 'role': roles.encode, 'is_active': _flags}
+
+    def _read(self, conn, table, encoders, since=None):
+        """Filas de la tabla (todas o updated_at >= since) por bloques de un cursor del servidor"""
+        query = f"SELECT {', '.join(SNAPSHOT_TABLES[table])} FROM {table}"
+        params = ()
+        if since is not None:
+            query += " WHERE updated_at >= %s"
+            params = (since,)
+        cursor = conn.cursor(name=f"snapshot_{uuid.uuid4().hex}")
+        itersize = ANALYTICS_CONFIG['itersize']
+        parts = []
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                parts.append(ColumnarTable.from_rows(rows, encoders))
+        finally:
+            cursor.close()
+        if not parts:
+            return ColumnarTable.empty(encoders)
+        merged = ColumnarTable({name: np.concatenate([part.columns[name] for part in parts])
+                                for name in encoders})
+        return merged.take(np.argsort(merged.ids, kind='stable'))
+
+    def _refresh_table(self, conn, cursor, table, state):
+        """(tabla actualizada, diccionario, si cambió, marcas para el próximo refresco)"""
+        dictionary, encoders = self._encoders(table, state)
+        current = getattr(state, table) if state else None
+        cursor.execute("SELECT LOCALTIMESTAMP")
+        started = cursor.fetchone()[0]
+        cursor.execute(DELETES_SQL, (table,))
+        row = cursor.fetchone()
+        deletes = row[0] if row else None
+
+        watermark = self._watermarks.get(table)
+        if current is None or watermark is None:
+            result = self._read(conn, table, encoders)
+            changed = True
+        else:
+            # Solapar para no perder filas de transacciones que confirmaron después del último refresco
+            since = watermark - timedelta(seconds=self.overlap)
+            delta = self._read(conn, table, encoders, since)
+            result = current.upsert(delta)
+            changed = result is not current
+            if deletes != self._deletes.get(table):
+                cursor.execute(f"SELECT id FROM {table}")
+                ids = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+                retained = result.retain(ids)
+                changed = changed or retained is not result
+                result = retained
+        conn.commit()
+        return result, dictionary, changed, (started, deletes)
+
+    def refresh(self, full=False):
+        """Refrescar games y users; retorna resumen"""
+        with self._lock:
+            return self._refresh(full)
+
+    def _refresh(self, full):
+        start = time.perf_counter()
+        try:
+            load_numpy()
+            state = None if full else self._state
+            if full:
+                self._watermarks.clear()
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    games, categories, games_changed, games_marks = \
+                        self._refresh_table(conn, cursor, 'games', state)
+                    users, roles, users_changed, users_marks = \
+                        self._refresh_table(conn, cursor, 'users', state)
+                    tables = state.tables if state else None
+                    if ANALYTICS_CONFIG['count_tables']:
+                        cursor.execute(TABLES_COUNT_SQL)
+                        tables = cursor.fetchone()[3]
+                        conn.commit()
+                finally:
+                    cursor.close()
+
+            changed = games_changed or users_changed or state is None or tables != state.tables
+            version = (state.version if state else 0) + (1 if changed else 0)
+            # Un solo reemplazo de referencia: los lectores ven la versión anterior o la nueva
+            self._state = SnapshotState(games, users, categories, roles, tables, version, datetime.now())
+            # Los watermarks avanzan solo con un estado publicado (si falla users no se pierde el delta de games)
+            for table, (watermark, deletes) in (('games', games_marks), ('users', users_marks)):
+                self._watermarks[table] = watermark
+                self._deletes[table] = deletes
+            self._stale = False
+            return {
+                'success': True,
+                'version': version,
+                'changed': changed,
+                'games': len(games),
+                'users': len(users),
+                'seconds': time.perf_counter() - start
+            }
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
+
+    def refresh_if_stale(self):
+        """Refrescar como máximo una vez cada refresh_interval segundos (o si se marcó stale)"""
+        if (not self._stale and self._last_refresh is not None
+                and time.monotonic() - self._last_refresh < self.refresh_interval):
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None  # Otro hilo ya está refrescando; se sirve la versión actual
+        try:
+            # También si falla, para no reintentar en cada request
+            self._last_refresh = time.monotonic()
+            return self._refresh(full=False)
+        finally:
+            self._lock.release()
+
+    # ============================================
+    # CONSULTAS (vectorizadas, sin tocar la base)
+    # ============================================
+
+    def freshness(self, state):
+        return {
+            'snapshot_version': state.version,
+            'refreshed_at': state.refreshed_at.isoformat(),
+            'staleness_seconds': round(time.monotonic() - state.refreshed_monotonic, 3)
+        }
+
+    def basic_snapshot(self, include_tables=True):
+        """Snapshot de /basic + frescura (None si no hay snapshot o falta el conteo de tablas)"""
+        state = self._state
+        if state is None or (include_tables and state.tables is None):
+            return None
+        aggregates = state.aggregates()
+        stats = {'tables': state.tables} if include_tables else {}
+        stats.update({'users': len(state.users), 'games': len(state.games)})
+        snapshot = {
+            'stats': stats,
+            'categories': [{'category': key, 'count': count} for key, count
+                           in grouped_counts(aggregates['category_nulls'], aggregates['by_category'])],
+            'roles': [{'role': key, 'count': count} for key, count
+                      in grouped_counts(aggregates['role_nulls'], aggregates['by_role'])]
+        }
+        snapshot.update(self.freshness(state))
+        return snapshot
+
+    def advanced_stats(self):
+        """{'stats'} de /advanced + frescura (None si no hay snapshot)"""
+        state = self._state
+        if state is None:
+            return None
+        aggregates = state.aggregates()
+        result = {'stats': build_stats(aggregates['games'], dict(aggregates['by_category']),
+                                       aggregates['users'], dict(aggregates['by_role']))}
+        result.update(self.freshness(state))
+        return result
+
+
+# ============================================
+# CLI
+# ============================================
+
+def synthetic_state(rows, seed=42):
+    """Snapshot sin base de datos para medir los kernels"""
+    load_numpy()
+    rng = np.random.default_rng(seed)
+    categories = Dictionary(['RPG', 'Estrategia', 'Shooter', 'Cartas', 'Acción', 'MMO'])
+    roles = Dictionary(['user', 'moderator', 'admin'])
+    is_free = rng.choice(np.array([0, 1, -1], dtype=np.int8), rows, p=[0.7, 0.29, 0.01])
+    price = np.where(is_free == 1, 0.0, np.round(rng.uniform(5, 70, rows), 2))
+    games = ColumnarTable({
+        'id': np.arange(1, rows + 1, dtype=np.int64),
+        'category': rng.integers(-1, 6, rows).astype(np.int32),
+        'price': price,
+        'is_free': is_free,
+        'rating': np.round(rng.uniform(0, 5, rows), 2),
+        'downloads': rng.integers(0, 10 ** 6, rows)
+    })
+    users = ColumnarTable({
+        'id': np.arange(1, rows + 1, dtype=np.int64),
+        'role': rng.choice(np.array([0, 1, 2], dtype=np.int32), rows, p=[0.95, 0.04, 0.01]),
+        'is_active': rng.choice(np.array([1, 0], dtype=np.int8), rows, p=[0.9, 0.1])
+    })
+    return SnapshotState(games, users, categories, roles, 6, 1, datetime.now())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot columnar de games/users')
+    parser.add_argument('--synthetic', type=int, help='Medir con N filas sintéticas (sin base de datos)')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    snapshot = CatalogSnapshot()
+    if args.synthetic:
+        snapshot._state = synthetic_state(args.synthetic)
+        print(f"🧪 Snapshot sintético: {args.synthetic} games y {args.synthetic} users")
+    else:
+        print("📥 Cargando snapshot desde la base de datos...")
+        result = snapshot.refresh(full=True)
+        if not result['success']:
+            print(f"❌ Error: {result['error']}")
+            raise SystemExit(1)
+        print(f"   ✅ {result['games']} games, {result['users']} users en {result['seconds'] * 1000:.1f} ms")
+        incremental = snapshot.refresh()
+        print(f"   ✅ Refresco incremental: {incremental['seconds'] * 1000:.1f} ms")
+
+    state = snapshot.state
+    memory = sum(column.nbytes for table in (state.games, state.users) for column in table.columns.values())
+    print(f"   💾 Memoria de columnas: {memory / 1024 / 1024:.1f} MB")
+    print()
+    start = time.perf_counter()
+    state.aggregates()
+    print(f"   🧮 Kernels (una vez por versión): {(time.perf_counter() - start) * 1000:>9.2f} ms")
+    for name, fn in (('basic', snapshot.basic_snapshot), ('advanced', snapshot.advanced_stats)):
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            fn()
+        elapsed = (time.perf_counter() - start) / args.iterations
+        print(f"   ⚡ {name:<9} {elapsed * 1e6:>10.1f} µs por consulta")
+    print()
+    print(f"📊 {snapshot.advanced_stats()['stats']}")
+
+
+if __name__ == '__main__':
+    main()
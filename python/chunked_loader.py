@@ -0,0 +1,148 @@
+"""
+Carga por bloques con cursores del servidor (named cursors)
+Combina agregados incrementalmente para mantener acotada la memoria
+"""
+import math
+import uuid
+from collections import Counter
+
+from config import ANALYTICS_CONFIG
+from db_pool import get_pool
+from instrumentation import metrics
+
+
+# ============================================
+# AGREGADORES INCREMENTALES
+# ============================================
+
+class Aggregator:
+    """Agregado que se actualiza bloque a bloque (DataFrame por bloque)"""
+
+    def __init__(self, column=None, where=None):
+        self.column = column
+        self.where = where  # callable(df) -> máscara booleana
+
+    def _select(self, df):
+        return df[self.where(df)] if self.where is not None else df
+
+    def update(self, df):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class Count(Aggregator):
+    """Cantidad de filas (opcionalmente filtradas)"""
+
+    def __init__(self, where=None):
+        super().__init__(where=where)
+        self.count = 0
+
+    def update(self, df):
+        self.count += len(self._select(df))
+
+    def result(self):
+        return self.count
+
+
+class Sum(Aggregator):
+    """Suma de una columna ignorando nulos"""
+
+    def __init__(self, column, where=None):
+        super().__init__(column, where)
+        self.total = 0
+
+    def update(self, df):
+        self.total += self._select(df)[self.column].sum()
+
+    def result(self):
+        return self.total
+
+
+class Mean(Aggregator):
+    """Promedio acumulado (NaN si no hay valores, como pandas)"""
+
+    def __init__(self, column, where=None):
+        super().__init__(column, where)
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, df):
+        values = self._select(df)[self.column]
+        self.total += float(values.sum())
+        self.count += int(values.count())
+
+    def result(self):
+        return self.total / self.count if self.count else math.nan
+
+
+class ValueCounts(Aggregator):
+    """Conteo por categoría ignorando nulos (equivalente a value_counts)"""
+
+    def __init__(self, column, where=None):
+        super().__init__(column, where)
+        self.counter = Counter()
+
+    def update(self, df):
+        for key, count in self._select(df)[self.column].value_counts().items():
+            self.counter[key] += int(count)
+
+    def result(self):
+        return dict(self.counter.most_common())
+
+
+# ============================================
+# LOADER
+# ============================================
+
+class ChunkedLoader:
+    """Lee resultados grandes por bloques de `itersize` filas"""
+
+    def __init__(self, itersize=None, database=None):
+        self.itersize = ANALYTICS_CONFIG['itersize'] if itersize is None else itersize
+        self.database = database
+
+    def iter_chunks(self, query, params=None):
+        """Generar (columnas, filas) por bloque usando un cursor del servidor"""
+        with get_pool(self.database).connection() as conn:
+            cursor = conn.cursor(name=f"chunked_{uuid.uuid4().hex}")
+            cursor.itersize = self.itersize
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(self.itersize)
+                    if not rows:
+                        break
+                    columns = [col[0] for col in cursor.description]
+                    yield columns, rows
+            finally:
+                cursor.close()
+
+    def iter_frames(self, query, params=None):
+        """Generar un DataFrame por bloque (requiere pandas)"""
+        import pandas as pd
+
+        for columns, rows in self.iter_chunks(query, params):
+            if metrics.enabled:
+                with metrics.phase('dataframe'):
+                    frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                yield frame
+            else:
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+    def read_frame(self, query, params=None):
+        """Leer todo el resultado en un DataFrame, bloque a bloque"""
+        import pandas as pd
+
+        frames = list(self.iter_frames(query, params))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def aggregate(self, query, aggregators, params=None):
+        """Aplicar los agregadores a cada bloque y retornar {nombre: resultado}"""
+        for df in self.iter_frames(query, params):
+            for aggregator in aggregators.values():
+                aggregator.update(df)
+        return {name: aggregator.result() for name, aggregator in aggregators.items()}
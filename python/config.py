@@ -4,30 +4,36 @@ Configuración centralizada para todos los scripts de Python
 """
 import os
 import sys
-from dotenv import load_dotenv
+from functools import lru_cache
 
-# Fix encoding for Windows
-if sys.platform == 'win32':
+ENV_PATHS = [
+    os.path.join(os.path.dirname(__file__), '.env'),
+    os.path.join(os.path.dirname(__file__), '..', 'backend', '.env'),
+    os.path.join(os.path.dirname(__file__), '..', '.env')
+]
+
+def fix_windows_encoding():
+    """Consola en UTF-8 en Windows (emojis de los scripts); se aplica al importar config"""
+    if sys.platform != 'win32':
+        return
     try:
         import codecs
         if hasattr(sys.stdout, 'buffer'):
             sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
         if hasattr(sys.stderr, 'buffer'):
             sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
+    except Exception:
         pass  # Si falla, continuar sin cambiar encoding
 
-# Buscar archivo .env
+fix_windows_encoding()
+
+# Buscar archivo .env (una sola vez por proceso; dotenv solo se importa si hay archivo)
+@lru_cache(maxsize=None)
 def load_config():
     """Cargar configuración desde .env"""
-    env_paths = [
-        os.path.join(os.path.dirname(__file__), '.env'),
-        os.path.join(os.path.dirname(__file__), '..', 'backend', '.env'),
-        os.path.join(os.path.dirname(__file__), '..', '.env')
-    ]
-    
-    for env_path in env_paths:
+    for env_path in ENV_PATHS:
         if os.path.exists(env_path):
+            from dotenv import load_dotenv
             load_dotenv(env_path)
             return env_path
     
@@ -47,17 +53,195 @@ DB_CONFIG = {
     'connect_timeout': 5
 }
 
+# Connection Pool Configuration
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN', '1')),
+    'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+    'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),  # segundos
+    'wait_timeout': float(os.getenv('DB_POOL_WAIT_TIMEOUT', '5')),  # segundos
+    'health_check_interval': float(os.getenv('DB_POOL_HEALTH_CHECK', '30'))  # segundos ociosa antes de SELECT 1
+}
+
+# Analytics Configuration
+ANALYTICS_CONFIG = {
+    # Contar tablas en information_schema (lento en servidores con mucho catálogo)
+    'count_tables': os.getenv('ANALYTICS_COUNT_TABLES', 'true').lower() in ('1', 'true', 'yes'),
+    # Filas por bloque al leer con cursores del servidor
+    'itersize': int(os.getenv('ANALYTICS_ITERSIZE', '10000'))
+}
+
+# Daily Rollup Configuration (segundos)
+ROLLUP_CONFIG = {
+    'refresh_interval': float(os.getenv('ROLLUP_REFRESH_INTERVAL', '60')),
+    'overlap': float(os.getenv('ROLLUP_OVERLAP', '300'))
+}
+
+# Forecast Configuration (/api/analytics/predictions)
+FORECAST_CONFIG = {
+    # auto, mean, seasonal_naive, linear o holt_winters (?method= lo cambia por request)
+    'method': os.getenv('FORECAST_METHOD', 'auto'),
+    'history_days': int(os.getenv('FORECAST_HISTORY_DAYS', '90')),
+    # Días finales que usa 'auto' para elegir el método de cada serie
+    'holdout_days': int(os.getenv('FORECAST_HOLDOUT_DAYS', '14'))
+}
+
+# Active Users Configuration (active_users.py: sketches HyperLogLog diarios)
+ACTIVE_USERS_CONFIG = {
+    # 2^precision registros de 1 byte por día; error relativo ≈ 1.04/√(2^precision) (14 = 16 KB, ±0.81%)
+    'precision': int(os.getenv('ACTIVE_USERS_HLL_PRECISION', '14')),
+    'refresh_interval': float(os.getenv('ACTIVE_USERS_REFRESH_INTERVAL', '60')),  # segundos
+    'overlap': float(os.getenv('ACTIVE_USERS_OVERLAP', '300'))  # segundos hacia atrás del watermark
+}
+
+# Materialized Views Configuration (intervalos en segundos)
+MATVIEW_CONFIG = {
+    # Desactivadas por defecto: sirven datos de hasta refresh_intervals segundos (como el snapshot)
+    'enabled': os.getenv('MATVIEWS_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    # Refresco en un hilo del proceso; desactivar si se refresca por cron
+    'scheduler': os.getenv('MATVIEWS_SCHEDULER', 'true').lower() in ('1', 'true', 'yes'),
+    'refresh_intervals': {
+        'mv_basic_snapshot': float(os.getenv('MATVIEW_REFRESH_BASIC', '30')),
+        'mv_advanced_stats': float(os.getenv('MATVIEW_REFRESH_ADVANCED', '60'))
+    }
+}
+
+# Response Cache Configuration (TTL en segundos, 0 = sin cache)
+CACHE_CONFIG = {
+    'enabled': os.getenv('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    'max_entries': int(os.getenv('CACHE_MAX_ENTRIES', '256')),
+    'default_ttl': float(os.getenv('CACHE_DEFAULT_TTL', '10')),
+    'ttls': {
+        'basic': float(os.getenv('CACHE_TTL_BASIC', '5')),
+        'advanced': float(os.getenv('CACHE_TTL_ADVANCED', '30')),
+        'trends': float(os.getenv('CACHE_TTL_TRENDS', '60')),
+        'predictions': float(os.getenv('CACHE_TTL_PREDICTIONS', '300')),
+        'jsonb': float(os.getenv('CACHE_TTL_JSONB', '10')),
+        'active_users': float(os.getenv('CACHE_TTL_ACTIVE_USERS', '60'))
+    }
+}
+
+# Metrics Configuration (GET /metrics en formato Prometheus)
+METRICS_CONFIG = {
+    'enabled': os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    # Límites de los buckets de latencia (segundos)
+    'buckets': [float(b) for b in os.getenv(
+        'METRICS_BUCKETS', '0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10'
+    ).split(',')]
+}
+
+# Slow Query Log Configuration
+SLOW_QUERY_CONFIG = {
+    'enabled': os.getenv('SLOW_QUERY_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    'threshold_ms': float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200')),
+    # EXPLAIN (ANALYZE, BUFFERS) re-ejecuta la query: solo lecturas sin escrituras ni locks (el resto, sin
+    # ANALYZE), una vez por fingerprint/intervalo
+    'explain': os.getenv('SLOW_QUERY_EXPLAIN', 'false').lower() in ('1', 'true', 'yes'),
+    'explain_interval': float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '300')),  # segundos
+    'sink': os.getenv('SLOW_QUERY_SINK', 'memory'),  # memory (ring buffer) o file
+    'ring_size': int(os.getenv('SLOW_QUERY_RING_SIZE', '500')),
+    'log_file': os.getenv('SLOW_QUERY_LOG_FILE', os.path.join(os.path.dirname(__file__), 'slow_queries.log')),
+    'max_bytes': int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    'backup_count': int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '5')),
+    'max_fingerprints': int(os.getenv('SLOW_QUERY_MAX_FINGERPRINTS', '1000'))
+}
+
+# JSON Responses Configuration (json_provider.py)
+JSON_CONFIG = {
+    # auto = orjson si está instalado, orjson = obligatorio, stdlib = json de Python (jsonify original)
+    'encoder': os.getenv('JSON_ENCODER', 'auto'),
+    # Escapar no-ASCII como \uXXXX (igual que jsonify); false = UTF-8 directo, más compacto
+    'ensure_ascii': os.getenv('JSON_ENSURE_ASCII', 'true').lower() in ('1', 'true', 'yes'),
+    # Compresión gzip/brotli según Accept-Encoding (desactivar si ya la hace el proxy)
+    'compression': os.getenv('COMPRESSION_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    'compress_min_size': int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),  # bytes
+    'gzip_level': int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')),
+    'brotli_quality': int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+}
+
+# Catalog Snapshot Configuration (catalog_snapshot.py, arrays NumPy por proceso)
+CATALOG_SNAPSHOT_CONFIG = {
+    # basic/advanced desde el snapshot en memoria (antes que las vistas materializadas)
+    'enabled': os.getenv('CATALOG_SNAPSHOT_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    'refresh_interval': float(os.getenv('CATALOG_SNAPSHOT_REFRESH_INTERVAL', '5')),  # segundos
+    'overlap': float(os.getenv('CATALOG_SNAPSHOT_OVERLAP', '300'))  # segundos hacia atrás del watermark
+}
+
+# Activity Ingestion Configuration (ingestion.py: POST /api/ingest/activities)
+INGEST_CONFIG = {
+    # Endpoint de escritura: apagado por defecto y, encendido, solo con PYTHON_SERVICE_TOKEN
+    'enabled': os.getenv('INGEST_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    # Eventos en memoria (encolados + en escritura); lleno = 429
+    'buffer_size': int(os.getenv('INGEST_BUFFER_SIZE', '100000')),
+    'batch_size': int(os.getenv('INGEST_BATCH_SIZE', '5000')),  # filas por COPY
+    'flush_interval': float(os.getenv('INGEST_FLUSH_INTERVAL', '1')),  # segundos máximos en el buffer
+    'max_request_events': int(os.getenv('INGEST_MAX_REQUEST_EVENTS', '10000')),
+    # Segundos admitidos entre created_at del cliente y la recepción (acotado por ROLLUP_OVERLAP y
+    # ACTIVE_USERS_OVERLAP: más atrás, los refrescos incrementales no volverían a leer la fila)
+    'max_skew': float(os.getenv('INGEST_MAX_SKEW', '60')),
+    'retry_interval': float(os.getenv('INGEST_RETRY_INTERVAL', '2')),  # espera tras un COPY fallido
+    'shutdown_timeout': float(os.getenv('INGEST_SHUTDOWN_TIMEOUT', '10'))  # segundos para vaciar al terminar
+}
+
+# Schema Migrations Configuration (migrations.py)
+MIGRATION_CONFIG = {
+    # Índices CONCURRENTLY en paralelo (tablas distintas; en la misma tabla van en serie)
+    'parallel': int(os.getenv('MIGRATIONS_PARALLEL', '4')),
+    # Espera máxima por locks del DDL transaccional (no bloquear a los escritores del backend)
+    'lock_timeout': os.getenv('MIGRATIONS_LOCK_TIMEOUT', '5s'),
+    # Memoria para construir índices (vacío = valor del servidor)
+    'maintenance_work_mem': os.getenv('MIGRATIONS_MAINTENANCE_WORK_MEM', ''),
+    # Aplicar migraciones que copian filas bajo lock exclusivo (solo en una ventana de mantenimiento)
+    'allow_blocking': os.getenv('MIGRATIONS_ALLOW_BLOCKING', 'false').lower() in ('1', 'true', 'yes')
+}
+
+# Monthly Partitions Configuration (partitions.py)
+PARTITION_CONFIG = {
+    # Meses futuros con partición creada de antemano
+    'premake_months': int(os.getenv('PARTITION_PREMAKE_MONTHS', '3')),
+    # Meses a conservar por tabla (0 = sin retención)
+    'retention_months': {
+        'user_activities': int(os.getenv('PARTITION_RETENTION_ACTIVITIES', '0')),
+        'analytics': int(os.getenv('PARTITION_RETENTION_ANALYTICS', '0'))
+    },
+    # detach = mover la partición al schema de archivo, drop = borrarla
+    'retention_mode': os.getenv('PARTITION_RETENTION_MODE', 'detach'),
+    'archive_schema': os.getenv('PARTITION_ARCHIVE_SCHEMA', 'archive'),
+    # Mantenimiento en un hilo del proceso; desactivar si se ejecuta partitions.py maintain por cron
+    'scheduler': os.getenv('PARTITION_SCHEDULER', 'true').lower() in ('1', 'true', 'yes'),
+    'maintenance_interval': float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600')),  # segundos
+    'lock_timeout': os.getenv('PARTITION_LOCK_TIMEOUT', '5s')
+}
+
 # Server Configuration
 SERVER_CONFIG = {
     'host': os.getenv('PYTHON_SERVICE_HOST', '0.0.0.0'),
     'port': int(os.getenv('PYTHON_SERVICE_PORT', '5000')),
-    'debug': os.getenv('NODE_ENV', 'development') == 'development'
+    'debug': os.getenv('NODE_ENV', 'development') == 'development',
+    # Servidor de producción (serve.py); workers=0 = 2 * CPUs + 1
+    'workers': int(os.getenv('PYTHON_SERVICE_WORKERS', '0')),
+    'threads': int(os.getenv('PYTHON_SERVICE_THREADS', '4')),
+    'keepalive': int(os.getenv('PYTHON_SERVICE_KEEPALIVE', '5')),  # segundos
+    'timeout': int(os.getenv('PYTHON_SERVICE_TIMEOUT', '30')),  # segundos
+    'graceful_timeout': int(os.getenv('PYTHON_SERVICE_GRACEFUL_TIMEOUT', '30')),  # segundos
+    'max_requests': int(os.getenv('PYTHON_SERVICE_MAX_REQUESTS', '10000')),
+    'max_requests_jitter': int(os.getenv('PYTHON_SERVICE_MAX_REQUESTS_JITTER', '500')),
+    'backlog': int(os.getenv('PYTHON_SERVICE_BACKLOG', '2048'))
 }
 
 # API Configuration
 API_CONFIG = {
     'node_backend_url': os.getenv('NODE_BACKEND_URL', 'http://localhost:3000'),
-    'cors_origins': os.getenv('CORS_ORIGINS', 'http://localhost:4200').split(',')
+    'cors_origins': os.getenv('CORS_ORIGINS', 'http://localhost:4200').split(','),
+    # Token compartido para endpoints internos (invalidación de cache, admin)
+    'service_token': os.getenv('PYTHON_SERVICE_TOKEN', '')
+}
+
+# Password Hashing Configuration
+AUTH_CONFIG = {
+    # Costo bcrypt (mismo valor que usa el backend Node: bcrypt.hash(password, 10))
+    'bcrypt_rounds': int(os.getenv('BCRYPT_ROUNDS', '10')),
+    # Procesos para hashear en lote (0 = uno por CPU)
+    'hash_workers': int(os.getenv('BCRYPT_WORKERS', '0'))
 }
 
 def get_db_connection(database=None):
@@ -72,7 +256,12 @@ def get_db_connection(database=None):
     else:
         # Usar DB_NAME por defecto
         config['database'] = DB_NAME
-    return psycopg2.connect(**config)
+    if not METRICS_CONFIG['enabled']:
+        return psycopg2.connect(**config)
+
+    from instrumentation import metrics
+    with metrics.phase('connect'):
+        return psycopg2.connect(**config)
 
 def print_config():
     """Imprimir configuración actual (ocultar contraseña)"""
@@ -0,0 +1,164 @@
+"""
+Rollup diario de altas por entidad (games, users, activities)
+Tabla daily_rollups + refresco incremental desde el último watermark
+El rango sobre created_at deja que PostgreSQL lea solo las particiones recientes de user_activities
+"""
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from config import ROLLUP_CONFIG
+from db_manager import DatabaseManager
+from db_pool import get_pool
+
+# Entidades con rollup -> tabla de origen (lista cerrada: se interpola en SQL)
+ROLLUP_ENTITIES = {
+    'games': 'games',
+    'users': 'users',
+    'activities': 'user_activities'
+}
+
+
+class DailyRollup:
+    """Mantiene y consulta los conteos diarios de daily_rollups"""
+
+    def __init__(self, db_manager=None, refresh_interval=None, overlap=None):
+        self.db = db_manager or DatabaseManager()
+        self.refresh_interval = ROLLUP_CONFIG['refresh_interval'] if refresh_interval is None else refresh_interval
+        self.overlap = ROLLUP_CONFIG['overlap'] if overlap is None else overlap
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+
+    def refresh(self, entity=None, full=False):
+        """Recalcular los días tocados desde el último watermark"""
+        entities = [entity] if entity else list(ROLLUP_ENTITIES)
+        refreshed = {}
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for name in entities:
+                        refreshed[name] = self._refresh_entity(cursor, name, full)
+                    conn.commit()
+                finally:
+                    cursor.close()
+            return {'success': True, 'days': refreshed}
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    def refresh_if_stale(self):
+        """Refrescar como máximo una vez cada refresh_interval segundos"""
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None  # Otro hilo ya está refrescando
+        try:
+            # También si falla, para no reintentar en cada request
+            self._last_refresh = time.monotonic()
+            return self.refresh()
+        finally:
+            self._lock.release()
+
+    def series(self, entity, date_from):
+        """Conteos diarios desde date_from: [{'date', 'count'}, ...]"""
+        result = self.db.execute_query("""
+            SELECT day AS date, count
+            FROM daily_rollups
+            WHERE entity = %s AND day >= %s
+            ORDER BY day
+        """, (entity, date_from))
+        if result['success']:
+            return result['data']
+
+        # Sin tabla de rollup (setup antiguo): consultar en vivo
+        result = self.db.execute_query(f"""
+            SELECT DATE(created_at) as date, COUNT(*) as count
+            FROM {ROLLUP_ENTITIES[entity]}
+            WHERE created_at >= %s
+            GROUP BY DATE(created_at)
+            ORDER BY date
+        """, (date_from,))
+        return result['data'] if result['success'] else []
+
+    def total(self, entity, date_from):
+        """Suma de los conteos diarios desde date_from"""
+        result = self.db.execute_query("""
+            SELECT COALESCE(SUM(count), 0) AS total
+            FROM daily_rollups
+            WHERE entity = %s AND day >= %s
+        """, (entity, date_from))
+        if result['success']:
+            return int(result['data'][0]['total'])
+
+        result = self.db.execute_query(f"""
+            SELECT COUNT(*) as total
+            FROM {ROLLUP_ENTITIES[entity]}
+            WHERE created_at >= %s
+        """, (date_from,))
+        return result['data'][0]['total'] if result['success'] else 0
+
+    def _refresh_entity(self, cursor, entity, full):
+        """Recalcular un rango de días de una entidad; retorna días escritos"""
+        table = ROLLUP_ENTITIES[entity]
+
+        # Bloquear el watermark para serializar refrescos entre procesos
+        cursor.execute(
+            "INSERT INTO rollup_watermarks (entity, last_refreshed) VALUES (%s, NULL) "
+            "ON CONFLICT (entity) DO NOTHING",
+            (entity,)
+        )
+        cursor.execute(
+            "SELECT last_refreshed, LOCALTIMESTAMP FROM rollup_watermarks WHERE entity = %s FOR UPDATE",
+            (entity,)
+        )
+        last_refreshed, now = cursor.fetchone()
+
+        if full or last_refreshed is None:
+            cursor.execute("DELETE FROM daily_rollups WHERE entity = %s", (entity,))
+            cursor.execute(f"""
+                INSERT INTO daily_rollups (entity, day, count)
+                SELECT %s, DATE(created_at), COUNT(*)
+                FROM {table}
+                WHERE created_at IS NOT NULL
+                GROUP BY DATE(created_at)
+            """, (entity,))
+        else:
+            # Solapar el rango para no perder filas de transacciones que
+            # comenzaron antes del último refresco pero confirmaron después
+            start_day = (last_refreshed - timedelta(seconds=self.overlap)).date()
+            cursor.execute(
+                "DELETE FROM daily_rollups WHERE entity = %s AND day >= %s",
+                (entity, start_day)
+            )
+            # Rango sobre created_at (no DATE(created_at)) para usar el índice y las particiones recientes
+            cursor.execute(f"""
+                INSERT INTO daily_rollups (entity, day, count)
+                SELECT %s, DATE(created_at), COUNT(*)
+                FROM {table}
+                WHERE created_at >= %s
+                GROUP BY DATE(created_at)
+            """, (entity, start_day))
+        days = cursor.rowcount
+
+        cursor.execute(
+            "UPDATE rollup_watermarks SET last_refreshed = %s WHERE entity = %s",
+            (now, entity)
+        )
+        return days
+
+
+if __name__ == '__main__':
+    full = '--full' in sys.argv
+    print("🔄 Refrescando rollup diario" + (" (completo)" if full else "") + "...")
+    result = DailyRollup().refresh(full=full)
+    if result['success']:
+        for entity, days in result['days'].items():
+            print(f"   ✅ {entity}: {days} días recalculados")
+    else:
+        print(f"   ❌ Error: {result.get('error')}")
+        sys.exit(1)
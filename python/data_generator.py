@@ -0,0 +1,246 @@
+"""
+Generador de datos sintéticos para benchmarks y pruebas de capacidad
+Millones de users, games, user_activities (JSONB) y analytics con fechas sesgadas
+Carga con COPY (o execute_values) en lotes transaccionales
+"""
+import csv
+import io
+import itertools
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from config import DB_NAME
+from db_manager import DatabaseManager
+from db_pool import get_pool
+
+CATEGORIES = [('Rol multijugador masivo', 0.15), ('RPG de acción', 0.20), ('Acción por equipos', 0.25),
+              ('Estrategia', 0.15), ('Cartas', 0.10), ('Shooter', 0.15)]
+ROLES = [('user', 0.95), ('moderator', 0.04), ('admin', 0.01)]
+ACTIVITY_TYPES = [('login', 0.35), ('view_game', 0.40), ('logout', 0.15), ('purchase', 0.07), ('register', 0.03)]
+METRICS = ['daily_active_users', 'page_views', 'revenue', 'session_length', 'conversion_rate']
+DEVICES = ['desktop', 'mobile', 'tablet', 'console']
+COLORS = ['#f39c12', '#c0392b', '#e74c3c', '#2980b9', '#8e44ad', '#16a085']
+BADGES = [None, None, None, 'NEW', 'SALE', 'PREORDER']
+FIRST_NAMES = ['Ana', 'Luis', 'María', 'Carlos', 'Sofía', 'Jorge', 'Lucía', 'Diego', 'Valentina', 'Mateo']
+LAST_NAMES = ['García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Díaz', 'Torres', 'Ruiz', 'Vargas']
+TITLE_WORDS = ['Legends', 'Chronicles', 'Arena', 'Odyssey', 'Frontier', 'Realms', 'Tactics', 'Rising']
+
+SYNTHETIC_PASSWORD = 'password123'
+
+# Columnas de cada tabla en el orden en que los generadores producen las filas
+COLUMNS = {
+    'users': ('username', 'email', 'password', 'role', 'full_name', 'is_active', 'created_at', 'updated_at'),
+    'games': ('title', 'subtitle', 'description', 'image_url', 'category', 'color', 'price',
+              'original_price', 'discount', 'badge', 'logo', 'is_free', 'rating', 'downloads',
+              'created_at', 'updated_at'),
+    'user_activities': ('user_id', 'activity_type', 'activity_data', 'created_at'),
+    'analytics': ('metric_name', 'metric_value', 'metric_data', 'date_recorded', 'created_at')
+}
+
+
+def _synthetic_password_hash():
+    """Un solo hash bcrypt para todos los usuarios (uno por usuario sería demasiado lento)"""
+    import bcrypt
+    return bcrypt.hashpw(SYNTHETIC_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+_cum_weights_cache = {}
+
+
+def _weighted(rng, choices):
+    """Elegir de [(valor, peso)] con pesos acumulados precalculados"""
+    key = id(choices)
+    if key not in _cum_weights_cache:
+        values = [value for value, _ in choices]
+        cum_weights = list(itertools.accumulate(weight for _, weight in choices))
+        _cum_weights_cache[key] = (values, cum_weights)
+    values, cum_weights = _cum_weights_cache[key]
+    return rng.choices(values, cum_weights=cum_weights)[0]
+
+
+class TimeSkew:
+    """Fechas sesgadas hacia lo reciente (plataforma en crecimiento) con patrón horario"""
+
+    # Peso relativo por hora del día (más actividad por la tarde/noche)
+    HOURLY = [0.3, 0.2, 0.15, 0.1, 0.1, 0.15, 0.3, 0.5, 0.7, 0.8, 0.9, 1.0,
+              1.0, 1.0, 1.0, 1.1, 1.2, 1.4, 1.6, 1.8, 1.9, 1.7, 1.2, 0.6]
+
+    def __init__(self, rng, now, days=365, growth=3.0):
+        self.rng = rng
+        self.now = now
+        self.days = days
+        self.growth = growth  # 1 = uniforme; mayor = más filas en los días recientes
+        self._hours = range(24)
+        self._cum_hourly = list(itertools.accumulate(self.HOURLY))
+
+    def sample(self):
+        age_days = int(self.days * self.rng.random() ** self.growth)
+        day = (self.now - timedelta(days=age_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        hour = self.rng.choices(self._hours, cum_weights=self._cum_hourly)[0]
+        return min(day + timedelta(hours=hour, seconds=self.rng.randrange(3600)), self.now)
+
+
+# ============================================
+# GENERADORES DE FILAS
+# ============================================
+
+def generate_users(rng, count, run_tag, skew, password_hash):
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        username = f"user_{run_tag}_{i}"
+        created_at = skew.sample()
+        yield (username, f"{username}@example.com", password_hash, _weighted(rng, ROLES),
+               f"{first} {last}", rng.random() < 0.9, created_at, created_at)
+
+
+def generate_games(rng, count, run_tag, skew):
+    for i in range(count):
+        is_free = rng.random() < 0.2
+        discount = None if is_free else rng.choice([None, None, None, 10, 25, 50, 60])
+        original_price = round(rng.uniform(10, 600), 2) if discount else None
+        if is_free:
+            price = None
+        elif discount:
+            price = round(original_price * (100 - discount) / 100, 2)
+        else:
+            price = round(rng.uniform(5, 300), 2)
+        title = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {run_tag}-{i}"
+        created_at = skew.sample()
+        yield (title, f"{title}®", 'Juego sintético para pruebas de capacidad.',
+               f"https://picsum.photos/seed/{run_tag}{i}/800", _weighted(rng, CATEGORIES),
+               rng.choice(COLORS), price, original_price, discount,
+               'FREE' if is_free else rng.choice(BADGES), title[:2].upper(), is_free,
+               round(min(5.0, max(0.0, rng.gauss(3.8, 0.6))), 2),
+               min(int(rng.paretovariate(1.2) * 1000), 2_000_000_000), created_at, created_at)
+
+
+def generate_activities(rng, count, user_ids, game_count, skew):
+    # Pocos usuarios concentran buena parte de la actividad
+    heavy = user_ids[:max(1, len(user_ids) // 20)]
+    for _ in range(count):
+        user_id = rng.choice(heavy) if rng.random() < 0.5 else rng.choice(user_ids)
+        activity_type = _weighted(rng, ACTIVITY_TYPES)
+        data = {'device': rng.choice(DEVICES)}
+        if activity_type in ('view_game', 'purchase') and game_count:
+            data['game_id'] = int(rng.paretovariate(1.1)) % game_count + 1
+        if activity_type == 'view_game':
+            data['duration_seconds'] = int(rng.expovariate(1 / 90))
+        elif activity_type == 'purchase':
+            data['price'] = round(rng.uniform(5, 300), 2)
+            data['currency'] = 'USD'
+        elif activity_type == 'login':
+            data['ip'] = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+        yield (user_id, activity_type, json.dumps(data), skew.sample())
+
+
+def generate_analytics(rng, count, skew):
+    for _ in range(count):
+        created_at = skew.sample()
+        value = min(round(rng.lognormvariate(math.log(500), 1.0), 2), 99999999.99)
+        yield (rng.choice(METRICS), value,
+               json.dumps({'source': 'synthetic', 'device': rng.choice(DEVICES)}),
+               created_at.date(), created_at)
+
+
+# ============================================
+# CARGA
+# ============================================
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_rows(conn, table, rows, batch_size=10000, method='copy', progress=None):
+    """Cargar filas en lotes (una transacción por lote). Retorna filas cargadas"""
+    column_list = ', '.join(COLUMNS[table])
+    cursor = conn.cursor()
+    loaded = 0
+    try:
+        for batch in _batches(rows, batch_size):
+            if method == 'copy':
+                # CSV: None se escribe como campo vacío sin comillas = NULL
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                from psycopg2.extras import execute_values
+                execute_values(cursor, f"INSERT INTO {table} ({column_list}) VALUES %s",
+                               batch, page_size=batch_size)
+            conn.commit()
+            loaded += len(batch)
+            if progress:
+                progress(table, loaded)
+    finally:
+        cursor.close()
+    return loaded
+
+
+def seed_database(users=0, games=0, activities=0, analytics=0, batch_size=10000,
+                  method='copy', days=365, seed=42, create=True, progress=None):
+    """Crear la base/tablas (opcional) y poblarla con volúmenes dados"""
+    started = time.monotonic()
+    try:
+        if create:
+            result = DatabaseManager().create_database(DB_NAME)
+            if not result['success']:
+                return result
+            from db_setup_improved import create_tables
+            if not create_tables():
+                return {'success': False, 'error': 'No se pudieron crear las tablas'}
+
+        rng = random.Random(seed)
+        skew = TimeSkew(rng, datetime.now(), days)
+        if activities or analytics:
+            # Meses del rango generado: COPY escribe directo en cada partición y no en DEFAULT
+            from partitions import PartitionManager
+            result = PartitionManager().ensure_partitions(since=datetime.now() - timedelta(days=days))
+            if not result['success']:
+                return result
+        run_tag = f"{int(time.time())}{rng.randint(0, 9999):04d}"
+        loaded = {}
+
+        with get_pool().connection() as conn:
+            if users:
+                rows = generate_users(rng, users, run_tag, skew, _synthetic_password_hash())
+                loaded['users'] = load_rows(conn, 'users', rows, batch_size, method, progress)
+            if games:
+                rows = generate_games(rng, games, run_tag, skew)
+                loaded['games'] = load_rows(conn, 'games', rows, batch_size, method, progress)
+            if activities:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id FROM users ORDER BY id")
+                user_ids = [row[0] for row in cursor.fetchall()]
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM games")
+                game_count = cursor.fetchone()[0]
+                cursor.close()
+                conn.commit()
+                if user_ids:
+                    rows = generate_activities(rng, activities, user_ids, game_count, skew)
+                    loaded['user_activities'] = load_rows(conn, 'user_activities', rows,
+                                                          batch_size, method, progress)
+            if analytics:
+                rows = generate_analytics(rng, analytics, skew)
+                loaded['analytics'] = load_rows(conn, 'analytics', rows, batch_size, method, progress)
+
+        # Las filas tienen created_at en el pasado: reconstruir el rollup completo
+        from daily_rollup import DailyRollup
+        DailyRollup().refresh(full=True)
+
+        return {'success': True, 'loaded': loaded, 'seconds': time.monotonic() - started}
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }
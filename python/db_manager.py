@@ -2,25 +2,12 @@
 Gestor de Base de Datos - Funciones reutilizables
 Útil para uso básico y avanzado
 """
-import sys
-import os
+import time
 
-# Fix encoding for Windows
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass
-
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from psycopg2 import sql
-from psycopg2.extras import RealDictCursor
 from config import DB_CONFIG, get_db_connection
+from db_pool import get_pool
+from instrumentation import metrics
+from slow_query_log import slow_queries
 
 class DatabaseManager:
     """Clase para gestionar operaciones de base de datos"""
@@ -31,13 +18,10 @@ class DatabaseManager:
     def test_connection(self, database=None):
         """Probar conexión a PostgreSQL"""
         try:
-            if database is None:
-                # Para probar conexión sin database específica
-                conn = get_db_connection(False)
-            else:
-                conn = get_db_connection(database)
-            version = conn.server_version
-            conn.close()
+            # Sin database específica se usa el pool del servidor (database=False)
+            pool = get_pool(False if database is None else database)
+            with pool.connection() as conn:
+                version = conn.server_version
             return {
                 'success': True,
                 'version': version,
@@ -53,7 +37,10 @@ class DatabaseManager:
     def create_database(self, db_name):
         """Crear base de datos"""
         try:
-            conn = get_db_connection()  # Sin database específica
+            from psycopg2 import sql
+            from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+            conn = get_db_connection(False)  # Sin database específica
             conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
             cursor = conn.cursor()
             
@@ -86,39 +73,53 @@ class DatabaseManager:
     
     def execute_query(self, query, params=None, fetch=True, use_db=True):
         """Ejecutar query y retornar resultados"""
+        from psycopg2.extras import RealDictCursor
+
+        # Con database o sin database (para crear BD)
+        pool = get_pool() if use_db else get_pool(False)
+        timed = metrics.enabled or slow_queries.enabled
+        if timed:
+            started = time.perf_counter()
         try:
-            if use_db:
-                conn = get_db_connection()  # Con database
-            else:
-                conn = get_db_connection(False)  # Sin database (para crear BD)
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute(query, params)
-            
-            if fetch:
-                if cursor.description:
-                    results = cursor.fetchall()
-                    return {'success': True, 'data': results, 'count': len(results)}
-                else:
+            with pool.connection() as conn:
+                if timed:
+                    acquired = time.perf_counter()
+                    if metrics.enabled:
+                        metrics.observe_phase('pool_acquire', acquired - started)
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                try:
+                    cursor.execute(query, params)
+                    
+                    if fetch and cursor.description:
+                        results = cursor.fetchall()
+                        conn.commit()  # Cerrar la transacción (también para INSERT ... RETURNING)
+                        if timed:
+                            self._record_timing(query, params, time.perf_counter() - acquired, len(results), conn)
+                        return {'success': True, 'data': results, 'count': len(results)}
+                    
                     conn.commit()
+                    if timed:
+                        self._record_timing(query, params, time.perf_counter() - acquired, cursor.rowcount, conn,
+                                            returned=False)
                     return {'success': True, 'affected': cursor.rowcount}
-            else:
-                conn.commit()
-                return {'success': True, 'affected': cursor.rowcount}
+                finally:
+                    cursor.close()
             
         except Exception as e:
-            if 'conn' in locals():
-                conn.rollback()
+            if metrics.enabled:
+                metrics.record_query(query, time.perf_counter() - started, success=False)
             return {
                 'success': False,
                 'error': str(e),
                 'error_type': type(e).__name__
             }
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+    
+    def _record_timing(self, query, params, duration, rows, conn, returned=True):
+        """Métricas y registro de queries lentas (conn permite obtener el plan)"""
+        if metrics.enabled:
+            metrics.record_query(query, duration, rows if returned else 0)
+        if slow_queries.enabled:
+            slow_queries.record(query, duration, rows=rows, params=params, conn=conn)
     
     def get_table_info(self, table_name):
         """Obtener información de una tabla"""
@@ -145,6 +146,9 @@ class DatabaseManager:
             FROM information_schema.tables 
             WHERE table_schema = 'public' 
             AND table_type = 'BASE TABLE'
+            AND table_name NOT IN (
+                SELECT relname FROM pg_class WHERE relispartition AND relnamespace = 'public'::regnamespace
+            )
         """)
         stats['tables'] = result['data'][0]['count'] if result['success'] else 0
         
@@ -0,0 +1,271 @@
+"""
+Pool de conexiones a PostgreSQL - Reutiliza conexiones entre queries
+Útil para uso básico y avanzado
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import DB_NAME, POOL_CONFIG, get_db_connection
+
+
+class PoolExhaustedError(Exception):
+    """No hubo conexión libre dentro del tiempo de espera configurado"""
+
+
+class ConnectionPool:
+    """Pool thread-safe de conexiones psycopg2 con tamaño mínimo/máximo"""
+
+    def __init__(self, database=None, min_size=None, max_size=None,
+                 idle_timeout=None, wait_timeout=None, health_check_interval=None):
+        self.database = database
+        self.min_size = POOL_CONFIG['min_size'] if min_size is None else min_size
+        self.max_size = POOL_CONFIG['max_size'] if max_size is None else max_size
+        self.idle_timeout = POOL_CONFIG['idle_timeout'] if idle_timeout is None else idle_timeout
+        self.wait_timeout = POOL_CONFIG['wait_timeout'] if wait_timeout is None else wait_timeout
+        self.health_check_interval = (
+            POOL_CONFIG['health_check_interval'] if health_check_interval is None
+            else health_check_interval
+        )
+        if self.max_size < 1 or self.min_size < 0 or self.min_size > self.max_size:
+            raise ValueError(f"Tamaño de pool inválido: min={self.min_size}, max={self.max_size}")
+
+        self._idle = deque()  # (conn, último uso)
+        self._in_use = set()
+        self._pending = 0  # conexiones reservadas que se están abriendo
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._counters = {'created': 0, 'discarded': 0, 'checkouts': 0, 'timeouts': 0}
+
+    # --------------------------------------------
+    # Checkout / devolución
+    # --------------------------------------------
+
+    def getconn(self, timeout=None):
+        """Obtener una conexión sana del pool (espera acotada si está lleno)"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolExhaustedError("El pool de conexiones está cerrado")
+                self._prune_idle_locked()
+                while not self._idle and self._size_locked() >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolExhaustedError(
+                            f"Pool agotado: {self.max_size} conexiones en uso y ninguna "
+                            f"se liberó en {timeout:.1f}s (ajusta DB_POOL_MAX o DB_POOL_WAIT_TIMEOUT)"
+                        )
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise PoolExhaustedError("El pool de conexiones está cerrado")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use.add(conn)
+                else:
+                    # Reservar el hueco antes de conectar fuera del lock
+                    self._pending += 1
+                    last_used = None
+
+            if last_used is None:
+                try:
+                    conn = get_db_connection(self.database)
+                except Exception:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pending -= 1
+                    self._in_use.add(conn)
+                    self._counters['created'] += 1
+                    self._counters['checkouts'] += 1
+                return conn
+
+            if self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._counters['checkouts'] += 1
+                return conn
+
+            # Conexión rota: descartarla y volver a intentar
+            self._discard(conn)
+
+    def putconn(self, conn, discard=False):
+        """Devolver una conexión al pool"""
+        if not discard:
+            discard = not self._reset(conn)
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use.discard(conn)
+            if self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager: checkout y devolución automática de la conexión"""
+        import psycopg2
+
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Cerrar todas las conexiones libres y rechazar nuevos checkouts"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Estadísticas actuales del pool"""
+        with self._cond:
+            return {
+                'database': self.database,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self._counters
+            }
+
+    # --------------------------------------------
+    # Helpers internos
+    # --------------------------------------------
+
+    def _size_locked(self):
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    def _prune_idle_locked(self):
+        """Cerrar conexiones ociosas de más respetando min_size"""
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        kept = deque()
+        while self._idle:
+            conn, last_used = self._idle.popleft()
+            expired = now - last_used > self.idle_timeout
+            if expired and len(kept) + len(self._idle) + len(self._in_use) >= self.min_size:
+                self._close_quietly(conn)
+                self._counters['discarded'] += 1
+            else:
+                kept.append((conn, last_used))
+        self._idle = kept
+
+    def _is_healthy(self, conn, last_used):
+        """Health check al hacer checkout"""
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        if conn.closed or conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, conn):
+        """Dejar la conexión limpia para el siguiente uso; False si no sirve"""
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+        if conn.closed:
+            return False
+        try:
+            status = conn.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._in_use.discard(conn)
+            self._counters['discarded'] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# ============================================
+# POOLS COMPARTIDOS
+# ============================================
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(database=None):
+    """Pool compartido por base de datos (None = DB_NAME, False = sin database)"""
+    if os.getpid() != _pools_pid:
+        reset_pools_after_fork()
+    key = DB_NAME if database is None else database
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(database=database)
+            _pools[key] = pool
+        return pool
+
+
+def reset_pools_after_fork():
+    """Olvidar los pools heredados del proceso padre (llamar en cada worker)
+
+    Las conexiones heredadas no se cierran: cerrar el socket compartido
+    terminaría la sesión del proceso padre.
+    """
+    global _pools, _pools_lock, _pools_pid
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _pools_pid = os.getpid()
+
+
+def close_pools():
+    """Cerrar todos los pools compartidos"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+def pool_stats():
+    """Estadísticas de todos los pools compartidos"""
+    return [pool.stats() for pool in list(_pools.values())]
@@ -3,72 +3,33 @@ Script mejorado de Python para configurar la base de datos PostgreSQL
 Versión robusta con mejor manejo de errores y configuración automática
 """
 import sys
-import os
 
-# Fix encoding for Windows
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass  # Si falla, continuar sin cambiar encoding
-
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from psycopg2 import sql
-from dotenv import load_dotenv
-import bcrypt
+from config import DB_CONFIG, DB_NAME, ENV_FILE
 
 # ============================================
 # CONFIGURACIÓN
 # ============================================
 
-# Buscar archivo .env en múltiples ubicaciones
-env_paths = [
-    os.path.join(os.path.dirname(__file__), '.env'),
-    os.path.join(os.path.dirname(__file__), '..', 'backend', '.env'),
-    os.path.join(os.path.dirname(__file__), '..', '.env')
-]
-
-env_file = None
-for env_path in env_paths:
-    if os.path.exists(env_path):
-        load_dotenv(env_path)
-        env_file = env_path
-        print(f"📝 Archivo .env cargado desde: {env_path}")
-        break
-
-if not env_file:
-    print("⚠️  No se encontró archivo .env. Usando valores por defecto.")
-    print("   Crea backend/.env con tus credenciales de PostgreSQL")
+def print_header():
+    """Mostrar .env usado y configuración (ocultar contraseña)"""
+    if ENV_FILE:
+        print(f"📝 Archivo .env cargado desde: {ENV_FILE}")
+    else:
+        print("⚠️  No se encontró archivo .env. Usando valores por defecto.")
+        print("   Crea backend/.env con tus credenciales de PostgreSQL")
 
-# Configuración de base de datos
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': int(os.getenv('DB_PORT', '5432')),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', '123456'),  # Tu contraseña por defecto
-    'connect_timeout': 5
-}
-
-DB_NAME = os.getenv('DB_NAME', 'battlenet_db')
-
-# Mostrar configuración (ocultar contraseña)
-print()
-print("=" * 70)
-print("🚀 Battle.net - Configuración de Base de Datos")
-print("=" * 70)
-print()
-print("📋 Configuración:")
-print(f"   Host: {DB_CONFIG['host']}")
-print(f"   Port: {DB_CONFIG['port']}")
-print(f"   User: {DB_CONFIG['user']}")
-print(f"   Database: {DB_NAME}")
-print(f"   Password: {'*' * len(DB_CONFIG['password']) if DB_CONFIG['password'] else 'NO CONFIGURADA'}")
-print()
+    print()
+    print("=" * 70)
+    print("🚀 Battle.net - Configuración de Base de Datos")
+    print("=" * 70)
+    print()
+    print("📋 Configuración:")
+    print(f"   Host: {DB_CONFIG['host']}")
+    print(f"   Port: {DB_CONFIG['port']}")
+    print(f"   User: {DB_CONFIG['user']}")
+    print(f"   Database: {DB_NAME}")
+    print(f"   Password: {'*' * len(DB_CONFIG['password']) if DB_CONFIG['password'] else 'NO CONFIGURADA'}")
+    print()
 
 # ============================================
 # FUNCIONES
@@ -76,6 +37,8 @@ print()
 
 def test_connection():
     """Probar conexión a PostgreSQL"""
+    import psycopg2
+
     print("🔌 Paso 1: Probando conexión a PostgreSQL...")
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -114,6 +77,10 @@ def test_connection():
 
 def create_database():
     """Crear base de datos si no existe"""
+    import psycopg2
+    from psycopg2 import sql
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
     print()
     print(f"📦 Paso 2: Creando base de datos '{DB_NAME}'...")
     try:
@@ -155,122 +122,37 @@ def create_database():
         return False
 
 def create_tables():
-    """Crear todas las tablas necesarias"""
+    """Crear/actualizar el esquema aplicando las migraciones pendientes (migrations.py)"""
+    from migrations import migrate
+
     print()
-    print("📊 Paso 3: Creando tablas e índices...")
-    try:
-        # Conectar a la base de datos específica
-        config = DB_CONFIG.copy()
-        config['database'] = DB_NAME
-        conn = psycopg2.connect(**config)
-        cursor = conn.cursor()
-        
-        tables_created = 0
-        
-        # Tabla: users
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role VARCHAR(20) DEFAULT 'user' CHECK (role IN ('admin', 'moderator', 'user')),
-                full_name VARCHAR(100),
-                avatar_url VARCHAR(255),
-                is_active BOOLEAN DEFAULT true,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created += 1
-        print("   ✅ Tabla 'users' creada")
-        
-        # Tabla: games
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS games (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(200) NOT NULL,
-                subtitle VARCHAR(200),
-                description TEXT,
-                image_url VARCHAR(500),
-                category VARCHAR(100),
-                color VARCHAR(20),
-                price DECIMAL(10, 2),
-                original_price DECIMAL(10, 2),
-                discount INTEGER,
-                badge VARCHAR(20),
-                logo VARCHAR(10),
-                is_free BOOLEAN DEFAULT false,
-                rating DECIMAL(3, 2) DEFAULT 0,
-                downloads INTEGER DEFAULT 0,
-                created_by INTEGER REFERENCES users(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created += 1
-        print("   ✅ Tabla 'games' creada")
-        
-        # Tabla: user_activities
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_activities (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                activity_type VARCHAR(50) NOT NULL,
-                activity_data JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created += 1
-        print("   ✅ Tabla 'user_activities' creada")
-        
-        # Tabla: analytics
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS analytics (
-                id SERIAL PRIMARY KEY,
-                metric_name VARCHAR(100) NOT NULL,
-                metric_value DECIMAL(10, 2),
-                metric_data JSONB,
-                date_recorded DATE DEFAULT CURRENT_DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        tables_created += 1
-        print("   ✅ Tabla 'analytics' creada")
-        
-        # Crear índices
-        print()
-        print("   📑 Creando índices...")
-        indexes = [
-            ("idx_users_email", "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)"),
-            ("idx_users_role", "CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)"),
-            ("idx_games_category", "CREATE INDEX IF NOT EXISTS idx_games_category ON games(category)"),
-            ("idx_games_created_at", "CREATE INDEX IF NOT EXISTS idx_games_created_at ON games(created_at)"),
-            ("idx_activities_user_id", "CREATE INDEX IF NOT EXISTS idx_activities_user_id ON user_activities(user_id)"),
-            ("idx_activities_created_at", "CREATE INDEX IF NOT EXISTS idx_activities_created_at ON user_activities(created_at)"),
-            ("idx_analytics_date", "CREATE INDEX IF NOT EXISTS idx_analytics_date ON analytics(date_recorded)")
-        ]
-        
-        for idx_name, idx_sql in indexes:
-            cursor.execute(idx_sql)
-            print(f"      ✅ Índice '{idx_name}' creado")
-        
-        conn.commit()
-        print()
-        print(f"   ✅ {tables_created} tablas y {len(indexes)} índices creados exitosamente")
-        
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"   ❌ Error creando tablas: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+    print("📊 Paso 3: Aplicando migraciones (tablas, índices CONCURRENTLY y vistas)...")
+    result = migrate(progress=print)
+    if not result['success']:
+        print(f"   ❌ Error en {result['migration'] or 'migraciones'}: {result['error_type']}: {result['error']}")
+        if result['migration'] == '0003_partition_event_tables':
+            print("   ⚠️  Particionar una base con datos bloquea las escrituras del backend Node:")
+            print("      detener el backend y ejecutar con MIGRATIONS_ALLOW_BLOCKING=true")
         return False
 
+    print()
+    if result['up_to_date']:
+        print("   ℹ️  El esquema ya está al día")
+    else:
+        print(f"   ✅ {len(result['applied'])} migraciones aplicadas exitosamente")
+
+    # Particiones mensuales de los próximos meses (y retención, si está configurada)
+    from partitions import PartitionManager, print_result
+    print()
+    print("   📅 Particiones de user_activities y analytics...")
+    partitions = PartitionManager().maintain()
+    print_result(partitions)
+    return partitions['success']
+
 def create_admin_user():
     """Crear usuario administrador por defecto"""
+    import psycopg2
+
     print()
     print("👤 Paso 4: Creando usuario administrador...")
     try:
@@ -288,12 +170,10 @@ def create_admin_user():
             print(f"      Email: {admin[1]}")
             print(f"      Role: {admin[2]}")
         else:
-            # Generar hash de contraseña
+            # Generar hash de contraseña (mismo costo bcrypt que el alta masiva)
+            from user_provisioning import hash_password
             password = 'admin123'
-            password_hash = bcrypt.hashpw(
-                password.encode('utf-8'),
-                bcrypt.gensalt()
-            ).decode('utf-8')
+            password_hash = hash_password(password)
             
             # Insertar admin
             cursor.execute("""
@@ -318,6 +198,8 @@ def create_admin_user():
 
 def verify_setup():
     """Verificar que todo esté configurado correctamente"""
+    import psycopg2
+
     print()
     print("🔍 Paso 5: Verificando configuración...")
     try:
@@ -332,6 +214,10 @@ def verify_setup():
             FROM information_schema.tables 
             WHERE table_schema = 'public' 
             AND table_type = 'BASE TABLE'
+            AND table_name <> 'schema_migrations'
+            AND table_name NOT IN (
+                SELECT relname FROM pg_class WHERE relispartition AND relnamespace = 'public'::regnamespace
+            )
         """)
         table_count = cursor.fetchone()[0]
         
@@ -343,7 +229,7 @@ def verify_setup():
         cursor.execute("SELECT username, email, role FROM users WHERE username = 'admin'")
         admin = cursor.fetchone()
         
-        print(f"   ✅ Tablas creadas: {table_count}/4")
+        print(f"   ✅ Tablas creadas: {table_count}/6")
         print(f"   ✅ Usuarios en sistema: {user_count}")
         
         if admin:
@@ -354,7 +240,7 @@ def verify_setup():
         cursor.close()
         conn.close()
         
-        if table_count >= 4 and admin:
+        if table_count >= 6 and admin:
             return True
         else:
             return False
@@ -370,6 +256,7 @@ def verify_setup():
 def main():
     """Función principal"""
     success = True
+    print_header()
     
     # Paso 1: Probar conexión
     if not test_connection():
@@ -0,0 +1,410 @@
+"""
+Ingesta de eventos de actividad con escritura diferida (write-behind)
+Los requests validan y encolan en un buffer acotado en memoria; un hilo los escribe en
+user_activities con COPY por tamaño de lote o por tiempo. Buffer lleno = 429 (backpressure)
+Al terminar el proceso se vacía el buffer; un lote fallido se reencola (at-least-once)
+Uso: python ingestion.py [--events 200000] [--request-size 1000] [--parse-only]
+"""
+import argparse
+import atexit
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+
+from config import ACTIVE_USERS_CONFIG, INGEST_CONFIG, ROLLUP_CONFIG
+from db_pool import get_pool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COLUMNS = ('user_id', 'activity_type', 'activity_data', 'created_at')
+COPY_SQL = f"COPY user_activities ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Staging por conexión: solo se usa si el COPY directo viola la FK de user_id
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS ingest_activities (
+        user_id INTEGER,
+        activity_type VARCHAR(50),
+        activity_data JSONB,
+        created_at TIMESTAMP
+    ) ON COMMIT DELETE ROWS
+"""
+STAGED_INSERT_SQL = f"""
+    INSERT INTO user_activities ({', '.join(COLUMNS)})
+    SELECT {', '.join(COLUMNS)} FROM ingest_activities i
+    WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = i.user_id)
+"""
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+MAX_ERRORS = 10  # Errores de validación devueltos por request
+MAX_USER_ID = 2 ** 31 - 1  # INTEGER
+
+
+# ============================================
+# PARSEO Y VALIDACIÓN
+# ============================================
+
+def _loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def _dumps(value):
+    return orjson.dumps(value).decode() if orjson else json.dumps(value, separators=(',', ':'))
+
+
+def parse_events(body, mimetype=None):
+    """Cuerpo -> (eventos [(índice, objeto)], errores); JSON inválido en el cuerpo = ValueError"""
+    if mimetype in NDJSON_MIMETYPES:
+        events, errors = [], []
+        for index, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                events.append((index, _loads(line)))
+            except ValueError:
+                errors.append({'index': index, 'error': 'JSON inválido'})
+        return events, errors
+
+    try:
+        payload = _loads(body)
+    except ValueError:
+        raise ValueError('JSON inválido (usa Content-Type: application/x-ndjson para un evento por línea)')
+    if isinstance(payload, dict) and isinstance(payload.get('events'), list):
+        payload = payload['events']
+    return list(enumerate(payload if isinstance(payload, list) else [payload])), []
+
+
+def max_skew():
+    """Segundos admitidos entre created_at y la recepción: la fila debe caer dentro del solape con
+    que daily_rollup.py y active_users.py releen desde su watermark, aun esperando un flush"""
+    overlap = min(ROLLUP_CONFIG['overlap'], ACTIVE_USERS_CONFIG['overlap']) - INGEST_CONFIG['flush_interval']
+    return max(0.0, min(INGEST_CONFIG['max_skew'], overlap))
+
+
+def parse_timestamp(value, received_at, skew=None):
+    """ISO 8601 -> hora local sin zona (created_at es TIMESTAMP); None = hora de recepción
+    Fuera de received_at ± skew = ValueError: atrasada o futura, no llegaría a los rollups"""
+    if value is None:
+        return received_at
+    if not isinstance(value, str):
+        raise ValueError("'created_at' debe ser un string ISO 8601")
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'created_at' inválido: {value[:40]}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    skew = max_skew() if skew is None else skew
+    if abs(timestamp - received_at) > timedelta(seconds=skew):
+        raise ValueError(f"'created_at' debe estar a menos de {skew:g}s de la hora de recepción")
+    return timestamp
+
+
+def event_row(event, received_at, skew=None):
+    """Evento -> fila para COPY (user_id, activity_type, activity_data JSON, created_at)"""
+    if not isinstance(event, dict):
+        raise ValueError('El evento debe ser un objeto JSON')
+    user_id = event.get('user_id')
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or not 0 < user_id <= MAX_USER_ID:
+        raise ValueError("'user_id' debe ser un entero positivo")
+    activity_type = event.get('activity_type')
+    if not isinstance(activity_type, str) or not 0 < len(activity_type) <= 50 or '\x00' in activity_type:
+        raise ValueError("'activity_type' debe ser un string de 1 a 50 caracteres")
+
+    data = event.get('activity_data')
+    if data is not None:
+        if not isinstance(data, (dict, list)):
+            raise ValueError("'activity_data' debe ser un objeto o una lista")
+        try:
+            data = _dumps(data)
+        except (TypeError, ValueError):
+            raise ValueError("'activity_data' no se puede serializar")
+        if '\\u0000' in data:
+            raise ValueError("'activity_data' no puede contener \\u0000 (JSONB lo rechaza)")
+
+    created_at = parse_timestamp(event.get('created_at'), received_at, skew)
+    return user_id, activity_type, data, created_at.isoformat(sep=' ')
+
+
+def prepare_events(body, mimetype=None):
+    """Cuerpo del request -> (filas válidas, errores [{'index', 'error'}])"""
+    events, errors = parse_events(body, mimetype)
+    if len(events) > INGEST_CONFIG['max_request_events']:
+        raise ValueError(f"Máximo {INGEST_CONFIG['max_request_events']} eventos por request")
+    received_at = datetime.now()
+    skew = max_skew()
+    rows = []
+    for index, event in events:
+        try:
+            rows.append(event_row(event, received_at, skew))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    errors.sort(key=lambda error: error['index'])
+    return rows, errors
+
+
+# ============================================
+# BUFFER Y ESCRITOR
+# ============================================
+
+_ingestors = weakref.WeakSet()
+
+
+class ActivityIngestor:
+    """Buffer acotado de filas de user_activities y el hilo que las escribe con COPY"""
+
+    def __init__(self, buffer_size=None, batch_size=None, flush_interval=None, retry_interval=None):
+        self.buffer_size = buffer_size or INGEST_CONFIG['buffer_size']
+        self.batch_size = batch_size or INGEST_CONFIG['batch_size']
+        self.flush_interval = INGEST_CONFIG['flush_interval'] if flush_interval is None else flush_interval
+        self.retry_interval = INGEST_CONFIG['retry_interval'] if retry_interval is None else retry_interval
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._pending = 0  # Encolados + en escritura: lo que cuenta para el límite
+        self._first_at = None  # Momento en que el buffer dejó de estar vacío
+        self._stopping = False
+        self._thread = None
+        self._thread_pid = None
+        self._counters = {'accepted': 0, 'rejected': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'failures': 0}
+        self._last_error = None
+        self._last_flush_ms = None
+        _ingestors.add(self)
+
+    def start(self):
+        """Iniciar el hilo escritor (idempotente; se reinicia tras un fork)"""
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread_pid == pid and (self._thread.is_alive() or self._stopping):
+                return  # Ya corre, o se detuvo al terminar: offer() responde False
+            if self._thread_pid != pid:
+                # El buffer heredado del padre lo escribe el padre
+                self._buffer, self._pending, self._first_at = [], 0, None
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='activity-ingest', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def offer(self, rows):
+        """Encolar todas las filas o ninguna; False si no entran en el buffer (429)"""
+        self.start()
+        with self._cond:
+            if self._stopping or self._pending + len(rows) > self.buffer_size:
+                self._counters['rejected'] += len(rows)
+                return False
+            # Despertar al escritor con el primer evento (arranca el plazo) o con un lote completo
+            wake = not self._buffer or len(self._buffer) + len(rows) >= self.batch_size
+            if not self._buffer:
+                self._first_at = time.monotonic()
+            self._buffer.extend(rows)
+            self._pending += len(rows)
+            self._counters['accepted'] += len(rows)
+            if wake:
+                self._cond.notify()
+        return True
+
+    def stop(self, timeout=None):
+        """Escribir lo encolado y detener el hilo; retorna filas que quedaron sin escribir"""
+        timeout = INGEST_CONFIG['shutdown_timeout'] if timeout is None else timeout
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is None or self._thread_pid != os.getpid():
+            return 0  # Sin escritor en este proceso (el buffer heredado es del padre)
+        self._thread.join(timeout)
+        if self._pending:
+            print(f"⚠️  Ingesta: {self._pending} eventos sin escribir al terminar")
+        return self._pending
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._counters,
+                'queued': len(self._buffer),
+                'pending': self._pending,
+                'buffer_size': self.buffer_size,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'last_flush_ms': self._last_flush_ms,
+                'last_error': self._last_error,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Esperar un lote completo o que el evento más viejo cumpla flush_interval
+                while not self._stopping and len(self._buffer) < self.batch_size:
+                    if self._buffer:
+                        remaining = self.flush_interval - (time.monotonic() - self._first_at)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if not self._buffer:
+                    return  # Detenido y vacío
+                batch, self._buffer, self._first_at = self._buffer, [], None
+            if not self._flush(batch):
+                # También al detenerse: se reintenta hasta el timeout de stop()
+                with self._cond:
+                    self._cond.wait(self.retry_interval)
+
+    def _flush(self, batch):
+        """Escribir el lote en bloques de batch_size; si falla, reencolar lo no escrito adelante"""
+        start = time.perf_counter()
+        for offset in range(0, len(batch), self.batch_size):
+            rows = batch[offset:offset + self.batch_size]
+            try:
+                with get_pool().connection() as conn:
+                    dropped = self._write(conn, rows)
+            except Exception as e:
+                with self._cond:
+                    unwritten = batch[offset:]
+                    self._buffer[:0] = unwritten
+                    self._first_at = time.monotonic()
+                    self._counters['failures'] += 1
+                    self._last_error = f"{type(e).__name__}: {e}"
+                return False
+            with self._cond:
+                self._pending -= len(rows)
+                self._counters['written'] += len(rows) - dropped
+                self._counters['dropped'] += dropped
+                self._counters['batches'] += 1
+        self._last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+        return True
+
+    def _write(self, conn, rows):
+        """COPY de un bloque; retorna filas descartadas (usuario inexistente o rechazadas por PostgreSQL)"""
+        import psycopg2
+
+        try:
+            return self._copy(conn, rows)
+        except psycopg2.DataError:
+            # Una fila que PostgreSQL no acepta no puede bloquear la cola: partir hasta aislarla
+            conn.rollback()
+            if len(rows) == 1:
+                return 1
+            middle = len(rows) // 2
+            return self._write(conn, rows[:middle]) + self._write(conn, rows[middle:])
+
+    @staticmethod
+    def _copy(conn, rows):
+        import psycopg2
+
+        buffer = io.StringIO()
+        # CSV: None se escribe como campo vacío sin comillas = NULL
+        csv.writer(buffer).writerows(rows)
+        cursor = conn.cursor()
+        try:
+            try:
+                buffer.seek(0)
+                cursor.copy_expert(COPY_SQL, buffer)
+                conn.commit()
+                return 0
+            except psycopg2.IntegrityError:
+                # FK de user_id: pasar por staging y descartar los usuarios inexistentes
+                conn.rollback()
+            cursor.execute(STAGING_SQL)
+            buffer.seek(0)
+            cursor.copy_expert(COPY_SQL.replace('user_activities', 'ingest_activities', 1), buffer)
+            cursor.execute(STAGED_INSERT_SQL)
+            inserted = cursor.rowcount
+            conn.commit()
+            return len(rows) - inserted
+        finally:
+            cursor.close()
+
+
+def stop_all(timeout=None):
+    """Vaciar los buffers de todos los ingestores del proceso (atexit / worker_exit de gunicorn)"""
+    for ingestor in list(_ingestors):
+        ingestor.stop(timeout)
+
+
+atexit.register(stop_all)
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def ndjson_bodies(events, request_size, user_ids):
+    """Cuerpos NDJSON de request_size eventos cada uno"""
+    bodies = []
+    for start in range(0, events, request_size):
+        lines = [
+            _dumps({
+                'user_id': user_ids[i % len(user_ids)],
+                'activity_type': 'ingest_benchmark',
+                'activity_data': {'game_id': i % 50, 'score': i % 1000, 'session': f"s{i // 100}"}
+            })
+            for i in range(start, min(start + request_size, events))
+        ]
+        bodies.append('\n'.join(lines).encode())
+    return bodies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput de la ingesta de eventos')
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--request-size', type=int, default=1000, help='Eventos por request NDJSON')
+    parser.add_argument('--parse-only', action='store_true', help='Solo parseo y validación (sin base de datos)')
+    parser.add_argument('--keep', action='store_true', help='No borrar los eventos de prueba')
+    args = parser.parse_args()
+
+    user_ids = [1]
+    if not args.parse_only:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users ORDER BY id LIMIT 1000")
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            conn.commit()
+        if not user_ids:
+            print("❌ No hay usuarios: ejecuta python utils.py seed primero")
+            sys.exit(1)
+
+    bodies = ndjson_bodies(args.events, args.request_size, user_ids)
+    print(f"📨 {args.events} eventos en {len(bodies)} requests NDJSON "
+          f"({sum(map(len, bodies)) / 1024 / 1024:.1f} MB, JSON: {'orjson' if orjson else 'stdlib'})")
+
+    start = time.perf_counter()
+    batches = [prepare_events(body, 'application/x-ndjson')[0] for body in bodies]
+    parsed = time.perf_counter() - start
+    print(f"   ⚡ Parseo + validación: {args.events / parsed:>12,.0f} eventos/s")
+    if args.parse_only:
+        return
+
+    ingestor = ActivityIngestor(buffer_size=max(INGEST_CONFIG['buffer_size'], args.request_size))
+    start = time.perf_counter()
+    retries = 0
+    for rows in batches:
+        while not ingestor.offer(rows):
+            retries += 1  # 429: el cliente reintenta
+            time.sleep(0.005)
+    ingestor.stop(timeout=600)
+    elapsed = time.perf_counter() - start
+    stats = ingestor.stats()
+    print(f"   💾 Escritura (COPY): {stats['written'] / elapsed:>12,.0f} eventos/s "
+          f"({stats['batches']} lotes, {retries} reintentos por buffer lleno, {stats['dropped']} descartados)")
+
+    if not args.keep:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM user_activities WHERE activity_type = 'ingest_benchmark'")
+            cursor.close()
+            conn.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Instrumentación - Histogramas de latencia por fase, conteo de queries/filas y stats del pool
+Se exponen en formato de texto de Prometheus (GET /metrics)
+Desactivada por defecto (METRICS_ENABLED): cada hook es un `if` sobre un booleano
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from config import DB_NAME, METRICS_CONFIG
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram:
+    """Histograma de buckets fijos con labels (formato Prometheus)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = sorted(buckets or METRICS_CONFIG['buckets'])
+        self._series = {}  # labels -> [conteo por bucket..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float('inf')], counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Registro de métricas del servicio"""
+
+    def __init__(self, enabled=None):
+        self.enabled = METRICS_CONFIG['enabled'] if enabled is None else enabled
+        # Fases: connect (get_db_connection), pool_acquire (checkout del pool),
+        # query (execute + fetch), dataframe (armado de DataFrames), serialize (JSON),
+        # compress (gzip/brotli de la respuesta)
+        self.phase_seconds = Histogram(
+            'analytics_phase_duration_seconds', 'Latencia por fase', ('phase',))
+        self.request_seconds = Histogram(
+            'analytics_http_request_duration_seconds', 'Latencia de cada endpoint',
+            ('endpoint', 'method', 'status'))
+        self.queries = Counter(
+            'analytics_db_queries_total', 'Queries ejecutadas', ('statement', 'status'))
+        self.rows = Counter(
+            'analytics_db_rows_total', 'Filas retornadas por las queries', ('statement',))
+        self._collectors = [self.phase_seconds, self.request_seconds, self.queries, self.rows]
+
+    def observe_phase(self, phase, seconds):
+        self.phase_seconds.observe(seconds, phase)
+
+    @contextmanager
+    def phase(self, name):
+        """Medir un bloque como fase (usar solo tras comprobar self.enabled)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds.observe(time.perf_counter() - start, name)
+
+    def record_query(self, query, seconds, rows=0, success=True):
+        statement = statement_type(query)
+        if success:
+            self.phase_seconds.observe(seconds, 'query')
+        self.queries.inc(statement, 'ok' if success else 'error')
+        if rows:
+            self.rows.inc(statement, amount=rows)
+
+    def record_request(self, endpoint, method, status, seconds):
+        self.request_seconds.observe(seconds, endpoint or 'unknown', method, str(status))
+
+    def render(self):
+        """Texto de exposición de Prometheus (incluye el estado de los pools)"""
+        lines = []
+        for metric in self._collectors:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        lines.extend(_pool_lines())
+        return '\n'.join(lines) + '\n'
+
+
+def statement_type(query):
+    """Primera palabra de la query (SELECT, INSERT...) para limitar la cardinalidad"""
+    words = query.lstrip(' \t\n(').split(None, 1) if isinstance(query, str) else []
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def _pool_label(database):
+    """None = DB_NAME, False = conexión al servidor sin database"""
+    if database is False:
+        return 'server'
+    return database or DB_NAME
+
+
+def _pool_lines():
+    from db_pool import pool_stats
+
+    stats = pool_stats()
+    lines = [
+        "# HELP analytics_db_pool_connections Conexiones del pool por estado",
+        "# TYPE analytics_db_pool_connections gauge"
+    ]
+    for pool in stats:
+        database = _pool_label(pool['database'])
+        for state in ('idle', 'in_use', 'max_size'):
+            lines.append(f'analytics_db_pool_connections{{database="{_escape(database)}",state="{state}"}} '
+                         f'{pool[state]}')
+    lines += [
+        "# HELP analytics_db_pool_events_total Eventos del pool (created, discarded, checkouts, timeouts)",
+        "# TYPE analytics_db_pool_events_total counter"
+    ]
+    for pool in stats:
+        database = _pool_label(pool['database'])
+        for event in ('created', 'discarded', 'checkouts', 'timeouts'):
+            lines.append(f'analytics_db_pool_events_total{{database="{_escape(database)}",event="{event}"}} '
+                         f'{pool[event]}')
+    return lines
+
+
+metrics = Metrics()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'  # Flask agrega charset=utf-8
+
+
+def instrument_flask(app):
+    """Latencia por endpoint y de serialización JSON para la app Flask"""
+    if not metrics.enabled:
+        return app
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            metrics.record_request(request.endpoint, request.method, response.status_code,
+                                   time.perf_counter() - start)
+        return response
+
+    _instrument_json(app)
+    return app
+
+
+def instrument_quart(app):
+    """Equivalente de instrument_flask para app_async (Quart)"""
+    if not metrics.enabled:
+        return app
+    from quart import g, request
+
+    @app.before_request
+    async def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    async def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            metrics.record_request(request.endpoint, request.method, response.status_code,
+                                   time.perf_counter() - start)
+        return response
+
+    _instrument_json(app)
+    return app
+
+
+def _instrument_json(app):
+    """Medir response() del proveedor JSON de la app (lo usa jsonify)"""
+    provider = app.json
+    response = provider.response
+
+    def timed_response(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return response(*args, **kwargs)
+        finally:
+            metrics.observe_phase('serialize', time.perf_counter() - start)
+
+    provider.response = timed_response
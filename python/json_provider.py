@@ -0,0 +1,201 @@
+"""
+Proveedor JSON para Flask/Quart - orjson si está instalado, mismos bytes que jsonify
+Decimal, date/datetime y RealDictRow sin copias intermedias; compresión gzip/brotli opcional
+"""
+import gzip
+import re
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import JSON_CONFIG
+from instrumentation import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# date/datetime y dataclasses pasan por default() (http_date y asdict, como jsonify)
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+# Floats que orjson escribe distinto que repr(): exponentes (1e16 vs 1e+16) y < 1e-4 (0.00001 vs 1e-05)
+_EXPONENT = re.compile(rb'e[-\d]')
+_SMALL_FLOAT = re.compile(rb'(?<![\d.])0\.0000')
+_NON_ASCII = re.compile('[^\x00-\x7f]')
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Tipos de contenido que vale la pena comprimir
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv')
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def http_date(value):
+    """Mismo texto que werkzeug.http.http_date (date = medianoche UTC, naive = UTC)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        _DAYS[value.weekday()], value.day, _MONTHS[value.month - 1], value.year, hour, minute, second)
+
+
+def _default(value):
+    """default() de jsonify con atajos para los tipos que devuelve psycopg2"""
+    cls = type(value)
+    if cls is datetime or cls is date:
+        return http_date(value)
+    if cls is Decimal:
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+
+def _float_mismatch(data):
+    if b'0.0000' in data and _SMALL_FLOAT.search(data):
+        return True
+    # 'e' seguida de dígito o '-' también aparece en textos: confirmar que es un número
+    return any(data[m.start() - 1:m.start()].isdigit() for m in _EXPONENT.finditer(data))
+
+
+def _escape_char(match):
+    """\\uXXXX en minúsculas y pares sustitutos, igual que json con ensure_ascii"""
+    code = ord(match.group())
+    if code < 0x10000:
+        return '\\u%04x' % code
+    code -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+
+
+def ascii_escape(data):
+    """Escapar los caracteres no-ASCII de un JSON en UTF-8 (no-op si ya es ASCII)"""
+    if data.isascii():
+        return data
+    return _NON_ASCII.sub(_escape_char, data.decode('utf-8')).encode('ascii')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider con orjson para response(); la salida es la de json.dumps"""
+
+    default = staticmethod(_default)
+
+    def __init__(self, app, encoder=None, ensure_ascii=None):
+        super().__init__(app)
+        encoder = encoder or JSON_CONFIG['encoder']
+        if encoder == 'orjson' and orjson is None:
+            raise ImportError("JSON_ENCODER=orjson requiere el paquete orjson")
+        self.use_orjson = orjson is not None and encoder != 'stdlib'
+        self.ensure_ascii = JSON_CONFIG['ensure_ascii'] if ensure_ascii is None else ensure_ascii
+
+    def encode(self, obj, indent=False):
+        """JSON en bytes, compacto o con indent=2"""
+        if self.use_orjson:
+            option = _ORJSON_OPTIONS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                data = orjson.dumps(obj, default=self.default, option=option)
+            except orjson.JSONEncodeError:
+                # Claves no-str, enteros > 64 bits, numpy...: json decide (o falla igual)
+                data = None
+            if data is not None and not _float_mismatch(data):
+                return ascii_escape(data) if self.ensure_ascii else data
+        dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+        return super().dumps(obj, **dump_args).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        # orjson solo cubre las dos formas que usa response(); el resto va a json
+        if kwargs == {'separators': (',', ':')}:
+            return self.encode(obj).decode('utf-8')
+        if kwargs == {'indent': 2}:
+            return self.encode(obj, indent=True).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """Igual que DefaultJSONProvider.response pero sin pasar por str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+# ============================================
+# COMPRESIÓN
+# ============================================
+
+def compress(data, encoding):
+    """Comprimir con 'br' o 'gzip' (mtime=0 para que la salida sea determinista)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=JSON_CONFIG['brotli_quality'])
+    return gzip.compress(data, compresslevel=JSON_CONFIG['gzip_level'], mtime=0)
+
+
+def _compressible(response):
+    return (200 <= response.status_code < 300 and response.status_code not in (204, 206)
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def _encode_body(response, request, data):
+    """Comprimir data si supera el umbral y el cliente lo acepta; None = sin cambios"""
+    if len(data) < JSON_CONFIG['compress_min_size']:
+        return None
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return None
+    start = time.perf_counter()
+    body = compress(data, encoding)
+    if metrics.enabled:
+        metrics.observe_phase('compress', time.perf_counter() - start)
+    response.headers['Content-Encoding'] = encoding
+    return body
+
+
+def install_json_flask(app):
+    """Proveedor JSON y compresión para app.py (llamar antes de instrument_flask)"""
+    app.json = FastJSONProvider(app)
+    if not JSON_CONFIG['compression']:
+        return app
+    from flask import request
+
+    @app.after_request
+    def _compress_response(response):
+        if response.direct_passthrough or response.is_streamed or not _compressible(response):
+            return response
+        body = _encode_body(response, request, response.get_data())
+        if body is not None:
+            response.set_data(body)
+        return response
+
+    return app
+
+
+def install_json_quart(app):
+    """Equivalente de install_json_flask para app_async (Quart)"""
+    app.json = FastJSONProvider(app)
+    if not JSON_CONFIG['compression']:
+        return app
+    from quart import request
+
+    @app.after_request
+    async def _compress_response(response):
+        if not isinstance(response.response, response.data_body_class) or not _compressible(response):
+            return response
+        body = _encode_body(response, request, await response.get_data())
+        if body is not None:
+            response.set_data(body)
+        return response
+
+    return app
@@ -0,0 +1,277 @@
+"""
+Consultas sobre los JSONB de user_activities.activity_data y analytics.metric_data
+Filtros por contención (@>), jsonpath (@?), clave = valor, tipo y rango de fechas, con
+agrupación opcional; los sirven los índices GIN jsonb_path_ops y de expresión de la migración 0005
+Uso: python jsonb_queries.py [--runs 5]   (benchmark: índices vs. scan secuencial)
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import date, datetime, timedelta
+
+from db_pool import get_pool
+
+# Fuente -> tabla y columnas (lista cerrada: se interpola en SQL)
+SOURCES = {
+    'activities': {
+        'table': 'user_activities',
+        'data': 'activity_data',
+        'type': 'activity_type',
+        'time': 'created_at',
+        'columns': 'id, user_id, activity_type, activity_data, created_at',
+        'groups': {'type': 'activity_type', 'day': 'DATE(created_at)', 'user': 'user_id'}
+    },
+    'metrics': {
+        'table': 'analytics',
+        'data': 'metric_data',
+        'type': 'metric_name',
+        'time': 'date_recorded',  # DATE
+        'columns': 'id, metric_name, metric_value, metric_data, date_recorded',
+        'groups': {'type': 'metric_name', 'day': 'date_recorded'}
+    }
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Errores de PostgreSQL causados por el request (jsonpath inválido en ?path=): 400 en vez de 500
+INPUT_ERRORS = ('SyntaxError', 'PostgresSyntaxError', 'InvalidTextRepresentation', 'InvalidTextRepresentationError')
+
+
+# ============================================
+# FILTROS
+# ============================================
+
+def json_key_path(key):
+    """Clave -> jsonpath '$."clave"' (existencia con @?, que sí usa jsonb_path_ops)"""
+    escaped = key.replace('\\', '\\\\').replace('"', '\\"')
+    return f'$."{escaped}"'
+
+
+def parse_time(value, name, date_only):
+    """'2024-05-01' o '2024-05-01T10:00:00' -> date/datetime según la columna"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' debe ser una fecha ISO 8601")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.date() if date_only else parsed
+
+
+def parse_filters(args):
+    """Query string -> filtros validados; ValueError con el mensaje para el 400"""
+    source = args.get('source', 'activities')
+    if source not in SOURCES:
+        raise ValueError(f"'source' debe ser uno de: {', '.join(SOURCES)}")
+    spec = SOURCES[source]
+    date_only = spec['time'] == 'date_recorded'
+    filters = {'source': source}
+
+    types = [value for value in (args.get('type') or '').split(',') if value]
+    if types:
+        filters['types'] = types
+    for name in ('since', 'until'):
+        if args.get(name):
+            filters[name] = parse_time(args[name], name, date_only)
+
+    contains = args.get('contains')
+    if contains is not None:
+        try:
+            value = json.loads(contains)
+        except ValueError:
+            value = None
+        if not isinstance(value, (dict, list)):
+            raise ValueError("'contains' debe ser un objeto o lista JSON, p. ej. {\"game_id\": 3}")
+        filters['contains'] = json.dumps(value)
+    if args.get('path'):
+        filters['path'] = args['path']
+    has = [key for key in (args.get('has') or '').split(',') if key]
+    if has:
+        filters['has'] = has
+    if (args.get('key') is None) != (args.get('value') is None):
+        raise ValueError("'key' y 'value' van juntos")
+    if args.get('key') is not None:
+        filters['key'] = (args['key'], args['value'])
+
+    group_by = args.get('group_by')
+    if group_by:
+        if group_by.startswith('key:') and len(group_by) > 4:
+            filters['group_by'] = ('key', group_by[4:])
+        elif group_by in spec['groups']:
+            filters['group_by'] = (group_by, None)
+        else:
+            options = ', '.join(list(spec['groups']) + ['key:<clave>'])
+            raise ValueError(f"'group_by' debe ser uno de: {options}")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("'limit' debe ser un entero")
+    filters['limit'] = max(1, min(limit, MAX_LIMIT))
+    return filters
+
+
+def build_query(filters):
+    """Filtros -> (sql, params) con placeholders %s (psycopg2; asyncpg vía to_asyncpg)"""
+    spec = SOURCES[filters['source']]
+    data = spec['data']
+    where, params = [], []
+    if 'types' in filters:
+        where.append(f"{spec['type']} = ANY(%s)")
+        params.append(filters['types'])
+    if 'since' in filters:
+        where.append(f"{spec['time']} >= %s")
+        params.append(filters['since'])
+    if 'until' in filters:
+        where.append(f"{spec['time']} < %s")
+        params.append(filters['until'])
+    # @> y @? usan el GIN jsonb_path_ops; ->> = usa el índice de expresión si la clave tiene uno
+    if 'contains' in filters:
+        where.append(f"{data} @> %s::jsonb")
+        params.append(filters['contains'])
+    if 'path' in filters:
+        where.append(f"{data} @? %s::jsonpath")
+        params.append(filters['path'])
+    for key in filters.get('has', ()):
+        where.append(f"{data} @? %s::jsonpath")
+        params.append(json_key_path(key))
+    if 'key' in filters:
+        where.append(f"{data}->>%s = %s")
+        params.extend(filters['key'])
+    clause = f"WHERE {' AND '.join(where)}" if where else ''
+
+    if 'group_by' in filters:
+        group, key = filters['group_by']
+        select_params = []
+        if group == 'key':
+            expression = f"{data}->>%s"
+            select_params.append(key)
+        else:
+            expression = spec['groups'][group]
+        # Por día en orden cronológico; el resto, de mayor a menor
+        order = 'key' if group == 'day' else 'count DESC, key'
+        sql = f"""
+            SELECT {expression} AS key, COUNT(*) AS count
+            FROM {spec['table']}
+            {clause}
+            GROUP BY 1
+            ORDER BY {order}
+            LIMIT %s
+        """
+        return sql, select_params + params + [filters['limit']]
+
+    sql = f"""
+        SELECT {spec['columns']}
+        FROM {spec['table']}
+        {clause}
+        ORDER BY {spec['time']} DESC
+        LIMIT %s
+    """
+    return sql, params + [filters['limit']]
+
+
+def decode_json(rows, source):
+    """asyncpg devuelve JSONB como texto: decodificar la columna de datos"""
+    column = SOURCES[source]['data']
+    for row in rows:
+        if isinstance(row.get(column), str):
+            row[column] = json.loads(row[column])
+    return rows
+
+
+def query_result(filters, rows):
+    """Cuerpo de la respuesta: 'groups' o 'rows' según group_by"""
+    result = {'success': True, 'source': filters['source'], 'count': len(rows)}
+    result['groups' if 'group_by' in filters else 'rows'] = rows
+    return result
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def bench_cases():
+    """(nombre, query string) representativos sobre los datos de data_generator.py"""
+    week_ago = (date.today() - timedelta(days=7)).isoformat()
+    return [
+        ('contains game_id=3', {'contains': '{"game_id": 3}'}),
+        ('contains game_id=3, por tipo', {'contains': '{"game_id": 3}', 'group_by': 'type'}),
+        ('has price (jsonpath), por día', {'has': 'price', 'group_by': 'day'}),
+        ('key game_id = 7 (expresión)', {'key': 'game_id', 'value': '7'}),
+        ('purchase 7 días, por game_id', {'type': 'purchase', 'since': week_ago, 'group_by': 'key:game_id'}),
+        ('metrics contains device', {'source': 'metrics', 'contains': '{"device": "console"}', 'group_by': 'type'})
+    ]
+
+
+def _plan_summary(plan):
+    """Nodos de lectura del plan: 'Bitmap Index Scan idx_x', 'Seq Scan t', ... (particiones agrupadas)"""
+    scans = []
+
+    def walk(node):
+        if 'Scan' in node['Node Type']:
+            target = node.get('Index Name') or node.get('Relation Name') or ''
+            target = re.sub(r'_(p\d{6}|default)$', '_*', target)
+            label = f"{node['Node Type']} {target}".strip()
+            if label not in scans:
+                scans.append(label)
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    walk(plan)
+    return scans
+
+
+def explain(cursor, sql, params, sequential=False):
+    """(ms de ejecución, nodos de lectura) con EXPLAIN ANALYZE en una transacción descartada"""
+    if sequential:
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        cursor.execute("SET LOCAL enable_bitmapscan = off")
+        cursor.execute("SET LOCAL enable_indexonlyscan = off")
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+    result = cursor.fetchone()[0]
+    plan = (json.loads(result) if isinstance(result, str) else result)[0]
+    return plan['Execution Time'], _plan_summary(plan['Plan'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Consultas JSONB: índices GIN/expresión vs. scan secuencial')
+    parser.add_argument('--runs', type=int, default=5, help='Ejecuciones por query (se toma la mejor)')
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM user_activities")
+            activities = cursor.fetchone()[0]
+            conn.commit()
+            print(f"🔎 Consultas JSONB sobre {activities:,} actividades (mejor de {args.runs})")
+            if activities < 100000:
+                print("   ⚠️  Con pocos datos el planner prefiere el scan secuencial: "
+                      "python utils.py seed --users 10000 --games 500 --activities 1000000 --analytics 100000")
+            print(f"   {'consulta':<34}{'índices':>11}{'secuencial':>12}{'x':>7}  plan")
+
+            for name, query in bench_cases():
+                sql, params = build_query(parse_filters(query))
+                timings = {}
+                for sequential in (False, True):
+                    best, scans = None, []
+                    for _ in range(args.runs):
+                        elapsed, scans = explain(cursor, sql, params, sequential)
+                        conn.rollback()
+                        best = elapsed if best is None else min(best, elapsed)
+                    timings[sequential] = (best, scans)
+                indexed, scans = timings[False]
+                sequential = timings[True][0]
+                print(f"   {name:<34}{indexed:>9.2f}ms{sequential:>10.2f}ms{sequential / max(indexed, 0.001):>7.1f}"
+                      f"  {', '.join(scans)}")
+        except Exception as e:
+            print(f"❌ Error: {type(e).__name__}: {e}")
+            sys.exit(1)
+        finally:
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
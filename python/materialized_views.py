@@ -0,0 +1,255 @@
+"""
+Vistas materializadas para /api/analytics/basic y /api/analytics/advanced
+Definiciones, refresco (REFRESH MATERIALIZED VIEW CONCURRENTLY) y un scheduler en un hilo
+Uso: python materialized_views.py [--create] [--if-stale] [vista ...]
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+from config import MATVIEW_CONFIG
+from db_manager import DatabaseManager
+from db_pool import get_pool
+from analytics_queries import TABLES_COUNT_SQL, BASIC_SNAPSHOT_PARTS, union_all, snapshot_from_rows
+from advanced_stats import ADVANCED_STATS_SQL, build_stats
+
+# Vista -> (definición, columnas del índice único que exige CONCURRENTLY)
+# refreshed_at = now() de la transacción que refrescó la vista
+VIEWS = {
+    'mv_basic_snapshot': (f"""
+        SELECT s.ord, s.kind, s.key, s.count, now() AS refreshed_at
+        FROM ({union_all([TABLES_COUNT_SQL] + BASIC_SNAPSHOT_PARTS)}) s
+    """, ('kind', 'key')),
+    'mv_advanced_stats': (f"""
+        SELECT 1 AS id, a.games::jsonb AS games, a.by_category::jsonb AS by_category,
+               a.users::jsonb AS users, a.by_role::jsonb AS by_role, now() AS refreshed_at
+        FROM ({ADVANCED_STATS_SQL}) a
+    """, ('id',))
+}
+
+# Lecturas: la antigüedad se calcula en el servidor para no depender del reloj local
+READ_BASIC_SQL = """
+    SELECT ord, kind, key, count, refreshed_at,
+           EXTRACT(EPOCH FROM clock_timestamp() - refreshed_at)::float AS staleness
+    FROM mv_basic_snapshot
+    ORDER BY ord, count DESC
+"""
+
+READ_ADVANCED_SQL = """
+    SELECT games, by_category, users, by_role, refreshed_at,
+           EXTRACT(EPOCH FROM clock_timestamp() - refreshed_at)::float AS staleness
+    FROM mv_advanced_stats
+"""
+
+
+def create_views(cursor):
+    """Crear vistas e índices únicos si no existen; retorna los nombres"""
+    for name, (definition, key_columns) in VIEWS.items():
+        cursor.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {definition}")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({', '.join(key_columns)})"
+        )
+    return list(VIEWS)
+
+
+def view_statements():
+    """DROP + CREATE de cada vista y su índice único (migración repetible de migrations.py)"""
+    statements = []
+    for name, (definition, key_columns) in VIEWS.items():
+        statements += [
+            f"DROP MATERIALIZED VIEW IF EXISTS {name}",
+            f"CREATE MATERIALIZED VIEW {name} AS {definition}",
+            f"CREATE UNIQUE INDEX {name}_key ON {name} ({', '.join(key_columns)})"
+        ]
+    return statements
+
+
+def freshness(rows):
+    """{'refreshed_at', 'staleness_seconds'} de las filas leídas de una vista"""
+    return {
+        'refreshed_at': rows[0]['refreshed_at'].isoformat(),
+        'staleness_seconds': round(max(rows[0]['staleness'], 0.0), 3)
+    }
+
+
+def parse_basic(rows, include_tables=True):
+    """Filas de mv_basic_snapshot -> snapshot de /basic + frescura"""
+    snapshot = snapshot_from_rows(rows, include_tables)
+    snapshot.update(freshness(rows))
+    return snapshot
+
+
+def parse_advanced(rows):
+    """Fila de mv_advanced_stats -> {'stats'} de /advanced + frescura"""
+    # psycopg2 decodifica jsonb; asyncpg lo entrega como texto
+    row = {key: json.loads(value) if isinstance(value, str) else value
+           for key, value in rows[0].items()}
+    result = {'stats': build_stats(row['games'], row['by_category'], row['users'], row['by_role'])}
+    result.update(freshness(rows))
+    return result
+
+
+class MaterializedViews:
+    """Lee y refresca las vistas materializadas de analytics"""
+
+    def __init__(self, db_manager=None, refresh_intervals=None):
+        self.db = db_manager or DatabaseManager()
+        self.refresh_intervals = dict(MATVIEW_CONFIG['refresh_intervals'])
+        if refresh_intervals:
+            self.refresh_intervals.update(refresh_intervals)
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # mark_stale: refrescar sin esperar al intervalo
+        self._start_lock = threading.Lock()
+        self._invalidated_at = None  # time.monotonic() del último mark_stale
+
+    # ============================================
+    # LECTURA
+    # ============================================
+
+    def basic_snapshot(self, include_tables=True):
+        """Snapshot de /basic desde la vista (None si no existe, está vacía o quedó vieja)"""
+        result = self.db.execute_query(READ_BASIC_SQL)
+        if not result['success'] or not self.current(result['data']):
+            return None
+        return parse_basic(result['data'], include_tables)
+
+    def advanced_stats(self):
+        """Stats de /advanced desde la vista (None si no existe, está vacía o quedó vieja)"""
+        result = self.db.execute_query(READ_ADVANCED_SQL)
+        if not result['success'] or not self.current(result['data']):
+            return None
+        return parse_advanced(result['data'])
+
+    def mark_stale(self):
+        """Escritura en el backend (/api/cache/invalidate): no servir las vistas hasta que
+        se refresquen y adelantar el refresco del scheduler"""
+        self._invalidated_at = time.monotonic()
+        self._wake.set()
+
+    def current(self, rows):
+        """Filas de una vista refrescada después del último mark_stale"""
+        if not rows:
+            return False
+        if self._invalidated_at is None:
+            return True
+        # Duraciones y no horas: staleness la mide el servidor, así no importa el reloj local
+        # (el margen de error es la latencia de la lectura)
+        return rows[0]['staleness'] < time.monotonic() - self._invalidated_at
+
+    # ============================================
+    # REFRESCO
+    # ============================================
+
+    def refresh(self, names=None, force=False):
+        """Refrescar vistas; sin force se omiten las que otro proceso refrescó hace poco"""
+        import psycopg2
+
+        refreshed = {}
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for name in names or list(VIEWS):
+                        if name not in VIEWS:
+                            raise ValueError(f"Vista desconocida: {name}")
+                        try:
+                            refreshed[name] = self._refresh_view(cursor, name, force)
+                            conn.commit()
+                        except psycopg2.errors.ObjectNotInPrerequisiteState:
+                            # Nunca poblada (WITH NO DATA): CONCURRENTLY no está permitido
+                            conn.rollback()
+                            cursor.execute(f"REFRESH MATERIALIZED VIEW {name}")
+                            conn.commit()
+                            refreshed[name] = 'refreshed'
+                finally:
+                    cursor.close()
+            return {'success': True, 'views': refreshed}
+        except Exception as e:
+            return {
+                'success': False,
+                'views': refreshed,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    def _refresh_view(self, cursor, name, force):
+        """Refrescar una vista dentro de la transacción actual; retorna el resultado"""
+        # Un solo proceso refresca cada vista (workers de gunicorn, cron, CLI)
+        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (f"matview:{name}",))
+        if not cursor.fetchone()[0]:
+            return 'locked'
+
+        if not force:
+            cursor.execute(f"SELECT EXTRACT(EPOCH FROM now() - MAX(refreshed_at)) FROM {name}")
+            age = cursor.fetchone()[0]
+            # Margen del 10% para no saltear un ciclo por diferencias de reloj entre workers
+            if age is not None and float(age) < self.refresh_intervals.get(name, 0) * 0.9:
+                return 'fresh'
+
+        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+        return 'refreshed'
+
+    # ============================================
+    # SCHEDULER
+    # ============================================
+
+    def start_scheduler(self):
+        """Iniciar el hilo de refresco (idempotente; se reinicia tras un fork)"""
+        if not (MATVIEW_CONFIG['enabled'] and MATVIEW_CONFIG['scheduler']):
+            return False
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread.is_alive():
+            return True
+        with self._start_lock:
+            if self._thread_pid == pid and self._thread.is_alive():
+                return True
+            # Los hilos no sobreviven al fork: el hijo arranca el suyo
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run_scheduler, name='matview-refresh', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+        return True
+
+    def stop_scheduler(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout)
+
+    def _run_scheduler(self):
+        next_due = {name: time.monotonic() for name in VIEWS}
+        while not self._stop.is_set():
+            # Tras mark_stale: todas ya y con force (otro worker pudo refrescarlas antes de la escritura)
+            force = self._wake.is_set()
+            self._wake.clear()
+            now = time.monotonic()
+            due = list(VIEWS) if force else [name for name, at in next_due.items() if at <= now]
+            if due:
+                self.refresh(due, force=force)
+                for name in due:
+                    next_due[name] = time.monotonic() + self.refresh_intervals[name]
+            self._wake.wait(max(0.0, min(next_due.values()) - time.monotonic()))
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--create' in sys.argv:
+        print("🧱 Creando vistas materializadas...")
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            for name in create_views(cursor):
+                print(f"   ✅ {name}")
+            conn.commit()
+            cursor.close()
+
+    print("🔄 Refrescando vistas materializadas...")
+    result = MaterializedViews().refresh(args or None, force='--if-stale' not in sys.argv)
+    for name, status in result['views'].items():
+        print(f"   ✅ {name}: {status}")
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error')}")
+        sys.exit(1)
@@ -0,0 +1,625 @@
+"""
+Migraciones versionadas del esquema - tabla schema_migrations con checksums
+Las migraciones se aplican en orden y una sola vez; los índices se crean con
+CREATE INDEX CONCURRENTLY fuera de transacción (no bloquean escrituras del backend)
+y los de tablas distintas se construyen en paralelo
+
+Uso:
+    python migrations.py status
+    python migrations.py migrate [--target N] [--parallel 4] [--dry-run] [--allow-blocking]
+"""
+import argparse
+import hashlib
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import MIGRATION_CONFIG, get_db_connection
+
+MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        id VARCHAR(150) PRIMARY KEY,
+        version INTEGER,
+        name VARCHAR(100) NOT NULL,
+        kind VARCHAR(20) NOT NULL DEFAULT 'versioned',
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INTEGER
+    )
+"""
+
+RECORD_MIGRATION_SQL = """
+    INSERT INTO schema_migrations (id, version, name, kind, checksum, duration_ms)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (id) DO UPDATE
+    SET checksum = EXCLUDED.checksum, applied_at = CURRENT_TIMESTAMP, duration_ms = EXCLUDED.duration_ms
+"""
+
+# Un solo proceso migra a la vez (deploys simultáneos, setup.py + data_generator.py)
+LOCK_KEY = 'schema_migrations'
+
+# Índice de una construcción CONCURRENTLY que falló: queda INVALID y hay que recrearlo
+INDEX_STATE_SQL = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)"
+
+# Tabla particionada: CONCURRENTLY no se admite en el padre, se construye partición por partición
+PARTITIONS_SQL = """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+    ORDER BY c.relname
+"""
+
+
+class MigrationError(Exception):
+    """Migración aplicada que ya no coincide con el código, o versión duplicada"""
+
+
+class Index:
+    """Índice creado con CREATE INDEX CONCURRENTLY (sin bloquear INSERT/UPDATE/DELETE)"""
+
+    def __init__(self, name, table, definition, unique=False):
+        self.name = name
+        self.table = table
+        self.definition = definition  # '(email)', 'USING gin (data jsonb_path_ops)', ...
+        self.unique = unique
+
+    @property
+    def sql(self):
+        return self.sql_for(self.name, self.table)
+
+    def sql_for(self, name, table):
+        """Mismo índice sobre otra tabla (partición)"""
+        unique = 'UNIQUE ' if self.unique else ''
+        return f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {self.definition}"
+
+
+class Migration:
+    """Paso del esquema: sentencias en una transacción y después índices CONCURRENTLY"""
+
+    def __init__(self, version, name, statements=(), indexes=(), repeatable=False, blocking=None):
+        self.version = version
+        self.name = name
+        self._statements = statements  # lista o función (se resuelve al aplicar)
+        self.indexes = list(indexes)
+        # Repetible: se vuelve a aplicar cuando cambia su checksum (vistas materializadas)
+        self.repeatable = repeatable
+        # SELECT que retorna true si aplicarla bloquearía las escrituras (copia filas bajo lock
+        # exclusivo): solo se aplica con allow_blocking. No forma parte del checksum
+        self.blocking = blocking
+
+    @property
+    def id(self):
+        return f"R_{self.name}" if self.repeatable else f"{self.version:04d}_{self.name}"
+
+    @property
+    def kind(self):
+        return 'repeatable' if self.repeatable else 'versioned'
+
+    @property
+    def statements(self):
+        if callable(self._statements):
+            self._statements = list(self._statements())
+        return self._statements
+
+    @property
+    def checksum(self):
+        """sha256 del SQL normalizado (espacios y sangría no cuentan)"""
+        digest = hashlib.sha256()
+        for statement in list(self.statements) + [index.sql for index in self.indexes]:
+            digest.update(' '.join(statement.split()).encode('utf-8'))
+            digest.update(b';\n')
+        return digest.hexdigest()
+
+
+def _view_statements():
+    from materialized_views import view_statements
+    return view_statements()
+
+
+# ============================================
+# MIGRACIONES (solo hacia adelante: no editar una ya aplicada, agregar otra)
+# ============================================
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(20) DEFAULT 'user' CHECK (role IN ('admin', 'moderator', 'user')),
+            full_name VARCHAR(100),
+            avatar_url VARCHAR(255),
+            is_active BOOLEAN DEFAULT true,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(200) NOT NULL,
+            subtitle VARCHAR(200),
+            description TEXT,
+            image_url VARCHAR(500),
+            category VARCHAR(100),
+            color VARCHAR(20),
+            price DECIMAL(10, 2),
+            original_price DECIMAL(10, 2),
+            discount INTEGER,
+            badge VARCHAR(20),
+            logo VARCHAR(10),
+            is_free BOOLEAN DEFAULT false,
+            rating DECIMAL(3, 2) DEFAULT 0,
+            downloads INTEGER DEFAULT 0,
+            created_by INTEGER REFERENCES users(id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_activities (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            activity_type VARCHAR(50) NOT NULL,
+            activity_data JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS analytics (
+            id SERIAL PRIMARY KEY,
+            metric_name VARCHAR(100) NOT NULL,
+            metric_value DECIMAL(10, 2),
+            metric_data JSONB,
+            date_recorded DATE DEFAULT CURRENT_DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Conteos diarios para trends/predictions
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            entity VARCHAR(50) NOT NULL,
+            day DATE NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (entity, day)
+        )
+        """,
+        # Último refresco de cada rollup
+        """
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            entity VARCHAR(50) PRIMARY KEY,
+            last_refreshed TIMESTAMP
+        )
+        """
+    ]),
+    Migration(2, 'base_indexes', indexes=[
+        Index('idx_users_email', 'users', '(email)'),
+        Index('idx_users_role', 'users', '(role)'),
+        Index('idx_users_created_at', 'users', '(created_at)'),
+        # Paginación keyset del listado (verificar_registro.py --list)
+        Index('idx_users_created_at_id', 'users', '(created_at, id)'),
+        Index('idx_games_category', 'games', '(category)'),
+        Index('idx_games_created_at', 'games', '(created_at)'),
+        Index('idx_activities_user_id', 'user_activities', '(user_id)'),
+        Index('idx_activities_created_at', 'user_activities', '(created_at)'),
+        Index('idx_analytics_date', 'analytics', '(date_recorded)')
+    ]),
+    # Tablas de eventos particionadas por mes (partitions.py crea los meses futuros y aplica la retención)
+    # Conversión única: copia las filas en una transacción bajo lock exclusivo, así que con datos
+    # solo se aplica con --allow-blocking (ventana de mantenimiento); en una base vacía es instantánea
+    # Sin PRIMARY KEY: en una tabla particionada debería incluir la clave, que admite NULL
+    Migration(3, 'partition_event_tables', [
+        "ALTER TABLE user_activities RENAME TO user_activities_unpartitioned",
+        """
+        CREATE TABLE user_activities (
+            id INTEGER NOT NULL DEFAULT nextval('user_activities_id_seq'),
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            activity_type VARCHAR(50) NOT NULL,
+            activity_data JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (created_at)
+        """,
+        # Fechas fuera de los meses creados y created_at NULL
+        "CREATE TABLE user_activities_default PARTITION OF user_activities DEFAULT",
+        # Un mes por cada mes con datos, para que la copia no termine toda en DEFAULT
+        """
+        DO $$
+        DECLARE month DATE;
+        BEGIN
+            FOR month IN SELECT DISTINCT date_trunc('month', created_at)::date
+                         FROM user_activities_unpartitioned WHERE created_at IS NOT NULL LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF user_activities FOR VALUES FROM (%L) TO (%L)',
+                               'user_activities_p' || to_char(month, 'YYYYMM'), month,
+                               (month + INTERVAL '1 month')::date);
+            END LOOP;
+        END $$
+        """,
+        """
+        INSERT INTO user_activities (id, user_id, activity_type, activity_data, created_at)
+        SELECT id, user_id, activity_type, activity_data, created_at FROM user_activities_unpartitioned
+        """,
+        "ALTER SEQUENCE user_activities_id_seq OWNED BY user_activities.id",
+        "DROP TABLE user_activities_unpartitioned",
+        # Índices del padre: cada partición (también las futuras) recibe el suyo
+        "CREATE INDEX idx_activities_id ON user_activities (id)",
+        "CREATE INDEX idx_activities_user_id ON user_activities (user_id)",
+        "CREATE INDEX idx_activities_created_at ON user_activities (created_at)",
+
+        "ALTER TABLE analytics RENAME TO analytics_unpartitioned",
+        """
+        CREATE TABLE analytics (
+            id INTEGER NOT NULL DEFAULT nextval('analytics_id_seq'),
+            metric_name VARCHAR(100) NOT NULL,
+            metric_value DECIMAL(10, 2),
+            metric_data JSONB,
+            date_recorded DATE DEFAULT CURRENT_DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) PARTITION BY RANGE (date_recorded)
+        """,
+        "CREATE TABLE analytics_default PARTITION OF analytics DEFAULT",
+        """
+        DO $$
+        DECLARE month DATE;
+        BEGIN
+            FOR month IN SELECT DISTINCT date_trunc('month', date_recorded)::date
+                         FROM analytics_unpartitioned WHERE date_recorded IS NOT NULL LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF analytics FOR VALUES FROM (%L) TO (%L)',
+                               'analytics_p' || to_char(month, 'YYYYMM'), month,
+                               (month + INTERVAL '1 month')::date);
+            END LOOP;
+        END $$
+        """,
+        """
+        INSERT INTO analytics (id, metric_name, metric_value, metric_data, date_recorded, created_at)
+        SELECT id, metric_name, metric_value, metric_data, date_recorded, created_at FROM analytics_unpartitioned
+        """,
+        "ALTER SEQUENCE analytics_id_seq OWNED BY analytics.id",
+        "DROP TABLE analytics_unpartitioned",
+        "CREATE INDEX idx_analytics_id ON analytics (id)",
+        "CREATE INDEX idx_analytics_date ON analytics (date_recorded)"
+    ], blocking="SELECT EXISTS (SELECT 1 FROM user_activities) OR EXISTS (SELECT 1 FROM analytics)"),
+    # Refresco incremental del snapshot columnar (catalog_snapshot.py: updated_at >= watermark)
+    Migration(4, 'catalog_updated_at_indexes', indexes=[
+        Index('idx_games_updated_at', 'games', '(updated_at)'),
+        Index('idx_users_updated_at', 'users', '(updated_at)')
+    ]),
+    # Consultas JSONB (jsonb_queries.py): @> y @? por GIN jsonb_path_ops, ->> 'game_id' por expresión
+    Migration(5, 'jsonb_indexes', indexes=[
+        Index('idx_activities_data', 'user_activities', 'USING gin (activity_data jsonb_path_ops)'),
+        Index('idx_activities_game_id', 'user_activities', "((activity_data->>'game_id'))"),
+        Index('idx_activities_type_created_at', 'user_activities', '(activity_type, created_at)'),
+        Index('idx_analytics_metric_data', 'analytics', 'USING gin (metric_data jsonb_path_ops)')
+    ]),
+    # Sketches HyperLogLog diarios de usuarios activos (active_users.py); los BYTEA de más de
+    # ~2 KB van comprimidos a TOAST, así que los días con pocos usuarios ocupan bastante menos
+    Migration(6, 'activity_sketches', [
+        """
+        CREATE TABLE IF NOT EXISTS activity_sketches (
+            day DATE PRIMARY KEY,
+            precision SMALLINT NOT NULL,
+            registers BYTEA NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    # Vistas de analytics (materialized_views.VIEWS): se recrean cuando cambia su definición
+    Migration(None, 'analytics_views', _view_statements, repeatable=True),
+]
+
+
+def check_migrations(migrations):
+    """Versiones únicas y crecientes; las repetibles al final"""
+    versions = [m.version for m in migrations if not m.repeatable]
+    if versions != sorted(set(versions)):
+        raise MigrationError(f"Versiones duplicadas o fuera de orden: {versions}")
+
+
+# ============================================
+# ESTADO
+# ============================================
+
+def applied_migrations(cursor):
+    """{id: fila} de schema_migrations"""
+    cursor.execute("SELECT id, version, name, kind, checksum, applied_at, duration_ms FROM schema_migrations")
+    columns = [column[0] for column in cursor.description]
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def plan(applied, migrations=None, target=None):
+    """[(migración, estado)] con estado applied, pending, changed (repetible) o mismatch (error)"""
+    result = []
+    for migration in migrations or MIGRATIONS:
+        if target is not None and not migration.repeatable and migration.version > target:
+            continue
+        row = applied.get(migration.id)
+        if row is None:
+            state = 'pending'
+        elif row['checksum'] == migration.checksum:
+            state = 'applied'
+        else:
+            state = 'changed' if migration.repeatable else 'mismatch'
+        result.append((migration, state))
+    return result
+
+
+def status(migrations=None):
+    """Estado de cada migración sin aplicar nada"""
+    migrations = migrations or MIGRATIONS
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(MIGRATIONS_TABLE_SQL)
+        conn.commit()
+        applied = applied_migrations(cursor)
+        cursor.close()
+        return {
+            'success': True,
+            'migrations': [{
+                'id': migration.id,
+                'state': state,
+                'applied_at': applied[migration.id]['applied_at'].isoformat() if migration.id in applied else None,
+                'duration_ms': applied.get(migration.id, {}).get('duration_ms')
+            } for migration, state in plan(applied, migrations)],
+            # Filas de migraciones que ya no están en el código
+            'unknown': sorted(set(applied) - {migration.id for migration in migrations})
+        }
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+# ============================================
+# APLICACIÓN
+# ============================================
+
+def build_index(index):
+    """Crear un índice CONCURRENTLY en su propia conexión autocommit; retorna el resultado"""
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SET statement_timeout = 0")
+        if MIGRATION_CONFIG['maintenance_work_mem']:
+            cursor.execute("SET maintenance_work_mem = %s", (MIGRATION_CONFIG['maintenance_work_mem'],))
+
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (index.table,))
+        row = cursor.fetchone()
+        if row and row[0] == 'p':
+            return _build_partitioned_index(cursor, index)
+        return _build_concurrently(cursor, index.name, index.sql)
+    finally:
+        conn.close()
+
+
+def _build_concurrently(cursor, name, sql):
+    """CREATE INDEX CONCURRENTLY recreando un INVALID que haya quedado de un intento anterior"""
+    cursor.execute(INDEX_STATE_SQL, (name,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        return 'exists'
+    result = 'created'
+    if row:
+        # Quedó INVALID por una construcción interrumpida: IF NOT EXISTS lo daría por bueno
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        result = 'rebuilt'
+    cursor.execute(sql)
+    return result
+
+
+def _build_partitioned_index(cursor, index):
+    """Índice en ONLY el padre (instantáneo, INVALID), CONCURRENTLY en cada partición y ATTACH"""
+    cursor.execute(INDEX_STATE_SQL, (index.name,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        return 'exists'
+    unique = 'UNIQUE ' if index.unique else ''
+    cursor.execute(f"CREATE {unique}INDEX IF NOT EXISTS {index.name} ON ONLY {index.table} {index.definition}")
+
+    cursor.execute(PARTITIONS_SQL, (index.table,))
+    for (partition,) in cursor.fetchall():
+        child = f"{index.name}_{partition[len(index.table) + 1:]}"[:63]
+        _build_concurrently(cursor, child, index.sql_for(child, partition))
+        cursor.execute(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s) AND inhparent = to_regclass(%s)",
+            (child, index.name)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER INDEX {index.name} ATTACH PARTITION {child}")
+    # Con todas las particiones adjuntas el índice del padre pasa a válido
+    return 'created (partitioned)'
+
+
+def build_indexes(indexes, parallel=None, progress=None):
+    """Construir índices: tablas distintas en paralelo, los de una misma tabla en serie"""
+    by_table = OrderedDict()
+    for index in indexes:
+        by_table.setdefault(index.table, []).append(index)
+
+    def build_table(table_indexes):
+        results = []
+        for index in table_indexes:
+            start = time.perf_counter()
+            result = build_index(index)
+            results.append((index.name, result, time.perf_counter() - start))
+            if progress:
+                progress(f"      ✅ Índice '{index.name}' ({result}, {time.perf_counter() - start:.2f}s)")
+        return results
+
+    # CONCURRENTLY en la misma tabla se espera entre sí (ShareUpdateExclusiveLock)
+    workers = max(1, min(parallel or MIGRATION_CONFIG['parallel'], len(by_table)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='migrate-index') as executor:
+        futures = [executor.submit(build_table, table_indexes) for table_indexes in by_table.values()]
+        results = []
+        errors = []
+        for future in futures:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
+
+
+def apply_migration(conn, migration, parallel=None, progress=None):
+    """Aplicar una migración y registrarla; retorna la duración en segundos"""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if migration.statements:
+            # lock_timeout: si una tabla está ocupada, fallar en vez de encolar a los escritores detrás
+            cursor.execute("SET LOCAL lock_timeout = %s", (MIGRATION_CONFIG['lock_timeout'],))
+            for statement in migration.statements:
+                cursor.execute(statement)
+        if not migration.indexes:
+            cursor.execute(RECORD_MIGRATION_SQL, (
+                migration.id, migration.version, migration.name, migration.kind, migration.checksum,
+                int((time.perf_counter() - start) * 1000)
+            ))
+        conn.commit()
+
+        if migration.indexes:
+            # Fuera de transacción; si falla a mitad, la próxima ejecución retoma (IF NOT EXISTS)
+            build_indexes(migration.indexes, parallel, progress)
+            cursor.execute(RECORD_MIGRATION_SQL, (
+                migration.id, migration.version, migration.name, migration.kind, migration.checksum,
+                int((time.perf_counter() - start) * 1000)
+            ))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return time.perf_counter() - start
+
+
+def migrate(target=None, parallel=None, dry_run=False, progress=None, migrations=None, allow_blocking=None):
+    """Aplicar las migraciones pendientes en orden; retorna resumen"""
+    migrations = migrations or MIGRATIONS
+    if allow_blocking is None:
+        allow_blocking = MIGRATION_CONFIG['allow_blocking']
+    applied_ids = []
+    current = None
+    conn = None
+    try:
+        check_migrations(migrations)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        # Lock de sesión: sobrevive a los commits de cada migración
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (LOCK_KEY,))
+        cursor.execute(MIGRATIONS_TABLE_SQL)
+        conn.commit()
+        steps = plan(applied_migrations(cursor), migrations, target)
+        conn.commit()
+
+        mismatched = [migration.id for migration, state in steps if state == 'mismatch']
+        if mismatched:
+            raise MigrationError(
+                f"Migraciones ya aplicadas fueron modificadas: {', '.join(mismatched)} "
+                "(agrega una migración nueva en lugar de editarlas)"
+            )
+
+        pending = [migration for migration, state in steps if state in ('pending', 'changed')]
+        for migration in pending:
+            current = migration.id
+            blocking = False
+            if migration.blocking:
+                cursor.execute(migration.blocking)
+                blocking = bool(cursor.fetchone()[0])
+                conn.commit()
+            if dry_run:
+                if progress:
+                    progress(f"   📝 {migration.id}: {len(migration.statements)} sentencias, "
+                             f"{len(migration.indexes)} índices CONCURRENTLY"
+                             + (" (⚠️  bloquea escrituras: requiere --allow-blocking)" if blocking else ""))
+                continue
+            if blocking and not allow_blocking:
+                # Se detiene aquí: las siguientes migraciones pueden depender de esta
+                raise MigrationError(
+                    f"{migration.id} copia las filas existentes en una transacción bajo lock exclusivo "
+                    "y bloquea las escrituras del backend mientras dura: aplicarla en una ventana de "
+                    "mantenimiento con 'python migrations.py migrate --allow-blocking' "
+                    "(o MIGRATIONS_ALLOW_BLOCKING=true)"
+                )
+            if progress:
+                progress(f"   ⏳ {migration.id}...")
+            seconds = apply_migration(conn, migration, parallel, progress)
+            applied_ids.append(migration.id)
+            if progress:
+                progress(f"   ✅ {migration.id} ({seconds:.2f}s)")
+        current = None
+
+        cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+        return {
+            'success': True,
+            'applied': applied_ids,
+            'pending': [migration.id for migration in pending] if dry_run else [],
+            'up_to_date': not pending
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'applied': applied_ids,
+            'migration': current,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }
+    finally:
+        # Cerrar la conexión libera el advisory lock si hubo error
+        if conn is not None:
+            conn.close()
+
+
+# ============================================
+# CLI
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Migraciones del esquema de la base de datos')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Estado de cada migración')
+    migrate_parser = sub.add_parser('migrate', help='Aplicar las migraciones pendientes')
+    migrate_parser.add_argument('--target', type=int, help='Aplicar hasta esta versión (inclusive)')
+    migrate_parser.add_argument('--parallel', type=int, help='Índices en paralelo (tablas distintas)')
+    migrate_parser.add_argument('--dry-run', action='store_true', help='Mostrar el plan sin aplicar')
+    migrate_parser.add_argument('--allow-blocking', action='store_true', default=None,
+                                help='Aplicar también migraciones que bloquean escrituras (ventana de mantenimiento)')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        result = status()
+        if not result['success']:
+            print(f"❌ Error: {result['error']}")
+            sys.exit(1)
+        icons = {'applied': '✅', 'pending': '⏳', 'changed': '🔄', 'mismatch': '❌'}
+        print("📋 Migraciones:")
+        for item in result['migrations']:
+            applied_at = f"  ({item['applied_at']}, {item['duration_ms']} ms)" if item['applied_at'] else ''
+            print(f"   {icons[item['state']]} {item['id']:<30} {item['state']}{applied_at}")
+        for migration_id in result['unknown']:
+            print(f"   ⚠️  {migration_id:<30} aplicada pero no está en el código")
+        return
+
+    print("🧱 Aplicando migraciones..." if not args.dry_run else "📝 Plan de migraciones (--dry-run):")
+    result = migrate(args.target, args.parallel, args.dry_run, progress=print, allow_blocking=args.allow_blocking)
+    if not result['success']:
+        print(f"❌ Error en {result['migration'] or 'migraciones'}: {result['error_type']}: {result['error']}")
+        sys.exit(1)
+    if result['up_to_date']:
+        print("✅ El esquema ya está al día")
+    elif not args.dry_run:
+        print(f"✅ {len(result['applied'])} migraciones aplicadas")
+
+
+if __name__ == '__main__':
+    main()
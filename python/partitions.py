@@ -0,0 +1,345 @@
+"""
+Particionado mensual por rango de user_activities y analytics
+Crea las particiones de los próximos meses, mueve a su mes las filas que cayeron en la
+partición DEFAULT y aplica la retención: DETACH (al schema de archivo) o DROP de meses
+completos, una operación de metadatos en lugar de un DELETE masivo
+Uso: python partitions.py [status | maintain | ensure --since 2024-01]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+from config import PARTITION_CONFIG
+from db_pool import get_pool
+
+# Tabla particionada -> columna de la clave de partición (lista cerrada: se interpola en SQL)
+PARTITIONED_TABLES = {
+    'user_activities': 'created_at',
+    'analytics': 'date_recorded'
+}
+
+PARTITIONS_SQL = """
+    SELECT c.relname, c.reltuples::bigint AS rows, pg_total_relation_size(c.oid) AS bytes
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+    ORDER BY c.relname
+"""
+
+
+def month_start(value):
+    """Primer día del mes de una fecha/datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    """user_activities + 2024-05 -> user_activities_p202405"""
+    return f"{table}_p{month:%Y%m}"
+
+
+def default_partition(table):
+    return f"{table}_default"
+
+
+def parse_month(name, table):
+    """Inverso de partition_name (None para la DEFAULT u otros nombres)"""
+    suffix = name[len(table) + 2:]
+    if not name.startswith(f"{table}_p") or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def parse_since(value):
+    """'2024-01' o '2024-01-15' -> primer día del mes"""
+    return month_start(datetime.strptime(value[:7], '%Y-%m'))
+
+
+class PartitionManager:
+    """Crea particiones futuras y aplica la retención de las tablas de eventos"""
+
+    def __init__(self, premake_months=None, retention_months=None, retention_mode=None):
+        self.premake_months = PARTITION_CONFIG['premake_months'] if premake_months is None else premake_months
+        self.retention_months = dict(PARTITION_CONFIG['retention_months'])
+        if retention_months:
+            self.retention_months.update(retention_months)
+        self.retention_mode = retention_mode or PARTITION_CONFIG['retention_mode']
+        if self.retention_mode not in ('detach', 'drop'):
+            raise ValueError(f"Modo de retención desconocido: {self.retention_mode} (usa detach o drop)")
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    # ============================================
+    # CONSULTA
+    # ============================================
+
+    @staticmethod
+    def partitions(cursor, table):
+        """[{'name', 'month', 'rows', 'bytes'}] de una tabla; [] si no está particionada"""
+        cursor.execute(PARTITIONS_SQL, (table,))
+        return [{'name': name, 'month': parse_month(name, table), 'rows': rows, 'bytes': size}
+                for name, rows, size in cursor.fetchall()]
+
+    def status(self):
+        """Particiones de cada tabla (filas estimadas por reltuples)"""
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    tables = {table: self.partitions(cursor, table) for table in PARTITIONED_TABLES}
+                finally:
+                    cursor.close()
+                    conn.commit()
+            return {'success': True, 'tables': tables}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
+
+    # ============================================
+    # CREACIÓN
+    # ============================================
+
+    def _begin(self, cursor, table):
+        """Serializar el DDL de una tabla entre procesos y no encolar escritores detrás de un lock"""
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"partitions:{table}",))
+        cursor.execute("SET LOCAL lock_timeout = %s", (PARTITION_CONFIG['lock_timeout'],))
+
+    def create_partition(self, conn, table, month):
+        """Crear la partición de un mes; retorna filas movidas desde DEFAULT o None si ya existía"""
+        column = PARTITIONED_TABLES[table]
+        name = partition_name(table, month)
+        default = default_partition(table)
+        bounds = (month, add_months(month, 1))
+        cursor = conn.cursor()
+        try:
+            self._begin(cursor, table)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL", (name, default))
+            exists, has_default = cursor.fetchone()
+            if exists:
+                conn.commit()
+                return None
+
+            moved = 0
+            if has_default:
+                # Con filas del mes en DEFAULT, PostgreSQL rechaza la partición: sacarlas y reinsertarlas
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= %s AND {column} < %s)", bounds
+                )
+                if cursor.fetchone()[0]:
+                    cursor.execute(f"CREATE TEMP TABLE partition_moved (LIKE {table}) ON COMMIT DROP")
+                    cursor.execute(f"""
+                        WITH moved AS (
+                            DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *
+                        )
+                        INSERT INTO partition_moved SELECT * FROM moved
+                    """, bounds)
+                    moved = cursor.rowcount
+
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{bounds[0].isoformat()}') TO ('{bounds[1].isoformat()}')"
+            )
+            if moved:
+                cursor.execute(f"INSERT INTO {table} SELECT * FROM partition_moved")
+            conn.commit()
+            return moved
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def ensure_partitions(self, since=None, until=None, tables=None):
+        """Particiones desde since (default: mes actual) hasta premake_months en el futuro"""
+        current = month_start(date.today())
+        first = month_start(since) if since else current
+        last = month_start(until) if until else add_months(current, self.premake_months)
+        created = {}
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for table in tables or list(PARTITIONED_TABLES):
+                        column = PARTITIONED_TABLES[table]
+                        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+                        row = cursor.fetchone()
+                        if not row or row[0] != 'p':
+                            conn.commit()
+                            continue  # Sin la migración 0003 (tabla sin particionar)
+                        months = set()
+                        month = first
+                        while month <= last:
+                            months.add(month)
+                            month = add_months(month, 1)
+                        # Meses con filas en DEFAULT (outliers o datos de antes de particionar)
+                        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (default_partition(table),))
+                        if cursor.fetchone()[0]:
+                            cursor.execute(
+                                f"SELECT DISTINCT date_trunc('month', {column})::date "
+                                f"FROM {default_partition(table)} WHERE {column} IS NOT NULL"
+                            )
+                            months.update(row[0] for row in cursor.fetchall())
+                        conn.commit()
+
+                        created[table] = {}
+                        for month in sorted(months):
+                            moved = self.create_partition(conn, table, month)
+                            if moved is not None:
+                                created[table][partition_name(table, month)] = moved
+                finally:
+                    cursor.close()
+            return {'success': True, 'created': created}
+        except Exception as e:
+            return {
+                'success': False,
+                'created': created,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    # ============================================
+    # RETENCIÓN
+    # ============================================
+
+    def apply_retention(self, today=None):
+        """Sacar las particiones de meses anteriores a la ventana de retención de cada tabla"""
+        current = month_start(today or date.today())
+        archive = PARTITION_CONFIG['archive_schema']
+        removed = {}
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    for table, months in self.retention_months.items():
+                        if not months or table not in PARTITIONED_TABLES:
+                            continue
+                        cutoff = add_months(current, -months)
+                        old = [p['name'] for p in self.partitions(cursor, table)
+                               if p['month'] is not None and p['month'] < cutoff]
+                        conn.commit()
+                        removed[table] = []
+                        for name in old:
+                            self._begin(cursor, table)
+                            # Solo metadatos: no se leen ni borran filas
+                            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                            if self.retention_mode == 'drop':
+                                cursor.execute(f"DROP TABLE {name}")
+                            else:
+                                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {archive}")
+                                cursor.execute(f"ALTER TABLE {name} SET SCHEMA {archive}")
+                            conn.commit()
+                            removed[table].append(name)
+                finally:
+                    cursor.close()
+            return {'success': True, 'mode': self.retention_mode, 'removed': removed}
+        except Exception as e:
+            return {
+                'success': False,
+                'removed': removed,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+
+    # ============================================
+    # MANTENIMIENTO
+    # ============================================
+
+    def maintain(self):
+        """Particiones futuras + retención"""
+        ensured = self.ensure_partitions()
+        if not ensured['success']:
+            return ensured
+        retention = self.apply_retention()
+        if not retention['success']:
+            return retention
+        return {'success': True, 'created': ensured['created'], 'removed': retention['removed'],
+                'mode': retention['mode']}
+
+    # ============================================
+    # SCHEDULER
+    # ============================================
+
+    def start_scheduler(self):
+        """Iniciar el hilo de mantenimiento (idempotente; se reinicia tras un fork)
+        El DDL toma un lock ACCESS EXCLUSIVE sobre la tabla: nunca en el camino de un request"""
+        if not PARTITION_CONFIG['scheduler']:
+            return False
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread.is_alive():
+            return True
+        with self._start_lock:
+            if self._thread_pid == pid and self._thread.is_alive():
+                return True
+            # Los hilos no sobreviven al fork: el hijo arranca el suyo
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run_scheduler, name='partition-maintenance', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+        return True
+
+    def stop_scheduler(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout)
+
+    def _run_scheduler(self):
+        # Entre workers lo serializa el advisory lock de _begin; los meses que ya existen se saltean
+        while not self._stop.is_set():
+            self.maintain()
+            self._stop.wait(PARTITION_CONFIG['maintenance_interval'])
+
+def print_result(result):
+    for table, partitions in result.get('created', {}).items():
+        for name, moved in partitions.items():
+            print(f"   ✅ {name} creada" + (f" ({moved} filas movidas desde DEFAULT)" if moved else ""))
+    for table, names in result.get('removed', {}).items():
+        for name in names:
+            print(f"   🗄️  {name}: {'borrada' if result.get('mode') == 'drop' else 'desacoplada (archivo)'}")
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error_type')}: {result.get('error')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Particiones mensuales de user_activities y analytics')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Listar particiones')
+    sub.add_parser('maintain', help='Crear particiones futuras y aplicar la retención')
+    ensure_parser = sub.add_parser('ensure', help='Crear particiones desde un mes (carga de históricos)')
+    ensure_parser.add_argument('--since', required=True, type=parse_since, help='Mes inicial (AAAA-MM)')
+    args = parser.parse_args()
+
+    manager = PartitionManager()
+    if args.command == 'status':
+        result = manager.status()
+        if not result['success']:
+            print(f"❌ Error: {result['error']}")
+            sys.exit(1)
+        for table, partitions in result['tables'].items():
+            print(f"📅 {table}: {len(partitions)} particiones" if partitions else f"📅 {table}: sin particionar")
+            for partition in partitions:
+                print(f"   {partition['name']:<32} {max(partition['rows'], 0):>12} filas  "
+                      f"{partition['bytes'] / 1024 / 1024:>9.1f} MB")
+        return
+
+    if args.command == 'ensure':
+        print(f"📅 Creando particiones desde {args.since:%Y-%m}...")
+        result = manager.ensure_partitions(since=args.since)
+    else:
+        print("📅 Mantenimiento de particiones...")
+        result = manager.maintain()
+    print_result(result)
+    if not result['success']:
+        sys.exit(1)
+    print("✅ Particiones al día")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Cache de respuestas para los endpoints de analytics
+TTL por endpoint, límite LRU, single-flight e invalidación explícita
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from config import CACHE_CONFIG
+
+
+class _InFlight:
+    """Cómputo en curso para una clave (single-flight)"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Cache LRU thread-safe con TTL por endpoint"""
+
+    def __init__(self, max_entries=None, default_ttl=None, ttls=None, enabled=None):
+        self.max_entries = CACHE_CONFIG['max_entries'] if max_entries is None else max_entries
+        self.default_ttl = CACHE_CONFIG['default_ttl'] if default_ttl is None else default_ttl
+        self.ttls = dict(CACHE_CONFIG['ttls'] if ttls is None else ttls)
+        self.enabled = CACHE_CONFIG['enabled'] if enabled is None else enabled
+
+        self._entries = OrderedDict()  # key -> (expira, valor)
+        self._inflight = {}
+        self._inflight_async = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(endpoint, args=None):
+        """Clave = endpoint + argumentos ordenados"""
+        return (endpoint, tuple(sorted(args or ())))
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def get_or_compute(self, endpoint, args, compute, cacheable=None):
+        """Devolver (valor, hit). Solo un hilo calcula cada clave a la vez"""
+        ttl = self.ttl_for(endpoint)
+        if not self.enabled or ttl <= 0:
+            return compute(), False
+
+        key = self.make_key(endpoint, args)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self._counters['hits'] += 1
+                        return value, True
+                    del self._entries[key]
+
+                flight = self._inflight.get(key)
+                if flight is None:
+                    # Este hilo es el líder: calcula y publica el resultado
+                    flight = _InFlight()
+                    self._inflight[key] = flight
+                    generation = self._generation
+                    self._counters['misses'] += 1
+                    leader = True
+                else:
+                    leader = False
+
+            if not leader:
+                flight.event.wait()
+                if flight.error is None:
+                    with self._lock:
+                        self._counters['hits'] += 1
+                    return flight.value, True
+                # El líder falló: reintentar (otro hilo tomará el liderazgo)
+                continue
+
+            try:
+                value = compute()
+            except BaseException as e:
+                flight.error = e
+                with self._lock:
+                    self._inflight.pop(key, None)
+                flight.event.set()
+                raise
+
+            with self._lock:
+                self._inflight.pop(key, None)
+                # No guardar si se invalidó mientras se calculaba
+                if generation == self._generation and (cacheable is None or cacheable(value)):
+                    self._store_locked(key, value, ttl)
+            flight.value = value
+            flight.event.set()
+            return value, False
+
+    async def get_or_compute_async(self, endpoint, args, compute, cacheable=None):
+        """Versión asyncio de get_or_compute (compute es una corrutina)"""
+        import asyncio
+
+        ttl = self.ttl_for(endpoint)
+        if not self.enabled or ttl <= 0:
+            return await compute(), False
+
+        key = self.make_key(endpoint, args)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self._counters['hits'] += 1
+                        return value, True
+                    del self._entries[key]
+
+                future = self._inflight_async.get(key)
+                if future is None:
+                    future = asyncio.get_running_loop().create_future()
+                    self._inflight_async[key] = future
+                    generation = self._generation
+                    self._counters['misses'] += 1
+                    leader = True
+                else:
+                    leader = False
+
+            if not leader:
+                try:
+                    value = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise  # Se canceló este request, no el líder
+                    continue
+                except Exception:
+                    continue  # El líder falló: reintentar
+                with self._lock:
+                    self._counters['hits'] += 1
+                return value, True
+
+            try:
+                value = await compute()
+            except BaseException as e:
+                with self._lock:
+                    self._inflight_async.pop(key, None)
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    future.exception()  # Marcar como recuperada si nadie espera
+                raise
+
+            with self._lock:
+                self._inflight_async.pop(key, None)
+                if generation == self._generation and (cacheable is None or cacheable(value)):
+                    self._store_locked(key, value, ttl)
+            future.set_result(value)
+            return value, False
+
+    def invalidate(self, endpoints=None):
+        """Invalidar todo o solo los endpoints indicados; retorna entradas borradas"""
+        with self._lock:
+            self._generation += 1
+            if endpoints is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                endpoints = set(endpoints)
+                keys = [key for key in self._entries if key[0] in endpoints]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self._counters['invalidations'] += 1
+            return removed
+
+    def stats(self):
+        """Estadísticas del cache"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttls': dict(self.ttls),
+                **self._counters
+            }
+
+    def _store_locked(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+
+# ============================================
+# INTEGRACIÓN CON FLASK
+# ============================================
+
+def cached_endpoint(cache, endpoint):
+    """Decorador de rutas Flask: cachea respuestas 200 y agrega X-Cache"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response, request
+
+            def compute():
+                response = make_response(view(*args, **kwargs))
+                return (response.get_data(), response.status_code,
+                        [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length'])
+
+            value, hit = cache.get_or_compute(
+                endpoint,
+                request.args.items(multi=True),
+                compute,
+                cacheable=lambda value: value[1] == 200
+            )
+            body, status, headers = value
+            response = make_response(body, status, headers)
+            response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_endpoint_async(cache, endpoint):
+    """Decorador de rutas Quart (modo async): igual que cached_endpoint"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            from quart import make_response, request
+
+            async def compute():
+                response = await make_response(await view(*args, **kwargs))
+                return (await response.get_data(), response.status_code,
+                        [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length'])
+
+            value, hit = await cache.get_or_compute_async(
+                endpoint,
+                request.args.items(multi=True),
+                compute,
+                cacheable=lambda value: value[1] == 200
+            )
+            body, status, headers = value
+            response = await make_response(body, status, headers)
+            response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+"""
+Servidor de producción para el servicio de analytics
+Gunicorn pre-fork (varios workers con threads) configurado desde SERVER_CONFIG
+Uso: python serve.py [--workers N] [--threads N] [--pidfile archivo]
+Recarga sin cortes: kill -HUP $(cat <pidfile>) (los workers nuevos importan el código actual;
+cambios de serve.py/config.py o de variables de entorno requieren reiniciar el master)
+"""
+import argparse
+import multiprocessing
+import sys
+
+from config import SERVER_CONFIG, print_config
+
+
+def default_workers():
+    """2 * CPUs + 1 (recomendación de gunicorn para cargas con I/O)"""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def build_options(workers=None, threads=None, pidfile=None):
+    """Opciones de gunicorn a partir de SERVER_CONFIG"""
+    workers = workers or SERVER_CONFIG['workers'] or default_workers()
+    threads = threads or SERVER_CONFIG['threads']
+    return {
+        'bind': f"{SERVER_CONFIG['host']}:{SERVER_CONFIG['port']}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'keepalive': SERVER_CONFIG['keepalive'],
+        'timeout': SERVER_CONFIG['timeout'],
+        'graceful_timeout': SERVER_CONFIG['graceful_timeout'],
+        'max_requests': SERVER_CONFIG['max_requests'],
+        'max_requests_jitter': SERVER_CONFIG['max_requests_jitter'],
+        'backlog': SERVER_CONFIG['backlog'],
+        'pidfile': pidfile,
+        # Sin preload: cada worker importa la app, así kill -HUP carga el código nuevo
+        # (con preload_app los workers se forkean del módulo ya importado en el master)
+        'preload_app': False,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'worker_exit': worker_exit
+    }
+
+
+def post_fork(server, worker):
+    """Cada worker abre sus propias conexiones después del fork"""
+    from db_pool import reset_pools_after_fork
+
+    reset_pools_after_fork()
+    server.log.info("Worker %s: pools de conexiones reiniciados", worker.pid)
+
+
+def worker_exit(server, worker):
+    """Escribir los eventos encolados y cerrar las conexiones del worker al terminar"""
+    from db_pool import close_pools
+    from ingestion import stop_all
+
+    stop_all()
+    close_pools()
+
+
+def run(workers=None, threads=None, pidfile=None):
+    """Iniciar gunicorn con la app Flask"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicorn no está instalado. Ejecuta: pip install gunicorn")
+        sys.exit(1)
+
+    class AnalyticsServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            # Se ejecuta en cada worker: el master nunca importa app (ni sus dependencias)
+            from app import app as flask_app
+            return flask_app
+
+    options = build_options(workers, threads, pidfile)
+    print("=" * 70)
+    print("🚀 Battle.net - Python Analytics Service (producción)")
+    print("=" * 70)
+    print()
+    print_config()
+    print()
+    print(f"🌐 Escuchando en: http://{options['bind']}")
+    print(f"⚙️  Workers: {options['workers']} x {options['threads']} threads ({options['worker_class']})")
+    print(f"   Keep-alive: {options['keepalive']}s, timeout: {options['timeout']}s")
+    print()
+    AnalyticsServer(options).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor de producción del servicio de analytics')
+    parser.add_argument('--workers', type=int, help='Procesos worker (default: SERVER_CONFIG o 2*CPUs+1)')
+    parser.add_argument('--threads', type=int, help='Threads por worker')
+    parser.add_argument('--pidfile', help='Archivo PID (para kill -HUP / recarga)')
+    args = parser.parse_args()
+    run(args.workers, args.threads, args.pidfile)
@@ -3,22 +3,9 @@ Script principal de setup - Versión mejorada y modular
 Útil para uso básico y avanzado
 """
 import sys
-import os
-
-# Fix encoding
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass
 
 from config import DB_CONFIG, DB_NAME, print_config, ENV_FILE
 from db_manager import DatabaseManager
-import bcrypt
 
 def main():
     """Función principal de setup"""
@@ -90,6 +77,16 @@ def main():
         if not verify_setup():
             print("   ⚠️  Advertencia: Verificación encontró problemas")
         
+        # Paso 6: Vistas materializadas (incluir al admin recién creado)
+        print()
+        print("🔄 Paso 6: Refrescando vistas materializadas...")
+        from materialized_views import MaterializedViews
+        views_result = MaterializedViews().refresh(force=True)
+        if views_result['success']:
+            print(f"   ✅ {len(views_result['views'])} vistas actualizadas")
+        else:
+            print(f"   ⚠️  Advertencia: {views_result.get('error')}")
+        
     except ImportError:
         print("   ⚠️  No se pudo importar funciones avanzadas")
         print("   Ejecuta: python db_setup_improved.py directamente")
@@ -0,0 +1,181 @@
+"""
+Registro de queries lentas - Fingerprint (parámetros normalizados), duración, filas y plan
+Guarda las últimas en un ring buffer en memoria o en un log rotativo (JSON por línea)
+Desactivado por defecto (SLOW_QUERY_ENABLED)
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from config import SLOW_QUERY_CONFIG
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+# E'...' admite comillas escapadas con barra invertida; en los strings normales la barra es literal
+_STRINGS = re.compile(r"(?<!\w)[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'", re.S)
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|\$\d+')
+_NUMBERS = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ROWS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_SPACES = re.compile(r'\s+')
+
+# Criterios de orden del top-N
+SLOW_QUERY_ORDERS = ('total_ms', 'max_ms', 'mean_ms', 'calls')
+
+# Solo se piden planes de las lecturas
+_READ_ONLY = ('select', 'with', 'values', 'table')
+# ...y solo se re-ejecutan con EXPLAIN ANALYZE las que no escriben ni bloquean filas: un WITH con
+# DELETE/UPDATE dispara triggers y avanza secuencias aunque se haga rollback; FOR UPDATE/SHARE toma locks
+_WRITES = re.compile(r'\b(insert|update|delete|merge)\b|\bfor (key )?share\b')
+
+
+def fingerprint(query):
+    """SQL normalizado: literales y parámetros -> ?, listas colapsadas, minúsculas"""
+    text = _COMMENTS.sub(' ', query)
+    text = _STRINGS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _LISTS.sub('(?)', text)
+    text = _ROWS.sub('(?)', text)
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def can_analyze(normalized):
+    """True si EXPLAIN ANALYZE puede re-ejecutar la query sin efectos (lectura sin escrituras ni locks)"""
+    return normalized.lstrip('( ').startswith(_READ_ONLY) and not _WRITES.search(normalized)
+
+
+def fingerprint_id(normalized):
+    return hashlib.md5(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class SlowQueryLog:
+    """Registra queries que superan el umbral y agrega estadísticas por fingerprint"""
+
+    def __init__(self, enabled=None, threshold_ms=None, explain=None, sink=None,
+                 ring_size=None, log_file=None):
+        config = SLOW_QUERY_CONFIG
+        self.enabled = config['enabled'] if enabled is None else enabled
+        self.threshold = (config['threshold_ms'] if threshold_ms is None else threshold_ms) / 1000.0
+        self.explain = config['explain'] if explain is None else explain
+        self.sink = config['sink'] if sink is None else sink
+        self.log_file = config['log_file'] if log_file is None else log_file
+        self.recent = deque(maxlen=config['ring_size'] if ring_size is None else ring_size)
+        self._stats = {}  # fingerprint_id -> agregados
+        self._explained_at = {}  # fingerprint_id -> último EXPLAIN (monotonic)
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def record(self, query, duration, rows=None, params=None, conn=None):
+        """Registrar si duration (segundos) supera el umbral; conn permite EXPLAIN"""
+        if duration < self.threshold:
+            return None
+        sql = query if isinstance(query, str) else query.decode('utf-8', 'replace')
+        normalized = fingerprint(sql)
+        key = fingerprint_id(normalized)
+        duration_ms = duration * 1000
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'fingerprint_id': key,
+            'fingerprint': normalized,
+            'duration_ms': round(duration_ms, 3),
+            'rows': rows,
+            'query': sql.strip()[:2000]
+        }
+        if conn is not None and self._should_explain(key, normalized):
+            entry['plan'] = self._explain(conn, sql, params, analyze=can_analyze(normalized))
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= SLOW_QUERY_CONFIG['max_fingerprints']:
+                    # Descartar el fingerprint con menos tiempo acumulado
+                    del self._stats[min(self._stats, key=lambda k: self._stats[k]['total_ms'])]
+                stats = self._stats[key] = {
+                    'fingerprint_id': key, 'fingerprint': normalized, 'calls': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'last_seen': None, 'plan': None
+                }
+            stats['calls'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['rows'] += rows or 0
+            stats['last_seen'] = entry['timestamp']
+            if entry.get('plan') is not None:
+                stats['plan'] = entry['plan']
+            if self.sink == 'memory':
+                self.recent.append(entry)
+
+        if self.sink == 'file':
+            self._file_logger().info(json.dumps(entry, default=str, ensure_ascii=False))
+        return entry
+
+    def top(self, limit=10, order_by='total_ms'):
+        """Top-N fingerprints por tiempo total (o max_ms / calls)"""
+        with self._lock:
+            items = [dict(stats) for stats in self._stats.values()]
+        for stats in items:
+            stats['mean_ms'] = round(stats['total_ms'] / stats['calls'], 3)
+            stats['total_ms'] = round(stats['total_ms'], 3)
+            stats['max_ms'] = round(stats['max_ms'], 3)
+        items.sort(key=lambda stats: stats[order_by], reverse=True)
+        return items[:limit]
+
+    def recent_entries(self, limit=50):
+        with self._lock:
+            return list(self.recent)[-limit:][::-1]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._explained_at.clear()
+            self.recent.clear()
+
+    def _should_explain(self, key, normalized):
+        """Un EXPLAIN por fingerprint cada explain_interval (ANALYZE re-ejecuta la query: ver can_analyze)"""
+        if not self.explain or not normalized.lstrip('( ').startswith(_READ_ONLY):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(key)
+            if last is not None and now - last < SLOW_QUERY_CONFIG['explain_interval']:
+                return False
+            self._explained_at[key] = now
+        return True
+
+    def _explain(self, conn, sql, params, analyze=True):
+        """Plan con EXPLAIN (ANALYZE, BUFFERS), o solo estimado sin ejecutar, en una transacción que se descarta"""
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+            plan = cursor.fetchone()[0]
+            return plan if not isinstance(plan, str) else json.loads(plan)
+        except Exception as e:
+            return {'error': str(e), 'error_type': type(e).__name__}
+        finally:
+            cursor.close()
+            conn.rollback()
+
+    def _file_logger(self):
+        if self._logger is None:
+            import logging
+            from logging.handlers import RotatingFileHandler
+
+            logger = logging.getLogger('slow_queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if not logger.handlers:
+                logger.addHandler(RotatingFileHandler(
+                    self.log_file,
+                    maxBytes=SLOW_QUERY_CONFIG['max_bytes'],
+                    backupCount=SLOW_QUERY_CONFIG['backup_count'],
+                    encoding='utf-8'
+                ))
+            self._logger = logger
+        return self._logger
+
+
+slow_queries = SlowQueryLog()
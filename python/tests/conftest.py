@@ -0,0 +1,8 @@
+"""
+Tests sin base de datos: se importan los módulos del servicio desde python/
+Uso (desde python/): python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+"""
+HyperLogLog de active_users.py: estimación dentro del error declarado y fusión de sketches
+"""
+import numpy as np
+import pytest
+
+from active_users import add_users, estimate, registers_array, relative_error
+
+
+def sketch(ids, precision):
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    add_users(registers, 0, np.asarray(ids, dtype=np.int64), precision)
+    return registers
+
+
+@pytest.mark.parametrize('precision', [10, 12, 14])
+@pytest.mark.parametrize('count', [10, 100, 1000, 10000, 100000, 1000000])
+def test_estimate_within_relative_error(precision, count):
+    # relative_error es al 95%: sobre 20 conjuntos disjuntos casi todos caen dentro y sin sesgo
+    errors = np.array([
+        estimate(sketch(np.arange(1, count + 1) + k * 10 ** 7, precision)) / count - 1
+        for k in range(20)
+    ])
+    assert np.mean(np.abs(errors) <= relative_error(precision)) >= 0.85
+    assert abs(errors.mean()) <= relative_error(precision) / 2
+
+
+def test_estimate_with_non_sequential_ids():
+    ids = np.random.default_rng(7).choice(2 ** 31 - 1, size=50000, replace=False) + 1
+    error = abs(estimate(sketch(ids, 12)) - 50000) / 50000
+    assert error <= relative_error(12)
+
+
+def test_empty_sketch_is_zero():
+    assert estimate(np.zeros(1 << 12, dtype=np.uint8)) == 0
+
+
+def test_duplicates_do_not_count():
+    ids = np.arange(1, 5001)
+    assert np.array_equal(sketch(np.concatenate([ids, ids, ids[:100]]), 12), sketch(ids, 12))
+
+
+def test_merge_equals_union():
+    # Ventana de varios días = máximo elemento a elemento de los sketches diarios
+    monday, tuesday = np.arange(1, 30001), np.arange(20001, 60001)
+    merged = np.maximum(sketch(monday, 12), sketch(tuesday, 12))
+    assert np.array_equal(merged, sketch(np.union1d(monday, tuesday), 12))
+    assert abs(estimate(merged) - 60000) / 60000 <= relative_error(12)
+
+
+def test_offsets_fill_one_sketch_per_day():
+    precision = 10
+    registers = np.zeros(2 << precision, dtype=np.uint8)
+    ids = np.arange(1, 2001)
+    days = np.where(ids <= 500, 0, 1)
+    add_users(registers, days * (1 << precision), ids, precision)
+    first, second = registers.reshape(2, -1)
+    assert np.array_equal(first, sketch(ids[:500], precision))
+    assert np.array_equal(second, sketch(ids[500:], precision))
+
+
+def test_registers_round_trip_bytes():
+    registers = sketch(np.arange(1, 1001), 10)
+    assert np.array_equal(registers_array(registers.tobytes()), registers)
+    assert np.array_equal(registers_array(memoryview(registers.tobytes())), registers)
@@ -0,0 +1,131 @@
+"""
+Fingerprints de slow_query_log.py: literales, parámetros y listas IN normalizados
+"""
+import pytest
+
+from slow_query_log import SlowQueryLog, can_analyze, fingerprint, fingerprint_id
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT * FROM users WHERE id = 42", "select * from users where id = ?"),
+    ("SELECT * FROM users WHERE id = -3", "select * from users where id = ?"),
+    ("SELECT * FROM users WHERE score > 1.5", "select * from users where score > ?"),
+    ("SELECT * FROM users WHERE email = 'a@b.c'", "select * from users where email = ?"),
+    ("SELECT * FROM users WHERE name = 'O''Brien'", "select * from users where name = ?"),
+    ("SELECT * FROM users WHERE name = E'O\\'Brien' AND id = 1", "select * from users where name = ? and id = ?"),
+    ("SELECT * FROM users WHERE path = 'C:\\' AND id = 1", "select * from users where path = ? and id = ?"),
+    ("SELECT * FROM users WHERE id = %s", "select * from users where id = ?"),
+    ("SELECT * FROM users WHERE id = %(user_id)s", "select * from users where id = ?"),
+    ("SELECT * FROM users WHERE id = $1", "select * from users where id = ?"),
+])
+def test_literals_and_parameters(query, expected):
+    assert fingerprint(query) == expected
+
+
+def test_identifiers_with_digits_are_kept():
+    assert fingerprint("SELECT t2.col1 FROM table_2 t2 WHERE x-1 > 0") == \
+        "select t2.col1 from table_2 t2 where x-? > ?"
+
+
+@pytest.mark.parametrize('in_list', [
+    "(1)",
+    "(1, 2, 3)",
+    "( 10,20 , 30,40 )",
+    "('a', 'b')",
+    "(%s, %s, %s, %s)",
+    "($1, $2)",
+])
+def test_in_lists_collapse(in_list):
+    assert fingerprint(f"SELECT * FROM users WHERE id IN {in_list}") == "select * from users where id in (?)"
+
+
+def test_multi_row_values_collapse():
+    one = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x')")
+    many = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'), (3, 'z')")
+    assert one == many == "insert into t (a, b) values (?)"
+
+
+def test_comments_case_and_whitespace():
+    query = """
+        SELECT *   FROM users -- por id
+        /* varias
+           líneas */ WHERE   id = 7
+    """
+    assert fingerprint(query) == "select * from users where id = ?"
+
+
+def test_same_shape_same_id():
+    first = fingerprint("SELECT * FROM users WHERE id IN (1, 2) AND role = 'admin'")
+    second = fingerprint("select * from users where id in (%s, %s, %s) and role = %s")
+    assert fingerprint_id(first) == fingerprint_id(second)
+    assert fingerprint_id(first) != fingerprint_id(fingerprint("SELECT * FROM games WHERE id IN (1, 2)"))
+
+
+def test_record_groups_by_fingerprint():
+    log = SlowQueryLog(enabled=True, threshold_ms=10, explain=False, sink='memory', ring_size=10)
+    assert log.record("SELECT * FROM users WHERE id = 1", 0.005) is None  # Bajo el umbral
+    log.record("SELECT * FROM users WHERE id = 1", 0.020, rows=1)
+    log.record("SELECT * FROM users WHERE id = 2", 0.040, rows=1)
+    log.record("SELECT * FROM games", 0.015, rows=500)
+
+    top = log.top()
+    assert [stats['fingerprint'] for stats in top] == ["select * from users where id = ?", "select * from games"]
+    assert top[0]['calls'] == 2
+    assert top[0]['total_ms'] == pytest.approx(60.0)
+    assert top[0]['max_ms'] == pytest.approx(40.0)
+    assert top[0]['mean_ms'] == pytest.approx(30.0)
+    assert len(log.recent_entries()) == 3
+
+
+@pytest.mark.parametrize('query, analyze', [
+    ("SELECT * FROM users WHERE id = 1", True),
+    ("(SELECT 1) UNION (SELECT 2)", True),
+    ("WITH recent AS (SELECT * FROM games) SELECT count(*) FROM recent", True),
+    ("SELECT updated_at, deleted_flag FROM users WHERE note = 'delete me'", True),
+    ("WITH d AS (DELETE FROM user_activities WHERE id < 10 RETURNING *) SELECT count(*) FROM d", False),
+    ("WITH u AS (UPDATE users SET role = 'user' RETURNING id) SELECT * FROM u", False),
+    ("with i as (insert into analytics (metric_name) values ('x') returning id) select id from i", False),
+    ("SELECT * FROM users WHERE id = 1 FOR UPDATE", False),
+    ("SELECT * FROM users WHERE id = 1 FOR KEY SHARE", False),
+    ("DELETE FROM users WHERE id = 1", False),
+])
+def test_can_analyze(query, analyze):
+    assert can_analyze(fingerprint(query)) is analyze
+
+
+class ExplainConnection:
+    """Conexión que registra los EXPLAIN y responde un plan vacío"""
+
+    def __init__(self):
+        self.executed = []
+        self.rolled_back = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                connection.executed.append(sql)
+
+            def fetchone(self):
+                return ([{'Plan': {}}],)
+
+            def close(self):
+                pass
+        return Cursor()
+
+    def rollback(self):
+        self.rolled_back += 1
+
+
+def test_writing_cte_is_explained_without_analyze():
+    log = SlowQueryLog(enabled=True, threshold_ms=0, explain=True, sink='memory')
+    conn = ExplainConnection()
+    log.record("SELECT * FROM users WHERE id = %s", 1.0, params=(1,), conn=conn)
+    log.record("WITH d AS (DELETE FROM users WHERE id = %s RETURNING *) SELECT * FROM d", 1.0, params=(1,), conn=conn)
+    log.record("UPDATE users SET role = 'user'", 1.0, conn=conn)  # No es lectura: sin plan
+    assert [sql.split(')')[0] for sql in conn.executed] == [
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON",
+        "EXPLAIN (FORMAT JSON",
+    ]
+    assert conn.rolled_back == 2
@@ -0,0 +1,179 @@
+"""
+Cursores de user_listing.py: --after retoma justo después de cualquier fila, también al pasar
+de las filas con created_at a las que no tienen (pool en memoria que entiende el SQL generado)
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+import user_listing
+from user_listing import USER_COLUMNS, format_after, iter_users, parse_after
+
+# Fragmento del WHERE -> (parámetros que consume, predicado sobre la fila)
+CONDITIONS = {
+    "role = ANY(%s)": (1, lambda row, roles: row['role'] in roles),
+    "is_active = %s": (1, lambda row, active: row['is_active'] == active),
+    "created_at >= %s": (1, lambda row, since: row['created_at'] is not None and row['created_at'] >= since),
+    "created_at < %s": (1, lambda row, until: row['created_at'] is not None and row['created_at'] < until),
+    "created_at IS NOT NULL": (0, lambda row: row['created_at'] is not None),
+    "created_at IS NULL": (0, lambda row: row['created_at'] is None),
+    "(created_at, id) < (%s, %s)": (2, lambda row, created_at, user_id: row['created_at'] is not None and
+                                    (row['created_at'], row['id']) < (created_at, user_id)),
+    "id < %s": (1, lambda row, user_id: row['id'] < user_id),
+}
+ORDERS = {
+    "created_at DESC, id DESC": lambda row: (row['created_at'], row['id']),
+    "id DESC": lambda row: row['id'],
+}
+QUERY = re.compile(r'WHERE (?P<where>.*?)\s+ORDER BY (?P<order>.*?)\s+LIMIT %s', re.S)
+
+
+class FakeCursor:
+    def __init__(self, users, queries):
+        self.users = users
+        self.queries = queries
+        self.itersize = None
+        self.rows = []
+
+    def execute(self, query, params):
+        match = QUERY.search(query)
+        params = list(params)
+        rows = self.users
+        for condition in match.group('where').split(' AND '):
+            count, predicate = CONDITIONS[condition]
+            args, params = params[:count], params[count:]
+            rows = [row for row in rows if predicate(row, *args)]
+        (limit,) = params
+        rows = sorted(rows, key=ORDERS[match.group('order')], reverse=True)[:limit]
+        self.queries.append(query)
+        assert len(self.queries) < 1000, 'La paginación no avanza'
+        self.rows = [tuple(row[column] for column in USER_COLUMNS) for row in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, users, queries):
+        self.users = users
+        self.queries = queries
+
+    def cursor(self, name=None):
+        return FakeCursor(self.users, self.queries)
+
+    def commit(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, users):
+        self.users = users
+        self.queries = []
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self.users, self.queries)
+
+
+def make_users():
+    start = datetime(2024, 5, 1, 10, 0, 0, 123456)
+    users = []
+    for user_id in range(1, 21):
+        if user_id % 5 == 0:
+            created_at = None  # Importados sin fecha
+        else:
+            # Varias filas comparten created_at: el desempate es el id
+            created_at = start + timedelta(minutes=user_id // 3)
+        users.append({
+            'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+            'role': 'admin' if user_id % 4 == 0 else 'user', 'full_name': None,
+            'is_active': user_id % 7 != 0, 'created_at': created_at
+        })
+    return users
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool(make_users())
+    monkeypatch.setattr(user_listing, 'get_pool', lambda: pool)
+    return pool
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_order_dated_then_undated(pool):
+    rows = list(iter_users(page_size=3))
+    dated = [row for row in rows if row[-1] is not None]
+    assert rows[:len(dated)] == dated
+    assert [(row[-1], row[0]) for row in dated] == sorted(((row[-1], row[0]) for row in dated), reverse=True)
+    assert ids(rows[len(dated):]) == [20, 15, 10, 5]
+    assert sorted(ids(rows)) == list(range(1, 21))
+
+
+@pytest.mark.parametrize('page_size', [1, 3, 7, 100])
+def test_after_round_trip_from_every_row(pool, page_size):
+    rows = list(iter_users(page_size=page_size))
+    for position, row in enumerate(rows):
+        token = format_after(row[-1], row[0])
+        assert parse_after(token) == (row[-1], row[0])
+        resumed = list(iter_users(after=parse_after(token), page_size=page_size))
+        assert ids(resumed) == ids(rows[position + 1:]), token
+
+
+def test_after_last_dated_row_hands_off_to_undated(pool):
+    rows = list(iter_users())
+    last_dated = [row for row in rows if row[-1] is not None][-1]
+    token = format_after(last_dated[-1], last_dated[0])
+    assert ids(iter_users(after=parse_after(token))) == [20, 15, 10, 5]
+
+
+def test_after_undated_row_stays_undated(pool):
+    assert parse_after('null,15') == (None, 15)
+    assert ids(iter_users(after=parse_after('null,15'))) == [10, 5]
+
+
+@pytest.mark.parametrize('limit', range(1, 22))
+def test_limit_pages_across_handoff(pool, limit):
+    rows = list(iter_users(page_size=2))
+    assert ids(iter_users(limit=limit, page_size=2)) == ids(rows[:limit])
+
+
+def test_resume_in_chunks_covers_everything_once(pool):
+    seen, after = [], None
+    while True:
+        chunk = list(iter_users(after=after, limit=4, page_size=3))
+        if not chunk:
+            break
+        seen += ids(chunk)
+        after = parse_after(format_after(chunk[-1][-1], chunk[-1][0]))
+    assert seen == ids(iter_users())
+
+
+def test_filters_apply_to_every_page(pool):
+    rows = list(iter_users(role='admin', active=True, page_size=1))
+    assert rows and all(row[3] == 'admin' and row[5] for row in rows)
+    assert ids(rows) == [row['id'] for row in sorted(
+        (user for user in pool.users if user['role'] == 'admin' and user['is_active']),
+        key=lambda user: (user['created_at'] is not None, user['created_at'] or datetime.min, user['id']),
+        reverse=True
+    )]
+
+
+def test_date_range_skips_undated(pool):
+    since = datetime(2024, 5, 1, 10, 2)
+    rows = list(iter_users(since=since, page_size=2))
+    assert rows and all(row[-1] is not None and row[-1] >= since for row in rows)
+    assert not any('created_at IS NULL' in query for query in pool.queries)
+
+
+@pytest.mark.parametrize('token', ['', '42', 'abc,x', ',42', '2024-05-01T10:00:00,', 'null,-1', 'mañana,3'])
+def test_parse_after_rejects_invalid(token):
+    with pytest.raises(ValueError):
+        parse_after(token)
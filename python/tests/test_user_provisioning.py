@@ -0,0 +1,100 @@
+"""
+Alta masiva de user_provisioning.py: is_active del CSV, deduplicado del lote y --update
+Los tests de escritura usan la base configurada (DB_HOST, DB_NAME...) y se omiten si no hay PostgreSQL
+"""
+import uuid
+
+import pytest
+
+from user_provisioning import _dedupe, parse_active, provision_users, validate_user
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('', True), (None, True), ('true', True), ('SI', True), ('1', True),
+    ('false', False), ('No', False), ('0', False), (False, False),
+])
+def test_parse_active(value, expected):
+    assert parse_active(value) is expected
+
+
+def test_parse_active_empty_default():
+    assert parse_active('', None) is None
+    with pytest.raises(ValueError):
+        parse_active('quizás')
+
+
+def test_validate_user_rejects_invalid_active():
+    user = {'username': 'ana', 'email': 'ana@example.com', 'password': 'x', 'is_active': 'quizás'}
+    assert 'is_active' in validate_user(user)
+
+
+def test_dedupe_update_keeps_last_row_per_username():
+    items = [
+        (2, ('ana', 'ana@example.com', 'h', 'user', None, True)),
+        (3, ('ana', 'ana2@example.com', 'h', 'user', None, False)),
+        (4, ('bob', 'ana2@example.com', 'h', 'user', None, None)),
+    ]
+    unique, duplicates = _dedupe(items, update=True)
+    assert unique == [items[1]]
+    assert duplicates == [(4, 'bob', "'email' repetido en la línea 3")]
+
+
+# ============================================
+# ESCRITURA (PostgreSQL)
+# ============================================
+
+@pytest.fixture
+def db():
+    try:
+        from config import get_db_connection
+        conn = get_db_connection()
+    except Exception as e:
+        pytest.skip(f"Sin PostgreSQL: {e}")
+    prefix = f"test_{uuid.uuid4().hex[:8]}_"
+    cursor = conn.cursor()
+
+    def users():
+        cursor.execute("SELECT username, email, role, is_active FROM users WHERE username LIKE %s",
+                       (prefix + '%',))
+        rows = {row[0][len(prefix):]: row[1:] for row in cursor.fetchall()}
+        conn.commit()
+        return rows
+
+    yield prefix, users
+    cursor.execute("DELETE FROM users WHERE username LIKE %s", (prefix + '%',))
+    conn.commit()
+    conn.close()
+
+
+def provision(prefix, rows, update=False):
+    users = [{'username': prefix + username, 'email': f"{prefix}{username}@example.com", 'password': 'x',
+              'role': role, 'is_active': active} for username, role, active in rows]
+    result = provision_users(users, rounds=4, workers=1, update=update)
+    assert result['success'], result
+    return result
+
+
+def test_update_applies_is_active(db):
+    prefix, users = db
+    provision(prefix, [('ana', 'user', ''), ('bob', 'user', 'false'), ('eva', 'user', 'true')])
+    assert {name: row[2] for name, row in users().items()} == {'ana': True, 'bob': False, 'eva': True}
+
+    # false desactiva, true reactiva, vacío conserva; el resto de los campos se sobrescribe
+    result = provision(prefix, [('ana', 'admin', 'false'), ('bob', 'user', 'true'), ('eva', 'user', ''),
+                                ('leo', 'user', '')], update=True)
+    assert result['written'] == 4
+    rows = users()
+    assert {name: row[2] for name, row in rows.items()} == {'ana': False, 'bob': True, 'eva': True, 'leo': True}
+    assert rows['ana'][1] == 'admin'
+
+    provision(prefix, [('ana', 'admin', ''), ('bob', 'user', 'no')], update=True)
+    assert {name: row[2] for name, row in users().items()} == {'ana': False, 'bob': False, 'eva': True, 'leo': True}
+
+
+def test_without_update_existing_users_are_skipped(db):
+    prefix, users = db
+    provision(prefix, [('ana', 'user', 'true')])
+    result = provision(prefix, [('ana', 'admin', 'false'), ('bob', 'user', '')])
+    assert (result['written'], result['skipped']) == (1, 1)
+    assert users() == {'ana': (f"{prefix}ana@example.com", 'user', True),
+                       'bob': (f"{prefix}bob@example.com", 'user', True)}
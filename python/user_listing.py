@@ -0,0 +1,267 @@
+"""
+Listado de usuarios en streaming - Paginación keyset sobre (created_at, id)
+Cada página se lee con un cursor del servidor y se escribe en CSV, NDJSON o texto
+Verificación en lote: muchos emails/usernames por query (= ANY) en una sola conexión
+Uso: python verificar_registro.py --list [--role admin] [--format ndjson] [--limit N] [--after TOKEN]
+     python verificar_registro.py --batch ids.txt  (o - para stdin)
+"""
+import csv
+import itertools
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from config import ANALYTICS_CONFIG
+from db_pool import get_pool
+
+USER_COLUMNS = ('id', 'username', 'email', 'role', 'full_name', 'is_active', 'created_at')
+FORMATS = ('text', 'csv', 'ndjson')
+
+# Más recientes primero; las filas sin created_at van al final, por id
+LIST_USERS_SQL = """
+    SELECT {columns}
+    FROM users
+    WHERE {where}
+    ORDER BY {order}
+    LIMIT %s
+"""
+
+PAGE_SIZE = 10000
+
+# Verificación en lote: emails y usernames de un bloque en una sola query
+VERIFY_USERS_SQL = """
+    SELECT {columns}
+    FROM users
+    WHERE email = ANY(%s) OR username = ANY(%s)
+"""
+
+VERIFY_CHUNK_SIZE = 1000
+
+
+def parse_after(token):
+    """'2024-05-01T10:00:00,42' (o 'null,42') -> (created_at, id)"""
+    created_at, _, user_id = token.rpartition(',')
+    if not created_at or not user_id.isdigit():
+        raise ValueError(f"Cursor inválido: {token!r} (formato: <created_at ISO>,<id>)")
+    return (None if created_at == 'null' else datetime.fromisoformat(created_at)), int(user_id)
+
+
+def format_after(created_at, user_id):
+    """Inverso de parse_after: token para continuar con --after"""
+    return f"{created_at.isoformat() if created_at else 'null'},{user_id}"
+
+
+def build_filters(role=None, active=None, since=None, until=None):
+    """Condiciones y parámetros comunes a todas las páginas"""
+    conditions, params = [], []
+    if role:
+        conditions.append("role = ANY(%s)")
+        params.append(list(role) if isinstance(role, (list, tuple)) else [role])
+    if active is not None:
+        conditions.append("is_active = %s")
+        params.append(active)
+    if since:
+        conditions.append("created_at >= %s")
+        params.append(since)
+    if until:
+        conditions.append("created_at < %s")
+        params.append(until)
+    return conditions, params
+
+
+def iter_users(role=None, active=None, since=None, until=None, after=None, limit=None,
+               page_size=PAGE_SIZE, itersize=None):
+    """Generar tuplas (USER_COLUMNS) en orden created_at DESC, id DESC sin cargar todo"""
+    itersize = itersize or min(page_size, ANALYTICS_CONFIG['itersize'])
+    conditions, params = build_filters(role, active, since, until)
+    after_created, after_id = after if after else (None, None)
+    # Fase 1: filas con created_at (usa el índice (created_at, id)); fase 2: created_at NULL
+    phases = ['dated', 'undated'] if not (since or until) else ['dated']
+    if after and after_created is None:
+        phases = ['undated']
+    remaining = limit
+
+    with get_pool().connection() as conn:
+        for phase in phases:
+            while remaining is None or remaining > 0:
+                where = list(conditions)
+                page_params = list(params)
+                if phase == 'dated':
+                    where.append("created_at IS NOT NULL")
+                    if after_created is not None:
+                        where.append("(created_at, id) < (%s, %s)")
+                        page_params += [after_created, after_id]
+                    order = "created_at DESC, id DESC"
+                else:
+                    where.append("created_at IS NULL")
+                    if after_id is not None and after_created is None:
+                        where.append("id < %s")
+                        page_params.append(after_id)
+                    order = "id DESC"
+
+                size = page_size if remaining is None else min(page_size, remaining)
+                query = LIST_USERS_SQL.format(columns=', '.join(USER_COLUMNS),
+                                              where=' AND '.join(where), order=order)
+                count = 0
+                last = None
+                cursor = conn.cursor(name=f"users_{uuid.uuid4().hex}")
+                cursor.itersize = itersize
+                try:
+                    cursor.execute(query, page_params + [size])
+                    for last in cursor:
+                        count += 1
+                        yield last
+                finally:
+                    cursor.close()
+                    conn.commit()  # Una transacción corta por página
+
+                if remaining is not None:
+                    remaining -= count
+                if count < size:
+                    break
+                after_created, after_id = last[-1], last[0]
+            if remaining is not None and remaining <= 0:
+                return
+            # La fase 2 empieza desde el principio de las filas sin fecha
+            after_created, after_id = None, None
+
+
+# ============================================
+# SALIDA
+# ============================================
+
+def open_output(path=None):
+    """Stream de texto con buffer grande (stdout si no hay archivo)"""
+    if path and path != '-':
+        return open(path, 'w', encoding='utf-8', newline='', buffering=1 << 20)
+    return open(sys.stdout.fileno(), 'w', encoding='utf-8', newline='', buffering=1 << 20, closefd=False)
+
+
+def _serialize(row):
+    return [value.isoformat() if isinstance(value, datetime) else value for value in row]
+
+
+def write_users(rows, out, fmt='ndjson'):
+    """Escribir filas en out; retorna (cantidad, última fila)"""
+    count = 0
+    last = None
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(USER_COLUMNS)
+        for last in rows:
+            writer.writerow(_serialize(last))
+            count += 1
+    elif fmt == 'ndjson':
+        for last in rows:
+            out.write(json.dumps(dict(zip(USER_COLUMNS, _serialize(last))), ensure_ascii=False))
+            out.write('\n')
+            count += 1
+    else:
+        for last in rows:
+            user_id, username, email, role, full_name, is_active, created_at = last
+            status = '✅' if is_active else '❌'
+            line = (f"{user_id:>8}  {status}  {role or '':<9}  {username:<24}  {email:<36}  "
+                    f"{created_at.isoformat(' ', 'seconds') if created_at else 'N/A'}  {full_name or ''}")
+            out.write(line.rstrip() + '\n')
+            count += 1
+    return count, last
+
+
+def export_users(out, fmt='ndjson', limit=None, after=None, **filters):
+    """Listar usuarios a un stream; retorna resumen con el cursor para continuar"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt} (usa {', '.join(FORMATS)})")
+    start = time.perf_counter()
+    try:
+        count, last = write_users(iter_users(after=after, limit=limit, **filters), out, fmt)
+        out.flush()
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
+    return {
+        'success': True,
+        'written': count,
+        # Solo hay más páginas si se cortó por --limit
+        'next_after': format_after(last[-1], last[0]) if last and limit and count >= limit else None,
+        'seconds': time.perf_counter() - start
+    }
+
+
+# ============================================
+# VERIFICACIÓN EN LOTE
+# ============================================
+
+def read_identifiers(path):
+    """Emails/usernames, uno por línea, de un archivo o '-' (stdin); sin vacíos, # ni repetidos"""
+    if path == '-':
+        stream = open(sys.stdin.fileno(), encoding='utf-8-sig', closefd=False)
+    else:
+        stream = open(path, encoding='utf-8-sig')
+    seen = set()
+    with stream:
+        for line in stream:
+            identifier = line.strip()
+            if identifier and not identifier.startswith('#') and identifier not in seen:
+                seen.add(identifier)
+                yield identifier
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def verify_users(identifiers, chunk_size=VERIFY_CHUNK_SIZE):
+    """Generar (identificador, fila o None); un bloque = una query sobre la misma conexión"""
+    query = VERIFY_USERS_SQL.format(columns=', '.join(USER_COLUMNS))
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for chunk in _chunks(identifiers, chunk_size):
+                # Igual que la verificación individual: con '@' es email, si no username
+                emails = [identifier for identifier in chunk if '@' in identifier]
+                usernames = [identifier for identifier in chunk if '@' not in identifier]
+                cursor.execute(query, (emails, usernames))
+                by_email, by_username = {}, {}
+                for row in cursor.fetchall():
+                    by_username[row[1]] = row
+                    by_email[row[2]] = row
+                conn.commit()  # No dejar la transacción abierta mientras se lee la entrada
+                for identifier in chunk:
+                    yield identifier, (by_email if '@' in identifier else by_username).get(identifier)
+        finally:
+            cursor.close()
+
+
+def export_verification(identifiers, out, chunk_size=VERIFY_CHUNK_SIZE, missing_only=False):
+    """Escribir una línea NDJSON por identificador (found true/false); retorna resumen"""
+    start = time.perf_counter()
+    found = missing = 0
+    try:
+        for identifier, row in verify_users(identifiers, chunk_size):
+            if row is None:
+                missing += 1
+                record = {'input': identifier, 'found': False}
+            else:
+                found += 1
+                if missing_only:
+                    continue
+                record = {'input': identifier, 'found': True}
+                record.update(zip(USER_COLUMNS, _serialize(row)))
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write('\n')
+        out.flush()
+    except Exception as e:
+        return {
+            'success': False,
+            'found': found,
+            'missing': missing,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }
+    return {'success': True, 'found': found, 'missing': missing, 'seconds': time.perf_counter() - start}
@@ -0,0 +1,222 @@
+"""
+Alta masiva de usuarios
+Hashea contraseñas con bcrypt en un pool de procesos (uno por CPU) e inserta
+en lotes con INSERT ... ON CONFLICT mientras se hashea el lote siguiente
+Uso: python utils.py provision usuarios.csv [--rounds 10] [--workers N] [--update]
+"""
+import csv
+import multiprocessing
+import time
+
+from config import AUTH_CONFIG
+from db_pool import get_pool
+
+VALID_ROLES = ('admin', 'moderator', 'user')
+
+
+def hash_password(password, rounds=None):
+    """Hash bcrypt de una contraseña con el costo configurado"""
+    import bcrypt
+    rounds = rounds or AUTH_CONFIG['bcrypt_rounds']
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def parse_active(value, default=True):
+    """is_active del CSV -> bool (vacío = default); ValueError si no es un booleano"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 't', 'yes', 'y', 'si', 'sí'):
+        return True
+    if text in ('0', 'false', 'f', 'no', 'n'):
+        return False
+    raise ValueError(f"'is_active' debe ser true o false: {value}")
+
+
+def _hash_user(task):
+    """Worker: (línea, user, rounds) -> (línea, fila lista para insertar) (se ejecuta en otro proceso)
+    is_active vacío viaja como None: true para las cuentas nuevas, sin cambios para las existentes"""
+    line, user, rounds = task
+    return line, (user['username'], user['email'], hash_password(user['password'], rounds),
+                  user.get('role') or 'user', user.get('full_name'), parse_active(user.get('is_active'), None))
+
+
+def validate_user(user):
+    """Retorna un mensaje de error o None si el usuario es válido"""
+    for field in ('username', 'email', 'password'):
+        if not user.get(field):
+            return f"Falta '{field}'"
+    if len(user['username']) > 50:
+        return "'username' excede 50 caracteres"
+    if len(user['email']) > 100 or '@' not in user['email']:
+        return "'email' inválido"
+    if user.get('role') and user['role'] not in VALID_ROLES:
+        return f"Rol inválido: {user['role']}"
+    try:
+        parse_active(user.get('is_active'))
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def read_users_csv(path):
+    """Leer usuarios de un CSV con encabezado (username,email,password[,role,full_name])"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield {key: (value.strip() if value else value) for key, value in row.items() if key}
+
+
+def _batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _dedupe(items, update):
+    """(línea, fila) del lote sin duplicados; retorna (únicos, [(línea, username, error)])"""
+    if update:
+        # DO UPDATE no puede tocar la misma fila dos veces: gana la última del lote
+        items = list({row[0]: (line, row) for line, row in items}.values())
+    unique, duplicates, emails = [], [], {}
+    for line, row in items:
+        email = row[1]
+        if email in emails:
+            # Otro username con el mismo email: el UNIQUE de email rechazaría el lote entero
+            duplicates.append((line, row[0], f"'email' repetido en la línea {emails[email]}"))
+        else:
+            emails[email] = line
+            unique.append((line, row))
+    return unique, duplicates
+
+
+def _insert_batch(conn, rows, update):
+    """INSERT de un lote; retorna cuántas filas se insertaron/actualizaron"""
+    from psycopg2.extras import execute_values
+
+    if update:
+        conflict = """
+            ON CONFLICT (username) DO UPDATE SET
+                email = EXCLUDED.email, password = EXCLUDED.password, role = EXCLUDED.role,
+                full_name = EXCLUDED.full_name,
+                is_active = COALESCE(EXCLUDED.is_active, users.is_active), updated_at = CURRENT_TIMESTAMP
+        """
+    else:
+        conflict = "ON CONFLICT DO NOTHING"
+    cursor = conn.cursor()
+    try:
+        result = execute_values(cursor, f"""
+            INSERT INTO users (username, email, password, role, full_name, is_active)
+            VALUES %s
+            {conflict}
+            RETURNING id
+        """, rows, page_size=len(rows), fetch=True)
+        if any(row[5] is None for row in rows):
+            # is_active vacío en una cuenta nueva: el default de la columna (en la misma transacción)
+            cursor.execute("UPDATE users SET is_active = true WHERE id = ANY(%s) AND is_active IS NULL",
+                           ([row[0] for row in result],))
+        conn.commit()
+        return len(result)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _write_batch(conn, items, update, rejected):
+    """Insertar (línea, fila); si PostgreSQL rechaza el lote (email de otra cuenta, dato inválido),
+    partirlo hasta aislar las filas culpables, que se agregan a `rejected`. Retorna filas escritas"""
+    import psycopg2
+
+    try:
+        return _insert_batch(conn, [row for _, row in items], update)
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        if len(items) == 1:
+            line, row = items[0]
+            rejected.append((line, row[0], str(e).strip().splitlines()[0]))
+            return 0
+        middle = len(items) // 2
+        return (_write_batch(conn, items[:middle], update, rejected) +
+                _write_batch(conn, items[middle:], update, rejected))
+
+
+def provision_users(users, rounds=None, workers=None, batch_size=1000, update=False, progress=None):
+    """Hashear e insertar usuarios (iterable de dicts). Retorna resumen con errores por fila"""
+    rounds = rounds or AUTH_CONFIG['bcrypt_rounds']
+    workers = workers or AUTH_CONFIG['hash_workers'] or multiprocessing.cpu_count()
+    started = time.monotonic()
+    summary = {'processed': 0, 'written': 0, 'skipped': 0, 'invalid': 0, 'rejected': 0, 'errors': []}
+
+    def add_error(line, username, error):
+        if len(summary['errors']) < 100:
+            summary['errors'].append({'line': line, 'username': username, 'error': error})
+
+    def valid_users():
+        for line, user in enumerate(users, start=2):  # Línea 1 = encabezado del CSV
+            error = validate_user(user)
+            if error:
+                summary['invalid'] += 1
+                add_error(line, user.get('username'), error)
+            else:
+                yield (line, user, rounds)
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        with get_pool().connection() as conn:
+            def write(items):
+                unique, duplicates = _dedupe(items, update)
+                rejected = []
+                written = _write_batch(conn, unique, update, rejected) if unique else 0
+                for line, username, error in duplicates + rejected:
+                    add_error(line, username, error)
+                summary['processed'] += len(items)
+                summary['written'] += written
+                summary['invalid'] += len(duplicates)
+                summary['rejected'] += len(rejected)
+                # Ya existían (ON CONFLICT) o repetidos por username dentro del lote
+                summary['skipped'] += len(items) - written - len(duplicates) - len(rejected)
+                if progress:
+                    progress(summary)
+
+            pending = None  # Lote hasheándose en el pool mientras se inserta el anterior
+            for batch in _batches(valid_users(), batch_size):
+                if pool is None:
+                    write([_hash_user(task) for task in batch])
+                    continue
+                submitted = pool.map_async(_hash_user, batch, max(1, len(batch) // (workers * 4)))
+                if pending is not None:
+                    write(pending.get())
+                pending = submitted
+            if pending is not None:
+                write(pending.get())
+
+        summary.update({
+            'success': True,
+            'seconds': time.monotonic() - started,
+            'rounds': rounds,
+            'workers': workers
+        })
+        return summary
+    except Exception as e:
+        summary.update({
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__
+        })
+        return summary
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def provision_from_csv(path, **kwargs):
+    """Alta masiva desde un archivo CSV"""
+    return provision_users(read_users_csv(path), **kwargs)
@@ -3,20 +3,8 @@ Utilidades y funciones helper
 Útiles para uso básico y avanzado
 """
 import sys
-import os
 from datetime import datetime, timedelta
 
-# Fix encoding
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass
-
 from db_manager import DatabaseManager
 from config import DB_NAME
 
@@ -114,6 +102,45 @@ def seed_sample_data():
     print(f"   ✅ {inserted} juegos insertados")
     return True
 
+def seed_bulk(argv):
+    """Poblar con datos sintéticos a gran escala (python utils.py seed --users N ...)"""
+    import argparse
+    from data_generator import seed_database
+
+    parser = argparse.ArgumentParser(prog='python utils.py seed',
+                                     description='Poblar la base con datos sintéticos')
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--games', type=int, default=0)
+    parser.add_argument('--activities', type=int, default=0)
+    parser.add_argument('--analytics', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Filas por transacción')
+    parser.add_argument('--method', choices=['copy', 'values'], default='copy',
+                        help='COPY FROM STDIN o INSERT con execute_values')
+    parser.add_argument('--days', type=int, default=365, help='Antigüedad máxima de created_at')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla aleatoria (reproducible)')
+    args = parser.parse_args(argv)
+
+    print(f"🌱 Poblando: {args.users} usuarios, {args.games} juegos, "
+          f"{args.activities} actividades, {args.analytics} métricas ({args.method})...")
+
+    def progress(table, loaded):
+        print(f"   ... {table}: {loaded:,} filas", end='\r', flush=True)
+
+    result = seed_database(users=args.users, games=args.games, activities=args.activities,
+                           analytics=args.analytics, batch_size=args.batch_size, method=args.method,
+                           days=args.days, seed=args.seed, progress=progress)
+    print()
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error')}")
+        return False
+
+    for table, loaded in result['loaded'].items():
+        print(f"   ✅ {table}: {loaded:,} filas")
+    total = sum(result['loaded'].values())
+    rate = total / result['seconds'] if result['seconds'] else 0
+    print(f"   ⏱️  {result['seconds']:.1f}s ({rate:,.0f} filas/s)")
+    return True
+
 def check_database():
     """Verificar estado de la base de datos"""
     print("🔍 Verificando base de datos...")
@@ -143,10 +170,47 @@ def check_database():
     else:
         print("⚠️  Admin: No encontrado")
 
-def generate_password_hash(password):
-    """Generar hash de contraseña"""
-    import bcrypt
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def generate_password_hash(password, rounds=None):
+    """Generar hash de contraseña (costo bcrypt de AUTH_CONFIG si no se indica)"""
+    from user_provisioning import hash_password
+    return hash_password(password, rounds)
+
+def provision_users_cli(argv):
+    """Alta masiva de usuarios desde CSV (python utils.py provision archivo.csv)"""
+    import argparse
+    from user_provisioning import provision_from_csv
+
+    parser = argparse.ArgumentParser(prog='python utils.py provision',
+                                     description='Alta masiva de usuarios desde CSV')
+    parser.add_argument('csv_file', help='CSV con encabezado: username,email,password[,role,full_name]')
+    parser.add_argument('--rounds', type=int, help='Costo bcrypt (default: BCRYPT_ROUNDS)')
+    parser.add_argument('--workers', type=int, help='Procesos para hashear (default: uno por CPU)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Filas por INSERT/transacción')
+    parser.add_argument('--update', action='store_true',
+                        help='Actualizar usuarios existentes (por username) en vez de omitirlos')
+    args = parser.parse_args(argv)
+
+    print(f"👥 Importando usuarios desde {args.csv_file}...")
+
+    def progress(summary):
+        print(f"   ... {summary['processed']:,} procesados", end='\r', flush=True)
+
+    result = provision_from_csv(args.csv_file, rounds=args.rounds, workers=args.workers,
+                                batch_size=args.batch_size, update=args.update, progress=progress)
+    print()
+    if not result['success']:
+        print(f"   ❌ Error: {result.get('error')} ({result['written']:,} filas ya guardadas)")
+        return False
+
+    rate = result['processed'] / result['seconds'] if result['seconds'] else 0
+    print(f"   ✅ {result['written']:,} {'creados/actualizados' if args.update else 'creados'}, "
+          f"{result['skipped']:,} ya existían, {result['invalid']:,} inválidos, "
+          f"{result['rejected']:,} rechazados por la base")
+    print(f"   ⏱️  {result['seconds']:.1f}s ({rate:,.0f} usuarios/s, costo {result['rounds']}, "
+          f"{result['workers']} procesos)")
+    for error in result['errors'][:10]:
+        print(f"   ⚠️  Línea {error['line']} ({error['username']}): {error['error']}")
+    return True
 
 if __name__ == '__main__':
     import sys
@@ -155,7 +219,10 @@ if __name__ == '__main__':
         command = sys.argv[1]
         
         if command == 'seed':
-            seed_sample_data()
+            if len(sys.argv) > 2:
+                seed_bulk(sys.argv[2:])
+            else:
+                seed_sample_data()
         elif command == 'check':
             check_database()
         elif command == 'hash':
@@ -165,16 +232,25 @@ if __name__ == '__main__':
                 print(generate_password_hash(password))
             else:
                 print("Uso: python utils.py hash <password>")
+        elif command == 'provision':
+            if len(sys.argv) > 2:
+                provision_users_cli(sys.argv[2:])
+            else:
+                print("Uso: python utils.py provision <usuarios.csv> [--rounds N] [--workers N] [--update]")
         else:
             print("Comandos disponibles:")
             print("  python utils.py seed  - Poblar con datos de ejemplo")
+            print("  python utils.py seed --users N --games N --activities N - Datos sintéticos masivos")
             print("  python utils.py check - Verificar estado de BD")
             print("  python utils.py hash <password> - Generar hash de contraseña")
+            print("  python utils.py provision <usuarios.csv> - Alta masiva de usuarios")
     else:
         print("Utilidades de Battle.net Platform")
         print()
         print("Comandos:")
         print("  python utils.py seed  - Poblar con datos de ejemplo")
+        print("  python utils.py seed --users N --games N --activities N - Datos sintéticos masivos")
         print("  python utils.py check - Verificar estado de BD")
         print("  python utils.py hash <password> - Generar hash")
+        print("  python utils.py provision <usuarios.csv> - Alta masiva de usuarios")
 
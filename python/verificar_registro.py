@@ -3,22 +3,14 @@ Script simple para verificar si un usuario se registró en PostgreSQL
 Útil para verificar después de crear una cuenta en la página
 """
 import sys
-import os
-
-# Fix encoding
-if sys.platform == 'win32':
-    try:
-        import codecs
-        if hasattr(sys.stdout, 'buffer'):
-            sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        if hasattr(sys.stderr, 'buffer'):
-            sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
-    except:
-        pass
 
 from db_manager import DatabaseManager
 from config import print_config
 from datetime import datetime
+from user_listing import (
+    FORMATS, PAGE_SIZE, USER_COLUMNS, VERIFY_CHUNK_SIZE, export_users, export_verification,
+    iter_users, open_output, parse_after, read_identifiers
+)
 
 def verificar_usuario(email=None, username=None):
     """Verificar si un usuario específico está registrado"""
@@ -107,44 +99,108 @@ def listar_todos_usuarios():
         print(f"❌ Error de conexión: {conn_test.get('error')}")
         return
     
-    # Obtener todos los usuarios
-    result = db.execute_query(
-        """SELECT 
-            id, username, email, role, full_name, 
-            is_active, created_at
-        FROM users 
-        ORDER BY created_at DESC"""
-    )
+    # Recorrer por páginas (keyset) en vez de cargar todos los usuarios en memoria
+    total = 0
+    try:
+        for total, row in enumerate(iter_users(), 1):
+            user = dict(zip(USER_COLUMNS, row))
+            status = "✅" if user['is_active'] else "❌"
+            role_icon = "👑" if user['role'] == 'admin' else "👤" if user['role'] == 'moderator' else "👥"
+            
+            print(f"{role_icon} Usuario #{total}")
+            print(f"   ID: {user['id']}")
+            print(f"   Username: {user['username']}")
+            print(f"   Email: {user['email']}")
+            print(f"   Role: {user['role']}")
+            print(f"   Full Name: {user['full_name'] or 'N/A'}")
+            print(f"   Status: {status} {'Activo' if user['is_active'] else 'Inactivo'}")
+            print(f"   Registrado: {user['created_at']}")
+            print("-" * 70)
+            print()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return
     
-    if result['success']:
-        users = result['data']
-        print(f"📊 Total de usuarios: {len(users)}")
-        print()
-        
-        if len(users) == 0:
-            print("   ℹ️  No hay usuarios registrados aún")
-        else:
-            for i, user in enumerate(users, 1):
-                status = "✅" if user['is_active'] else "❌"
-                role_icon = "👑" if user['role'] == 'admin' else "👤" if user['role'] == 'moderator' else "👥"
-                
-                print(f"{role_icon} Usuario #{i}")
-                print(f"   ID: {user['id']}")
-                print(f"   Username: {user['username']}")
-                print(f"   Email: {user['email']}")
-                print(f"   Role: {user['role']}")
-                print(f"   Full Name: {user['full_name'] or 'N/A'}")
-                print(f"   Status: {status} {'Activo' if user['is_active'] else 'Inactivo'}")
-                print(f"   Registrado: {user['created_at']}")
-                print("-" * 70)
-                print()
+    if total == 0:
+        print("   ℹ️  No hay usuarios registrados aún")
     else:
-        print(f"❌ Error: {result.get('error')}")
+        print(f"📊 Total de usuarios: {total}")
+
+def listar_usuarios_stream(argv):
+    """Listado compacto en streaming (CSV/NDJSON/texto) con filtros y --limit/--after"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='verificar_registro.py --list',
+        description='Listar usuarios en streaming (paginación keyset sobre created_at, id)'
+    )
+    parser.add_argument('--role', action='append', help='Filtrar por rol (se puede repetir)')
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument('--active', dest='active', action='store_const', const=True, help='Solo activos')
+    status.add_argument('--inactive', dest='active', action='store_const', const=False, help='Solo inactivos')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='Creados desde (ISO, inclusive)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='Creados hasta (ISO, exclusivo)')
+    parser.add_argument('--limit', type=int, help='Máximo de usuarios')
+    parser.add_argument('--after', type=parse_after, help='Continuar después de este cursor (<created_at>,<id>)')
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--output', help='Archivo de salida (default: stdout)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='Filas por página/transacción')
+    args = parser.parse_args(argv)
+
+    out = open_output(args.output)
+    try:
+        result = export_users(
+            out, args.format, limit=args.limit, after=args.after, role=args.role, active=args.active,
+            since=args.since, until=args.until, page_size=args.page_size
+        )
+    finally:
+        out.close()
+
+    # Los mensajes van a stderr para no mezclarse con los datos
+    if not result['success']:
+        print(f"❌ Error: {result['error']}", file=sys.stderr)
+        return False
+    print(f"📊 {result['written']:,} usuarios en {result['seconds']:.2f}s", file=sys.stderr)
+    if result['next_after']:
+        print(f"➡️  Siguiente página: --after {result['next_after']}", file=sys.stderr)
+    return True
+
+def verificar_lote(argv):
+    """Verificar muchos emails/usernames (archivo o stdin) y emitir NDJSON found/missing"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='verificar_registro.py --batch',
+        description='Verificar en lote emails/usernames (uno por línea) con queries por bloques'
+    )
+    parser.add_argument('input', help="Archivo con un email o username por línea ('-' = stdin)")
+    parser.add_argument('--chunk-size', type=int, default=VERIFY_CHUNK_SIZE, help='Identificadores por query')
+    parser.add_argument('--missing-only', action='store_true', help='Emitir solo los no encontrados')
+    parser.add_argument('--output', help='Archivo NDJSON de salida (default: stdout)')
+    args = parser.parse_args(argv)
+
+    out = open_output(args.output)
+    try:
+        result = export_verification(read_identifiers(args.input), out, args.chunk_size, args.missing_only)
+    finally:
+        out.close()
+
+    if not result['success']:
+        print(f"❌ Error: {result['error']}", file=sys.stderr)
+        return False
+    print(f"📊 {result['found']:,} encontrados, {result['missing']:,} no encontrados "
+          f"en {result['seconds']:.2f}s", file=sys.stderr)
+    return True
 
 def main():
     """Función principal"""
     import sys
     
+    if len(sys.argv) > 1 and sys.argv[1] in ('--list', '--batch'):
+        # Salida de datos: sin encabezados en stdout
+        command = listar_usuarios_stream if sys.argv[1] == '--list' else verificar_lote
+        sys.exit(0 if command(sys.argv[2:]) else 1)
+    
     print()
     print("=" * 70)
     print("🚀 Battle.net - Verificación de Registro")